@@ -0,0 +1,255 @@
+"""
+Streaming rule engine for high-risk alerts.
+
+A background thread tails `readings` by id (high-water mark kept in
+`alert_engine_state`), so readings from every write path are covered. It
+evaluates each new reading against per-patient rolling windows and writes the
+results to the `alerts` table. The monitoring dashboard reads `alerts`
+directly, the health department KPIs and hotspots read the alert counts that
+kpi_rollups.py keeps up to date, instead of rescanning `readings`.
+
+Rules (see RULES):
+    threshold          a single reading outside the configured alert thresholds
+    consecutive_high   CONSECUTIVE_HIGH_READINGS BP readings in a row above the upper limits
+    rising_sugar       RISING_SUGAR_POINTS sugar readings, each higher than the last,
+                       rising by at least RISING_SUGAR_MIN_RISE mg/dL overall
+
+An alert for the same patient and rule is suppressed for SUPPRESS_MINUTES
+(measured in reading time, so replays behave the same as live traffic).
+Windows are rebuilt from the database for each batch, so several app
+processes can share the work without drifting apart. Only alerts for readings
+newer than NOTIFY_MAX_AGE_MINUTES are sent to the health worker by SMS, so a
+catch-up over old readings does not page anyone.
+
+    python alert_engine.py --catch-up   # process every pending reading without sending SMS
+"""
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+from db import get_db_connection
+from sms_ingest import alert_direction, format_reading, load_alert_thresholds
+
+POLL_INTERVAL_SECONDS = 2.0
+BATCH_SIZE = 500
+WINDOW_SIZE = 5                 # readings kept per patient and reading type
+SUPPRESS_MINUTES = 60
+NOTIFY_MAX_AGE_MINUTES = 15
+CONSECUTIVE_HIGH_READINGS = 3
+RISING_SUGAR_POINTS = 3
+RISING_SUGAR_MIN_RISE = 30
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# --- Rules: fn(window, thresholds) -> message or None. `window` is oldest-first, the new reading last ---
+def _threshold_rule(window, thresholds):
+    latest = window[-1]
+    direction = alert_direction(latest['reading_type'], latest['value1'], latest['value2'], thresholds)
+    if direction is None:
+        return None
+    # Labelled by the limit that was crossed: "High BP 150/95", "Low Pulse 45 bpm"
+    return f"{direction} {format_reading(latest['reading_type'], latest['value1'], latest['value2'])}"
+
+
+def _consecutive_high_rule(window, thresholds):
+    recent = window[-CONSECUTIVE_HIGH_READINGS:]
+    if recent[-1]['reading_type'] != 'BP' or len(recent) < CONSECUTIVE_HIGH_READINGS:
+        return None
+    if all(alert_direction('BP', row['value1'], row['value2'], thresholds) == 'High' for row in recent):
+        readings = ", ".join(f"{row['value1']}/{row['value2']}" for row in recent)
+        return f"{CONSECUTIVE_HIGH_READINGS} high BP readings in a row: {readings}"
+    return None
+
+
+def _rising_sugar_rule(window, thresholds):
+    recent = window[-RISING_SUGAR_POINTS:]
+    if recent[-1]['reading_type'] != 'SUGAR' or len(recent) < RISING_SUGAR_POINTS:
+        return None
+    values = [row['value1'] for row in recent]
+    if all(a < b for a, b in zip(values, values[1:])) and values[-1] - values[0] >= RISING_SUGAR_MIN_RISE:
+        return f"Rising sugar trend: {' -> '.join(str(v) for v in values)} mg/dL"
+    return None
+
+
+RULES = [
+    ('threshold', _threshold_rule),
+    ('consecutive_high', _consecutive_high_rule),
+    ('rising_sugar', _rising_sugar_rule),
+]
+
+
+def _parse_time(timestamp):
+    try:
+        return datetime.strptime(str(timestamp)[:19], TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def _placeholders(values):
+    return ", ".join("?" for _ in values)
+
+
+class AlertEngine:
+    def __init__(self, thresholds=None, notify=None, poll_interval=POLL_INTERVAL_SECONDS):
+        self.thresholds = thresholds or load_alert_thresholds()
+        # notify(patient_phone, message, rule) - e.g. queue an SMS to the health worker
+        self.notify = notify
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="alert-engine", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Called after new readings are committed so they are evaluated without waiting for the next poll."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.process_pending()[0] == BATCH_SIZE:
+                    pass
+            except Exception as e:
+                print(f"Alert engine error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def process_pending(self, batch_size=BATCH_SIZE, send=True, conn=None):
+        """
+        Evaluates the next batch of new readings. Returns (readings processed, alerts raised).
+        `conn` (e.g. a bulk loader's own connection) is used instead of a pooled one and left open.
+        """
+        own_connection = conn is None
+        if own_connection:
+            conn = get_db_connection()
+        try:
+            while True:
+                # Reads and rule evaluation run without a lock, so they never hold up the SMS ingest writer
+                last_id = self._last_reading_id(conn)
+                rows = conn.execute("""
+                    SELECT r.id, r.patient_id, r.reading_type, r.value1, r.value2, r.timestamp, p.phone_number
+                    FROM readings r LEFT JOIN patients p ON p.id = r.patient_id
+                    WHERE r.id > ? ORDER BY r.id LIMIT ?
+                """, (last_id, batch_size)).fetchall()
+                if not rows:
+                    return 0, 0
+                alerts = self._evaluate(conn, last_id, [dict(row) for row in rows])
+
+                # The write lock is only taken to store the results. If another app process moved the
+                # high-water mark in the meantime, it has already handled these readings: start over.
+                conn.execute("BEGIN IMMEDIATE")
+                if self._last_reading_id(conn) != last_id:
+                    conn.rollback()
+                    continue
+                conn.executemany("""
+                    INSERT INTO alerts (patient_id, rule, reading_type, reading_id, reading_time, message)
+                    VALUES (:patient_id, :rule, :reading_type, :reading_id, :reading_time, :message)
+                """, alerts)
+                conn.execute("UPDATE alert_engine_state SET value = ? WHERE name = 'last_reading_id'", (rows[-1]['id'],))
+                conn.commit()
+                break
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            if own_connection:
+                conn.close()
+        if send and self.notify:
+            self._send(alerts)
+        return len(rows), len(alerts)
+
+    @staticmethod
+    def _last_reading_id(conn):
+        return conn.execute("SELECT value FROM alert_engine_state WHERE name = 'last_reading_id'").fetchone()[0]
+
+    def _evaluate(self, conn, last_id, rows):
+        keys = sorted({(row['patient_id'], row['reading_type']) for row in rows})
+        patient_ids = sorted({patient_id for patient_id, _ in keys})
+        marks = _placeholders(patient_ids)
+
+        # Rolling windows: the last WINDOW_SIZE already-processed readings per patient and type
+        windows = {key: [] for key in keys}
+        for row in conn.execute(f"""
+            SELECT * FROM (
+                SELECT id, patient_id, reading_type, value1, value2, timestamp,
+                       ROW_NUMBER() OVER (PARTITION BY patient_id, reading_type ORDER BY id DESC) as rn
+                FROM readings WHERE patient_id IN ({marks}) AND id <= ?
+            ) WHERE rn <= ? ORDER BY id
+        """, patient_ids + [last_id, WINDOW_SIZE]):
+            key = (row['patient_id'], row['reading_type'])
+            if key in windows:
+                windows[key].append(dict(row))
+
+        # Last alert time per patient and rule, for suppression
+        last_alert = {}
+        for row in conn.execute(f"""
+            SELECT patient_id, rule, MAX(reading_time) as last_time FROM alerts
+            WHERE patient_id IN ({marks}) GROUP BY patient_id, rule
+        """, patient_ids):
+            last_alert[(row['patient_id'], row['rule'])] = _parse_time(row['last_time'])
+
+        alerts = []
+        suppress = timedelta(minutes=SUPPRESS_MINUTES)
+        for row in rows:
+            window = windows[(row['patient_id'], row['reading_type'])]
+            window.append(row)
+            del window[:-WINDOW_SIZE]
+            reading_time = _parse_time(row['timestamp'])
+            for rule, check in RULES:
+                message = check(window, self.thresholds)
+                if message is None:
+                    continue
+                previous = last_alert.get((row['patient_id'], rule))
+                if previous and reading_time and reading_time - previous < suppress:
+                    continue
+                last_alert[(row['patient_id'], rule)] = reading_time
+                alerts.append({'patient_id': row['patient_id'], 'rule': rule, 'reading_type': row['reading_type'],
+                               'reading_id': row['id'], 'reading_time': row['timestamp'], 'message': message,
+                               'phone_number': row['phone_number']})
+        return alerts
+
+    def _send(self, alerts):
+        # Reading timestamps are naive UTC (SQLite CURRENT_TIMESTAMP)
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=NOTIFY_MAX_AGE_MINUTES)
+        for alert in alerts:
+            reading_time = _parse_time(alert['reading_time'])
+            if alert['phone_number'] and reading_time and reading_time >= cutoff:
+                try:
+                    self.notify(alert['phone_number'], alert['message'], alert['rule'])
+                except Exception as e:
+                    print(f"Error sending alert for patient {alert['patient_id']}: {e}")
+
+
+if __name__ == '__main__':
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="High-risk alert engine")
+    parser.add_argument('--catch-up', action='store_true', help="evaluate every pending reading (no SMS is sent)")
+    args = parser.parse_args()
+    if not args.catch_up:
+        parser.print_help()
+    else:
+        conn = get_db_connection()
+        apply_migrations(conn)
+        conn.close()
+        engine, processed, raised = AlertEngine(), 0, 0
+        while True:
+            batch_processed, batch_raised = engine.process_pending(send=False)
+            if not batch_processed:
+                break
+            processed, raised = processed + batch_processed, raised + batch_raised
+        print(f"--- Processed {processed} readings, raised {raised} alerts ---")
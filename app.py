@@ -1,38 +1,46 @@
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
 import json
 import random
 import string
-import pandas as pd
-import pickle
 import os
-import requests
-import re
+import atexit
+from db import get_db_connection, init_app as init_db
+import metrics
+from response_cache import cached_view, MONITORING_TABLES, HEALTH_DEPT_TABLES, PHARMACY_TABLES
+from sync_api import RESOURCES as SYNC_RESOURCES, SyncError, allowed_scope, parse_fields, get_changes, compress_json
+from sms_outbox import SmsOutbox, TwilioTransport, FakeTransport
+from model_registry import registry as model_registry
+from remedy_index import canonical_disease, load_remedy_index, lookup_treatment
+from triage_llm import render_triage_report
+from batch_predict import predict_diseases
+from triage_jobs import TriagePipeline, PENDING_PREDICTION, get_report_status
+from dashboard_loader import load_monitoring_page, get_filter_options, DASHBOARD_PAGE_SIZE
+from disease_trends import get_disease_trends
+from kpi_rollups import get_kpis, get_hotspots, get_asha_leaderboard
+from readings_timeseries import get_readings_page, get_bucket_series
+from sms_ingest import PatientCache, ReadingWriter, InvalidReading, parse_readings, format_reading, load_alert_thresholds
+from alert_engine import AlertEngine
+from pharmacy_availability import availability as pharmacy_availability
+from inventory_import import InvalidStockPayload, update_stock_by_id, import_upload
+from geo_index import get_village_location
 
 # --- Main Application Setup ---
 app = Flask(__name__,
             template_folder='english/templates',
             static_folder='english')
 app.secret_key = 'gramin_health_secret_key' 
+init_db(app)
+metrics.init_app(app)
 
-# --- 1. LOAD THE FINAL TRAINED ML MODEL & DATASET ---
-try:
-    with open('final_disease_model.pkl', 'rb') as f:
-        disease_model = pickle.load(f)
-    with open('final_vectorizer.pkl', 'rb') as f:
-        vectorizer = pickle.load(f)
-    remedy_df = pd.read_csv('final_remedy_dataset.csv')
-    print("--- Final AI Model and Remedy Dataset loaded successfully! ---")
-except FileNotFoundError:
-    print("--- FINAL MODEL FILES NOT FOUND. Please run train_final_model.py first. ---")
-    disease_model, vectorizer, remedy_df = None, None, None
-
-# --- OpenRouter API Configuration ---
-OPENROUTER_API_KEY = "" 
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# --- 1. THE FINAL TRAINED ML MODEL & DATASET ---
+# Loaded on first triage use (see model_registry.py); MODEL_WARMUP=background loads them right after startup instead.
+if os.environ.get('MODEL_WARMUP') == 'background':
+    model_registry.warm_up_in_background()
+
+# --- OpenRouter API Configuration lives in triage_llm.py ---
 
 # --- TWILIO CONFIGURATION ---
 ACCOUNT_SID = "" 
@@ -40,124 +48,100 @@ AUTH_TOKEN = ""
 TWILIO_PHONE_NUMBER = "" 
 HEALTH_WORKER_PHONE = "" 
 
-twilio_client = Client(ACCOUNT_SID, AUTH_TOKEN)
+_twilio_client = None
+
+def get_twilio_client():
+    # Created on the first real send so importing the app does not pay for twilio.rest
+    global _twilio_client
+    if _twilio_client is None:
+        from twilio.rest import Client
+        _twilio_client = Client(ACCOUNT_SID, AUTH_TOKEN)
+    return _twilio_client
+
+# --- Outbound SMS queue (sends happen on background workers, see sms_outbox.py) ---
+# Set SMS_TRANSPORT=fake to record messages locally instead of calling Twilio.
+if os.environ.get('SMS_TRANSPORT') == 'fake':
+    sms_transport = FakeTransport()
+else:
+    sms_transport = TwilioTransport(get_twilio_client, TWILIO_PHONE_NUMBER)
+sms_outbox = SmsOutbox(sms_transport)
+sms_outbox.start()
 
 # --- Helper Functions ---
-def get_db_connection():
-    conn = sqlite3.connect('health.db', check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def send_alert(patient_number, message):
+def send_alert(patient_number, message, alert_type=None):
+    if not HEALTH_WORKER_PHONE:
+        return  # no health worker number configured: alerts are only shown on the dashboards
+    # Repeated alerts of the same type for the same patient are de-duplicated by the outbox
+    dedupe_key = f"alert:{patient_number}:{alert_type}" if alert_type else None
     try:
-        twilio_client.messages.create(to=HEALTH_WORKER_PHONE, from_=TWILIO_PHONE_NUMBER, body=f"ALERT from {patient_number}: {message}")
-        print(f"Alert sent successfully to {HEALTH_WORKER_PHONE}")
+        if sms_outbox.enqueue(HEALTH_WORKER_PHONE, f"ALERT from {patient_number}: {message}", dedupe_key=dedupe_key):
+            print(f"Alert queued for {HEALTH_WORKER_PHONE}")
     except Exception as e:
-        print(f"Error sending Twilio alert: {e}")    
-
-
-def safe_extract_json(text):
-    match = re.search(r'\{.*\}', text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group())
-        except json.JSONDecodeError:
-            return None
-    return None
+        print(f"Error queueing Twilio alert: {e}")
 
 # --- FINAL AI PREDICTION FUNCTION (with OpenRouter) ---
-def get_ai_prediction(symptoms_text):
-    if not all([disease_model, vectorizer, remedy_df is not None]):
-        return "Local AI model is not available."
+def analyze_symptoms(symptoms_text):
+    """Returns (predicted_disease, report HTML); predicted_disease is None if the local model could not run."""
+    disease_model, vectorizer, remedy_index = model_registry.get()
+    if not all([disease_model, vectorizer, remedy_index]):
+        return None, "Local AI model is not available."
 
     try:
         # Stage 1: Predict the Disease with the Local Model
-        input_vector = vectorizer.transform([symptoms_text])
-        predicted_disease = disease_model.predict(input_vector)[0]
+        with metrics.timed('triage_stage_duration_seconds', stage='model'):
+            input_vector = vectorizer.transform([symptoms_text])
+            predicted_disease = disease_model.predict(input_vector)[0]
     except Exception as e:
         print(f"Local model prediction error: {e}")
-        return "Could not analyze symptoms."
+        return None, "Could not analyze symptoms."
 
-    # Stage 2: Look up the Trusted Treatment from our CSV
-    remedy_info = remedy_df[remedy_df['Disease'].str.lower() == predicted_disease.lower()]
-    if remedy_info.empty:
-        return f"<b>Predicted Issue:</b> {predicted_disease}<br><br>No specific treatment found in the local dataset."
-    treatment_text = remedy_info['Treatment'].iloc[0]
+    # Stage 2: Look up the Trusted Treatment from our CSV (pre-indexed, see remedy_index.py)
+    treatment_text = lookup_treatment(remedy_index, predicted_disease)
 
-    # Stage 3: Use OpenRouter API to Reformat and Simplify the Trusted Text
-    try:
-        system_prompt = (
-            "You are a medical AI assistant for rural healthcare in India. "
-            "You will be given a trusted medical treatment description. "
-            "Your job is to reformat it into a triage JSON with keys: "
-            "'intensity' (Mild/Moderate/Severe), 'recommendation' (a list of 1-2 short actions), "
-            "'home_remedies' (a list of 2-3 simple remedies in English and Panjabi, e.g., 'Drink warm water (ਕੋਸਾ ਪਾਣੀ ਪੀਓ)'), "
-            "'emergency' (a standard warning), and 'doctor_note' (a 1-2 line clinical summary)."
-        )
-        user_query = f"Reformat the following treatment description for {predicted_disease}:\n{treatment_text}"
-        
-        payload = {
-            "model": "openai/gpt-4o-mini",
-            "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_query}]
-        }
-        headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"}
-        
-        response = requests.post(OPENROUTER_URL, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-        result = response.json()
-        
-        report_json_text = result["choices"][0]["message"]["content"]
-        report_data = safe_extract_json(report_json_text)
-        
-        if not report_data:
-            return f"<b>Predicted Issue:</b> {predicted_disease}<br><br>(API Formatting Failed) Raw Treatment: {treatment_text}"
+    # Stage 3: Use OpenRouter API to Reformat and Simplify the Trusted Text (cached per disease, see triage_llm.py)
+    return predicted_disease, render_triage_report(predicted_disease, treatment_text)
 
-        recommendation_html = "<br> - ".join(report_data.get("recommendation", []))
-        remedies_html = "<br> - ".join(report_data.get("home_remedies", []))
-        
-        output_html = (
-            f"<b>Predicted Issue:</b> {report_data.get('doctor_note', predicted_disease)}<br><br>"
-            f"<b>Intensity:</b> {report_data.get('intensity', 'N/A')}<br><br>"
-            f"<b>Recommendation:</b><br> - {recommendation_html}<br><br>"
-            f"<b>Home Remedies:</b><br> - {remedies_html}<br><br>"
-            f"<b>Emergency Note:</b> {report_data.get('emergency', 'If symptoms do not improve or worsen, a physical hospital visit is required.')}"
-        )
-        return output_html
+def get_ai_prediction(symptoms_text):
+    return analyze_symptoms(symptoms_text)[1]
 
-    except Exception as e:
-        print(f"OpenRouter API failed: {e}. Falling back to raw local treatment text.")
-        return f"<b>Predicted Issue:</b> {predicted_disease}<br><br>(API Unavailable)<br><b>Suggested Treatment:</b> {treatment_text}"
+MAX_BATCH_TEXTS = 5000
+NEAREST_PHARMACIES = 5
+
+# Model + LLM stages run off the request thread (see triage_jobs.py)
+triage_pipeline = TriagePipeline(analyze_symptoms)
+triage_pipeline.resume_pending()
+
+# Windowed high-risk rules over new readings, feeding the `alerts` table (see alert_engine.py)
+alert_engine = AlertEngine(load_alert_thresholds(), notify=send_alert).start()
+atexit.register(alert_engine.stop)
+
+# /sms readings are validated up front and group-committed in micro-batches (see sms_ingest.py)
+patient_cache = PatientCache()
+reading_writer = ReadingWriter(on_commit=alert_engine.wake).start()
+atexit.register(reading_writer.stop)
 
 @app.route("/sms", methods=['POST'])
 def sms_webhook():
     incoming_msg = request.values.get('Body', '').strip()
     from_number = request.values.get('From', '')
-    conn = get_db_connection()
-    patient = conn.execute('SELECT * FROM patients WHERE phone_number = ?', (from_number,)).fetchone()
     response = MessagingResponse()
+    patient = patient_cache.get(from_number)
     if not patient:
         response.message("This phone number is not registered. Please sign up on our website.")
-        conn.close()
         return str(response)
-    parts = incoming_msg.upper().split()
     try:
-        if parts[0] == 'BP' and len(parts) == 3:
-            systolic, diastolic = int(parts[1]), int(parts[2])
-            conn.execute('INSERT INTO readings (patient_id, reading_type, value1, value2) VALUES (?, ?, ?, ?)', (patient['id'], 'BP', systolic, diastolic))
-            response.message(f"Hi {patient['name']}, your BP reading {systolic}/{diastolic} is recorded.")
-            if systolic > 140 or diastolic > 90: send_alert(from_number, f"High BP: {systolic}/{diastolic}")
-        elif parts[0] == 'SUGAR' and len(parts) == 2:
-            sugar_level = int(parts[1])
-            conn.execute('INSERT INTO readings (patient_id, reading_type, value1) VALUES (?, ?, ?)', (patient['id'], 'SUGAR', sugar_level))
-            response.message(f"Hi {patient['name']}, your Sugar reading {sugar_level} is recorded.")
-            if sugar_level > 180: send_alert(from_number, f"High Sugar: {sugar_level}")
-        else:
-            response.message("Invalid format. Please use: 'BP 120 80' or 'SUGAR 150'.")
-    except (ValueError, IndexError):
-        response.message("Invalid format. Please use: 'BP 120 80' or 'SUGAR 150'.")
-    finally:
-        conn.commit()
-        conn.close()
+        readings = parse_readings(incoming_msg)
+    except InvalidReading as e:
+        response.message(str(e))
+        return str(response)
+    # Queued for the next micro-batch commit; Twilio gets its reply straight away
+    reading_writer.submit(patient['id'], readings)
+    summary = ", ".join(format_reading(*reading) for reading in readings)
+    if len(readings) == 1:
+        response.message(f"Hi {patient['name']}, your {summary} reading is recorded.")
+    else:
+        response.message(f"Hi {patient['name']}, your readings {summary} are recorded.")
+    # High-risk alerts are raised by the alert engine once the batch is committed
     return str(response)
 
 
@@ -213,13 +197,14 @@ def user_dashboard():
     if 'user_id' not in session: return redirect(url_for('login'))
     user_id, user_name = session['user_id'], session['user_name']
     conn = get_db_connection()
-    readings = conn.execute("SELECT *, strftime('%Y-%m-%d %-I:%M %p', timestamp) as formatted_time FROM readings WHERE patient_id = ? ORDER BY timestamp DESC", (user_id,)).fetchall()
-    bp_readings = conn.execute("SELECT *, strftime('%d-%b', timestamp) as chart_time FROM readings WHERE patient_id = ? AND reading_type = 'BP' ORDER BY timestamp ASC LIMIT 7", (user_id,)).fetchall()
+    readings, next_cursor = get_readings_page(conn, user_id, before=request.args.get('before'))
+    # Daily BP means from the pre-aggregated buckets, not the raw history
+    bp_buckets = get_bucket_series(conn, user_id, 'BP', 'day')
     conn.close()
-    chart_labels = [row['chart_time'] for row in bp_readings]
-    systolic_data = [row['value1'] for row in bp_readings]
-    diastolic_data = [row['value2'] for row in bp_readings]
-    return render_template("user_dashboard.html", user_name=user_name, readings=readings, chart_labels=json.dumps(chart_labels), systolic_data=json.dumps(systolic_data), diastolic_data=json.dumps(diastolic_data))
+    chart_labels = [row['label'] for row in bp_buckets]
+    systolic_data = [round(row['mean1']) for row in bp_buckets]
+    diastolic_data = [round(row['mean2']) if row['mean2'] is not None else None for row in bp_buckets]
+    return render_template("user_dashboard.html", user_name=user_name, readings=readings, next_cursor=next_cursor, chart_labels=json.dumps(chart_labels), systolic_data=json.dumps(systolic_data), diastolic_data=json.dumps(diastolic_data))
 
 @app.route("/admin_login", methods=['GET', 'POST'])
 def admin_login():
@@ -234,21 +219,18 @@ def admin_login():
     return render_template("admin_login.html")
 
 @app.route("/dashboard")
+@cached_view('admin_logged_in', MONITORING_TABLES)
 def monitoring_dashboard():
     if not session.get('admin_logged_in'): return redirect(url_for('admin_login'))
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', DASHBOARD_PAGE_SIZE, type=int)
+    village, asha_phone = request.args.get('village', '').strip(), request.args.get('asha', '').strip()
     conn = get_db_connection()
-    patients_from_db = conn.execute("SELECT * FROM patients ORDER BY name").fetchall()
-    patients_data = []
-    for patient_row in patients_from_db:
-        patient_dict = dict(patient_row)
-        readings_rows = conn.execute("SELECT *, strftime('%Y-%m-%d %-I:%M %p', timestamp) as formatted_time FROM readings WHERE patient_id = ? ORDER BY timestamp DESC LIMIT 5", (patient_dict['id'],)).fetchall()
-        reports_rows = conn.execute("SELECT *, strftime('%Y-%m-%d %-I:%M %p', timestamp) as formatted_time FROM triage_reports WHERE patient_id = ? ORDER BY timestamp DESC LIMIT 3", (patient_dict['id'],)).fetchall()
-        prescriptions_rows = conn.execute("SELECT * FROM prescriptions WHERE patient_id = ? AND is_active = 1", (patient_dict['id'],)).fetchall()
-        bp_readings_rows = conn.execute("SELECT *, strftime('%d-%b', timestamp) as chart_time FROM readings WHERE patient_id = ? AND reading_type = 'BP' ORDER BY timestamp ASC LIMIT 7", (patient_dict['id'],)).fetchall()
-        chart_data = {'labels': [row['chart_time'] for row in bp_readings_rows], 'systolic': [row['value1'] for row in bp_readings_rows], 'diastolic': [row['value2'] for row in bp_readings_rows]}
-        patients_data.append({'info': patient_dict, 'readings': [dict(r) for r in readings_rows], 'reports': [dict(r) for r in reports_rows], 'prescriptions': [dict(r) for r in prescriptions_rows], 'chart_data': chart_data})
+    dashboard = load_monitoring_page(conn, page=page, per_page=per_page, village=village or None, asha_phone=asha_phone or None)
+    filter_options = get_filter_options(conn)
     conn.close()
-    return render_template("monitoring_dashboard.html", all_patients=patients_data)
+    return render_template("monitoring_dashboard.html", all_patients=dashboard['patients'], pagination=dashboard['pagination'],
+                           filter_options=filter_options, selected_village=village, selected_asha=asha_phone)
 
 @app.route('/patient/<int:patient_id>/add_report', methods=['GET', 'POST'])
 def add_triage_report(patient_id):
@@ -258,15 +240,54 @@ def add_triage_report(patient_id):
     if request.method == 'POST':
         chief_complaint, notes = request.form['chief_complaint'], request.form['notes']
         symptoms_text_combined = chief_complaint + " " + notes
-        prediction = get_ai_prediction(symptoms_text_combined)
-        conn.execute('INSERT INTO triage_reports (patient_id, chief_complaint, symptoms, notes, ai_prediction) VALUES (?, ?, ?, ?, ?)', (patient_id, chief_complaint, "", notes, prediction))
+        cursor = conn.execute('INSERT INTO triage_reports (patient_id, chief_complaint, symptoms, notes, ai_prediction, ai_status) VALUES (?, ?, ?, ?, ?, ?)', (patient_id, chief_complaint, "", notes, PENDING_PREDICTION, 'pending'))
         conn.commit()
         conn.close()
-        flash(f"Triage report for {patient['name']} has been saved.", "success")
+        triage_pipeline.submit(cursor.lastrowid, symptoms_text_combined)
+        flash(f"Triage report for {patient['name']} has been saved. The AI analysis will appear shortly.", "success")
         return redirect(url_for('monitoring_dashboard'))
     conn.close()
     return render_template('add_triage_report.html', patient=patient)
 
+@app.route('/triage_report/<int:report_id>/status')
+def triage_report_status(report_id):
+    """Polled by the monitoring dashboard while a report's AI analysis is pending."""
+    if not session.get('admin_logged_in'): return jsonify({'error': 'unauthorized'}), 401
+    conn = get_db_connection()
+    status = get_report_status(conn, report_id)
+    conn.close()
+    if status is None: return jsonify({'error': 'not found'}), 404
+    return jsonify(status)
+
+@app.route('/triage_report/<int:report_id>/confirm', methods=['POST'])
+def confirm_triage_diagnosis(report_id):
+    """Records the doctor's diagnosis for a report; train_pipeline.py uses these as training labels."""
+    if not session.get('admin_logged_in'): return jsonify({'error': 'unauthorized'}), 401
+    disease = (request.form.get('confirmed_disease') or (request.get_json(silent=True) or {}).get('confirmed_disease') or '').strip()
+    # Stored in the dataset's spelling so case/whitespace variants don't split a training class
+    if disease: disease = canonical_disease(load_remedy_index(), disease)
+    conn = get_db_connection()
+    updated = conn.execute('UPDATE triage_reports SET confirmed_disease = ? WHERE id = ?', (disease or None, report_id)).rowcount
+    conn.commit()
+    conn.close()
+    if not updated: return jsonify({'error': 'not found'}), 404
+    return jsonify({'id': report_id, 'confirmed_disease': disease or None})
+
+@app.route('/api/predict_batch', methods=['POST'])
+def predict_batch():
+    """Local-model disease prediction for many complaint texts at once: {"texts": [...]} -> {"predictions": [...]}."""
+    if not session.get('admin_logged_in'): return jsonify({'error': 'unauthorized'}), 401
+    texts = (request.get_json(silent=True) or {}).get('texts')
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return jsonify({'error': "Expected a JSON body like {\"texts\": [\"fever and cough\", ...]}"}), 400
+    if len(texts) > MAX_BATCH_TEXTS:
+        return jsonify({'error': f"At most {MAX_BATCH_TEXTS} texts per request."}), 413
+    try:
+        predictions = predict_diseases(texts, workers=1)
+    except FileNotFoundError:
+        return jsonify({'error': "Local AI model is not available."}), 503
+    return jsonify({'predictions': predictions})
+
 @app.route('/patient/<int:patient_id>/add_prescription', methods=['GET', 'POST'])
 def add_prescription(patient_id):
     """
@@ -302,28 +323,21 @@ def add_prescription(patient_id):
         return redirect(url_for('monitoring_dashboard'))
 
     # --- THIS IS THE NEW LOGIC FOR DISPLAYING THE FORM ---
-    # 1. Get a unique list of all medications available in the entire network for the dropdown
-    all_meds_query = conn.execute("SELECT DISTINCT medication_name FROM pharmacy_inventory ORDER BY medication_name").fetchall()
-    all_medications = [row['medication_name'] for row in all_meds_query]
+    # 1. Every medication available in the network, from the cached availability snapshot
+    all_medications = pharmacy_availability.medications(conn)
 
     # 2. Check if a specific medication has been selected via the "Check Availability" button
     selected_medication = request.args.get('medication_name', all_medications[0] if all_medications else None)
-    
+
+    # 3. The nearest pharmacies that have it, if the patient's village has coordinates,
+    #    otherwise its stock status at every pharmacy (both without a query per pharmacy)
     pharmacy_stock = []
-    if selected_medication:
-        # 3. If a medicine is selected, get its stock status from every pharmacy
-        pharmacies = conn.execute('SELECT * FROM pharmacies ORDER BY name').fetchall()
-        for pharmacy in pharmacies:
-            stock_status_row = conn.execute(
-                "SELECT stock_status FROM pharmacy_inventory WHERE pharmacy_id = ? AND medication_name = ?",
-                (pharmacy['id'], selected_medication)
-            ).fetchone()
-            
-            pharmacy_stock.append({
-                'pharmacy': pharmacy,
-                'status': stock_status_row['stock_status'] if stock_status_row else 'Not Stocked'
-            })
-            
+    patient_location = get_village_location(conn, patient['village']) if patient else None
+    if selected_medication and patient_location:
+        pharmacy_stock = pharmacy_availability.nearest_with(conn, selected_medication, *patient_location, k=NEAREST_PHARMACIES)
+    if selected_medication and not pharmacy_stock:
+        pharmacy_stock = pharmacy_availability.stock_for(conn, selected_medication)
+
     conn.close()
     
     return render_template(
@@ -350,10 +364,10 @@ def start_video_call(patient_id):
         patient_phone, patient_name = patient['phone_number'], patient['name']
         message_body = f"Hi {patient_name}, your video consultation is ready. Please click this link to join the doctor: {video_link}"
         try:
-            twilio_client.messages.create(to=patient_phone, from_=TWILIO_PHONE_NUMBER, body=message_body)
-            flash(f"Video call link sent to {patient_name} successfully!", "success")
+            sms_outbox.enqueue(patient_phone, message_body)
+            flash(f"Video call link is being sent to {patient_name}.", "success")
         except Exception as e:
-            flash(f"Failed to send video link SMS. Error: {e}", "danger")
+            flash(f"Failed to queue video link SMS. Error: {e}", "danger")
     conn.close()
     return redirect(url_for('monitoring_dashboard'))
 
@@ -377,11 +391,11 @@ def send_reminder(prescription_id):
         p_name, p_num, med, dosage = prescription['patient_name'], prescription['phone_number'], prescription['medication_name'], prescription['dosage']
         msg = f"Hi {p_name}, this is a friendly reminder to take your medication: {med} ({dosage})."
         try:
-            twilio_client.messages.create(to=p_num, from_=TWILIO_PHONE_NUMBER, body=msg)
-            flash(f"Reminder sent to {p_name} successfully!", "success")
+            sms_outbox.enqueue(p_num, msg)
+            flash(f"Reminder is being sent to {p_name}.", "success")
         except Exception as e:
-            print(f"Error sending reminder: {e}")
-            flash(f"Failed to send reminder. Error: {e}", "danger")
+            print(f"Error queueing reminder: {e}")
+            flash(f"Failed to queue reminder. Error: {e}", "danger")
     return redirect(url_for('monitoring_dashboard'))
 
 # --- PHARMACY ECOSYSTEM ROUTES ---
@@ -399,22 +413,17 @@ def pharmacy_login():
     return render_template("pharmacy_login.html")
 
 @app.route("/pharmacy/dashboard", methods=['GET', 'POST'])
+@cached_view('pharmacy_logged_in', PHARMACY_TABLES)
 def pharmacy_dashboard():
     if not session.get('pharmacy_logged_in'): return redirect(url_for('pharmacy_login'))
     conn = get_db_connection()
     if request.method == 'POST':
-        for key, value in request.form.items():
-            if key.startswith('stock_status_'):
-                inventory_id = key.split('_')[-1]
-                conn.execute("UPDATE pharmacy_inventory SET stock_status = ? WHERE id = ?", (value, inventory_id))
-        conn.commit()
-        flash("Inventory updated.", "success")
+        statuses = {key.split('_')[-1]: value for key, value in request.form.items() if key.startswith('stock_status_')}
+        # One executemany for the rows whose status actually changed
+        changed = update_stock_by_id(conn, statuses)
+        flash(f"Inventory updated ({changed} item(s) changed).", "success")
         return redirect(url_for('pharmacy_dashboard'))
-    pharmacies = conn.execute("SELECT * FROM pharmacies ORDER BY name").fetchall()
-    inventory_data = {}
-    for pharmacy in pharmacies:
-        inventory_items = conn.execute("SELECT * FROM pharmacy_inventory WHERE pharmacy_id = ? ORDER BY medication_name", (pharmacy['id'],)).fetchall()
-        inventory_data[pharmacy['id']] = inventory_items
+    pharmacies, inventory_data = pharmacy_availability.inventory(conn)
     conn.close()
     return render_template("pharmacy_dashboard.html", pharmacies=pharmacies, inventory_data=inventory_data)
 
@@ -441,6 +450,7 @@ def health_dept_login():
 
 
 @app.route("/health_dept/dashboard")
+@cached_view('health_dept_logged_in', HEALTH_DEPT_TABLES)
 def health_dept_dashboard():
     """
     Displays the high-level dashboard with robust data aggregation.
@@ -450,27 +460,13 @@ def health_dept_dashboard():
 
     conn = get_db_connection()
     
-    # 1. KPIs (remains the same, but is included for completeness)
-    total_patients = conn.execute("SELECT COUNT(id) FROM patients").fetchone()[0]
-    active_ashas = conn.execute("SELECT COUNT(DISTINCT asha_worker_phone) FROM patients").fetchone()[0]
-    high_risk_alerts = conn.execute("SELECT COUNT(id) FROM readings WHERE (reading_type = 'BP' AND (value1 > 140 OR value2 > 90)) OR (reading_type = 'SUGAR' AND value1 > 180)").fetchone()[0]
-    total_reports_filed = conn.execute("SELECT COUNT(id) FROM triage_reports").fetchone()[0]
-    kpis = {"total_patients": total_patients, "active_ashas": active_ashas, "high_risk_alerts": high_risk_alerts, "total_reports_filed": total_reports_filed}
-
-    # 2. Disease Trend Analysis (NEW ROBUST METHOD)
-    # This method analyzes the raw complaint text for keywords, which is more reliable.
-    reports = conn.execute("SELECT chief_complaint, notes FROM triage_reports").fetchall()
-    disease_trends = {'Fever': 0, 'Cough/Cold': 0, 'Stomach Issues': 0, 'Other': 0}
-    for report in reports:
-        full_text = (report['chief_complaint'] + " " + report['notes']).lower()
-        if 'fever' in full_text or 'headache' in full_text:
-            disease_trends['Fever'] += 1
-        elif 'cough' in full_text or 'sore throat' in full_text:
-            disease_trends['Cough/Cold'] += 1
-        elif 'stomach' in full_text or 'indigestion' in full_text or 'diarrhea' in full_text:
-            disease_trends['Stomach Issues'] += 1
-        else:
-            disease_trends['Other'] += 1
+    # 1. KPIs, read from the trigger-maintained rollup tables (see kpi_rollups.py)
+    kpis = get_kpis(conn)
+
+    # 2. Disease Trend Analysis: one GROUP BY over the indexed category column, optionally for a date range
+    trend_start = request.args.get('start') or None
+    trend_end = request.args.get('end') or None
+    disease_trends = get_disease_trends(conn, trend_start, trend_end)
 
     # 3. Pharmacy Inventory Summary (remains the same)
     inventory_summary_query = conn.execute("SELECT medication_name, stock_status, COUNT(id) as count FROM pharmacy_inventory GROUP BY medication_name, stock_status").fetchall()
@@ -481,26 +477,19 @@ def health_dept_dashboard():
             inventory_summary[med_name] = {'In Stock': 0, 'Low Stock': 0, 'Out of Stock': 0}
         inventory_summary[med_name][row['stock_status']] = row['count']
         
-    # 4. Hotspot Analysis (remains the same)
-    hotspot_query = conn.execute("""
-        SELECT p.village, COUNT(r.id) as alert_count FROM readings r JOIN patients p ON r.patient_id = p.id
-        WHERE (r.reading_type = 'BP' AND (r.value1 > 140 OR r.value2 > 90)) OR (r.reading_type = 'SUGAR' AND r.value1 > 180)
-        GROUP BY p.village ORDER BY alert_count DESC LIMIT 5
-    """).fetchall()
-    hotspot_data = [dict(row) for row in hotspot_query]
-
-    # 5. ASHA Leaderboard (remains the same)
-    asha_leaderboard_query = conn.execute("""
-        SELECT p.asha_worker_phone, COUNT(t.id) as report_count FROM triage_reports t 
-        JOIN patients p ON t.patient_id = p.id GROUP BY p.asha_worker_phone ORDER BY report_count DESC LIMIT 10
-    """).fetchall()
-    asha_leaderboard = [dict(row) for row in asha_leaderboard_query]
-        
+    # 4. Hotspot Analysis: alert counts per village, maintained by triggers on `alerts`
+    hotspot_data = get_hotspots(conn)
+
+    # 5. ASHA Leaderboard
+    asha_leaderboard = get_asha_leaderboard(conn)
+
     conn.close()
 
     return render_template("health_dept_dashboard.html", 
                            kpis=kpis, 
                            disease_trends=json.dumps(disease_trends),
+                           trend_start=trend_start,
+                           trend_end=trend_end,
                            inventory_summary=json.dumps(inventory_summary),
                            hotspot_data=hotspot_data,
                            asha_leaderboard=asha_leaderboard)
@@ -543,12 +532,63 @@ def add_new_medicine():
     return redirect(url_for('pharmacy_dashboard'))
 
 
+@app.route("/pharmacy/inventory/bulk", methods=['POST'])
+def bulk_inventory_update():
+    """Bulk upsert from a JSON body ({"items": [...]}) or an uploaded CSV / JSON / JSONL stock file."""
+    if not session.get('pharmacy_logged_in'):
+        return jsonify({"error": "Not authorized"}), 401
+    dry_run = request.args.get('dry_run') == '1'
+    upload = request.files.get('file')
+    json_body = None if upload else request.get_json(silent=True)
+    if upload is None and json_body is None:
+        return jsonify({"error": "Send a JSON body or a 'file' upload."}), 400
+    conn = get_db_connection()
+    try:
+        summary = import_upload(conn, file_storage=upload, json_body=json_body, dry_run=dry_run)
+    except InvalidStockPayload as e:
+        return jsonify({"error": f"Invalid stock rows: {e}", "errors": [{'row': number, 'reason': reason} for number, reason in e.errors]}), 400
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Could not read stock file: {e}"}), 400
+    finally:
+        conn.close()
+    summary['errors'] = [{'row': number, 'reason': reason} for number, reason in summary['errors']]
+    summary['dry_run'] = dry_run
+    return jsonify(summary)
+
+
 @app.route("/logout")
 def logout():
     session.clear()
     flash("You have been successfully logged out.", "info")
     return redirect(url_for('home'))
 
+@app.route('/api/v1/<resource>')
+def api_sync(resource):
+    """Since-cursor delta sync: ?since=<cursor>&limit=<n>&fields=a,b (see sync_api.py)."""
+    if resource not in SYNC_RESOURCES:
+        return jsonify({'error': f"Unknown resource. Available: {', '.join(SYNC_RESOURCES)}"}), 404
+    allowed, patient_id = allowed_scope(session, resource)
+    if not allowed: return jsonify({'error': 'unauthorized'}), 401
+    conn = get_db_connection()
+    try:
+        page = get_changes(conn, resource, request.args.get('since'), request.args.get('limit'),
+                           parse_fields(resource, request.args.get('fields')), patient_id)
+    except SyncError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    body, encoding = compress_json(dict(page, resource=resource), request.accept_encodings)
+    response = app.response_class(body, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding, Cookie'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Request / SQL / triage / SMS timings in Prometheus text format (see metrics.py)."""
+    return metrics.registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route("/tester")
 def sms_tester_page():
     return render_template("manual_sms_tester.html")
@@ -0,0 +1,132 @@
+"""
+Batch disease prediction for bulk triage backfills.
+
+Complaint texts are vectorised and predicted a chunk at a time (one sparse /
+dense matrix per chunk instead of one call per text), and chunks are spread
+over worker processes. `rescore_triage_reports()` streams every row of
+`triage_reports`, re-predicts it with the current model and writes back the
+rows whose prediction changed with one executemany + commit per batch - e.g.
+after a model retrain. Their `ai_prediction` report is regenerated too (one
+LLM report per disease, served from the triage_llm cache; run
+`python triage_llm.py --prewarm` first to stay offline), so the dashboards
+never show a diagnosis that disagrees with `predicted_disease`:
+
+    python batch_predict.py --rescore [--only-missing] [--chunk-size 1000] [--workers 4]
+    python batch_predict.py --file complaints.txt > predictions.csv
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from db import get_db_connection
+from migrations import apply_migrations
+from model_registry import registry
+from remedy_index import lookup_treatment
+from triage_llm import render_triage_report
+
+CHUNK_SIZE = 1000
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def _predict_chunk(texts):
+    disease_model, vectorizer, _ = registry.get()
+    if disease_model is None:
+        raise FileNotFoundError("Final model files not found. Please run train_final_model.py first.")
+    return [str(disease) for disease in disease_model.predict(vectorizer.transform(texts))]
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def predict_diseases(texts, chunk_size=CHUNK_SIZE, workers=DEFAULT_WORKERS, executor=None):
+    """Predicted disease for every text, in order. Pass `executor` to reuse a process pool across calls."""
+    texts = list(texts)
+    if not texts:
+        return []
+    chunks = list(_chunks(texts, chunk_size))
+    if executor is not None:
+        return [disease for result in executor.map(_predict_chunk, chunks) for disease in result]
+    if workers <= 1 or len(chunks) == 1:
+        return [disease for chunk in chunks for disease in _predict_chunk(chunk)]
+    # Load in the parent first so forked workers inherit (or mmap) the model instead of each loading it
+    registry.get()
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        return [disease for result in executor.map(_predict_chunk, chunks) for disease in result]
+
+
+def rescore_triage_reports(chunk_size=CHUNK_SIZE, workers=DEFAULT_WORKERS, only_missing=False, verbose=False):
+    """
+    Re-predicts predicted_disease for triage reports and regenerates ai_prediction where it changed.
+    Reports still pending / running are left to the triage worker. Returns the number of reports changed.
+    """
+    executor = None
+    _, _, remedy_index = registry.get()  # in the parent: forked workers inherit the model
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    conn = get_db_connection()
+    try:
+        query = "SELECT id, chief_complaint, notes, predicted_disease FROM triage_reports WHERE id > ? AND ai_status NOT IN ('pending', 'running')"
+        if only_missing:
+            query += " AND predicted_disease IS NULL"
+        query += " ORDER BY id LIMIT ?"
+        # Several chunks per executor round keeps every worker busy
+        batch_size = chunk_size * max(1, workers)
+        reports = {}  # disease -> report HTML, built once per run
+        scanned, changed, last_id = 0, 0, 0
+        while True:
+            # Keyset pagination so only one batch of rows is in memory at a time
+            batch = conn.execute(query, (last_id, batch_size)).fetchall()
+            if not batch:
+                return changed
+            texts = [f"{row['chief_complaint']} {row['notes'] or ''}" for row in batch]
+            diseases = predict_diseases(texts, chunk_size=chunk_size, workers=workers, executor=executor)
+            updates = []
+            for disease, row in zip(diseases, batch):
+                if disease == row['predicted_disease']:
+                    continue  # untouched, so the sync feed does not re-send it
+                if disease not in reports:
+                    reports[disease] = render_triage_report(disease, lookup_treatment(remedy_index, disease))
+                updates.append((disease, reports[disease], row['id']))
+            conn.executemany("UPDATE triage_reports SET predicted_disease = ?, ai_prediction = ?, ai_status = 'done' WHERE id = ?", updates)
+            conn.commit()
+            scanned += len(batch)
+            changed += len(updates)
+            last_id = batch[-1]['id']
+            if verbose:
+                print(f"... {scanned} reports re-scored, {changed} changed")
+    finally:
+        conn.close()
+        if executor is not None:
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batch disease prediction / triage report re-scoring")
+    parser.add_argument('--rescore', action='store_true', help="re-predict stored triage reports and regenerate the ones that changed")
+    parser.add_argument('--only-missing', action='store_true', help="with --rescore, only rows without a prediction")
+    parser.add_argument('--file', help="predict one complaint per line of this file and print CSV")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.rescore:
+        conn = get_db_connection()
+        apply_migrations(conn)
+        conn.close()
+        count = rescore_triage_reports(args.chunk_size, args.workers, args.only_missing, verbose=True)
+        print(f"--- Re-scored triage reports in {time.perf_counter() - start:.1f}s: {count} changed ---")
+    elif args.file:
+        with open(args.file, encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['complaint', 'predicted_disease'])
+        writer.writerows(zip(texts, predict_diseases(texts, args.chunk_size, args.workers)))
+        print(f"--- Predicted {len(texts)} complaints in {time.perf_counter() - start:.1f}s ---", file=sys.stderr)
+    else:
+        parser.print_help()
@@ -0,0 +1,281 @@
+"""
+Reproducible load benchmark for the Flask routes and the triage (ML + LLM) path.
+
+Builds (or reuses) a benchmark database seeded by synthetic_data.py, points the
+app at it with Twilio replaced by the fake SMS transport and OpenRouter by
+stub_llm_server.py, then drives every scenario with concurrent in-process
+clients (Flask test client, one per thread). Reports p50/p95/p99 latency and
+throughput per route. The cached dashboards run in three variants: warm
+(response cache hits), `_cold` (a unique query string per request, so every
+request misses and renders) and `_invalidated` (the page's cache version is
+bumped first, as a committed write would). Results can be saved as a named baseline under
+benchmarks/ and later runs compared against it; a p95 more than --tolerance
+above the baseline is reported as a regression (exit code 1).
+
+    python benchmark.py --patients 1000 --readings-per-patient 20 --save-baseline small
+    python benchmark.py --patients 1000 --readings-per-patient 20 --compare small
+    python benchmark.py --patients 50000 --readings-per-patient 20 --reseed --scenarios sms dashboard
+
+The database file is kept between runs (same size + seed = same data); --reseed rebuilds it.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from metrics import percentile
+from sms_loadgen import synthetic_bodies
+from stub_llm_server import start_stub_server
+
+BENCHMARK_DIR = 'benchmarks'
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 8
+WARMUP_REQUESTS = 5
+REGRESSION_TOLERANCE = 0.25
+
+
+# --- Database ---
+def prepare_database(path, patients, readings_per_patient, reports_per_patient, seed, reseed=False):
+    """Creates and seeds the benchmark database unless an identical one is already there."""
+    meta = {'patients': patients, 'readings_per_patient': readings_per_patient, 'reports_per_patient': reports_per_patient, 'seed': seed,
+            'alerts': True}
+    meta_path = f"{path}.json"
+    if not reseed and os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            if json.load(f) == meta:
+                print(f"... Reusing benchmark database '{path}'")
+                return
+    for suffix in ('', '-wal', '-shm', '.json'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    from migrations import apply_migrations
+    from synthetic_data import seed_synthetic_data
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    apply_migrations(conn)
+    start = time.perf_counter()
+    seed_synthetic_data(conn, patients, readings_per_patient, reports_per_patient, seed, verbose=True)
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"... Seeded '{path}' in {time.perf_counter() - start:.1f}s")
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+# --- Scenarios ---
+# Each scenario is fn(client, rng, context) -> HTTP status (or 200 for direct calls).
+def _sms(client, rng, context):
+    return client.post('/sms', data={'From': rng.choice(context['phones']), 'Body': rng.choice(context['bodies'])}).status_code
+
+
+def _cached_page(path, mode='warm', version=None):
+    """
+    GET scenario for a page behind the response cache. mode 'warm' measures cache hits, 'cold' misses
+    (unique query string) and 'invalidated' a miss after `version` was bumped, as a write to that table does.
+    """
+    def scenario(client, rng, context):
+        if mode == 'cold':
+            return client.get(f"{path}?bench={next(context['request_numbers'])}").status_code
+        if mode == 'invalidated':
+            conn = context['app'].get_db_connection()
+            conn.execute("UPDATE cache_versions SET version = version + 1 WHERE name = ?", (version,))
+            conn.commit()
+            conn.close()
+        return client.get(path).status_code
+    return scenario
+
+
+def _user_dashboard(client, rng, context):
+    with client.session_transaction() as session:
+        session['user_id'], session['user_name'] = rng.choice(context['patient_ids']), 'Benchmark User'
+    return client.get('/user_dashboard').status_code
+
+
+def _add_triage_report(client, rng, context):
+    return client.post(f"/patient/{rng.choice(context['patient_ids'])}/add_report",
+                       data={'chief_complaint': rng.choice(context['complaints']), 'notes': 'benchmark'}).status_code
+
+
+def _get_ai_prediction(client, rng, context):
+    context['app'].get_ai_prediction(rng.choice(context['complaints']))
+    return 200
+
+
+SCENARIOS = {
+    'sms': _sms,
+    'dashboard': _cached_page('/dashboard'),
+    'dashboard_cold': _cached_page('/dashboard', 'cold'),
+    'dashboard_invalidated': _cached_page('/dashboard', 'invalidated', 'readings'),
+    'health_dept_dashboard': _cached_page('/health_dept/dashboard'),
+    'health_dept_dashboard_cold': _cached_page('/health_dept/dashboard', 'cold'),
+    'health_dept_dashboard_invalidated': _cached_page('/health_dept/dashboard', 'invalidated', 'readings'),
+    'user_dashboard': _user_dashboard,
+    'pharmacy_dashboard': _cached_page('/pharmacy/dashboard'),
+    'pharmacy_dashboard_cold': _cached_page('/pharmacy/dashboard', 'cold'),
+    'pharmacy_dashboard_invalidated': _cached_page('/pharmacy/dashboard', 'invalidated', 'inventory'),
+    'add_triage_report': _add_triage_report,
+    'get_ai_prediction': _get_ai_prediction,
+}
+
+
+def run_scenario(name, health_app, context, requests=DEFAULT_REQUESTS, concurrency=DEFAULT_CONCURRENCY, seed=42):
+    """Runs one scenario; returns its result dict (latencies in ms)."""
+    scenario = SCENARIOS[name]
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = health_app.app.test_client()
+            with local.client.session_transaction() as session:
+                session['admin_logged_in'] = session['health_dept_logged_in'] = session['pharmacy_logged_in'] = True
+            local.rng = random.Random(f"{seed}-{name}-{threading.get_ident()}")
+        return local.client, local.rng
+
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def call(_):
+        nonlocal errors
+        c, rng = client()
+        start = time.perf_counter()
+        status = scenario(c, rng, context)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    for _ in range(WARMUP_REQUESTS):
+        scenario(*client(), context)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+    }
+
+
+# --- Reporting / baselines ---
+def print_results(results):
+    print(f"    {'scenario':<36}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results.items():
+        print(f"    {name:<36}{result['throughput_rps']:>9.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}")
+
+
+def baseline_path(name):
+    return os.path.join(BENCHMARK_DIR, f"baseline-{name}.json")
+
+
+def save_baseline(name, report):
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    with open(baseline_path(name), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+def compare_to_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """[(scenario, baseline p95, current p95)] for every scenario whose p95 grew by more than `tolerance`."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous and result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append((name, previous['p95_ms'], result['p95_ms']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Flask routes and the triage path")
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--readings-per-patient', type=int, default=20)
+    parser.add_argument('--reports-per-patient', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help="benchmark database (default benchmarks/bench-<patients>x<readings>.db)")
+    parser.add_argument('--reseed', action='store_true', help="rebuild the benchmark database")
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="timed requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--llm-delay', type=float, default=0.0, help="seconds the stub OpenRouter waits before answering")
+    parser.add_argument('--save-baseline', metavar='NAME')
+    parser.add_argument('--compare', metavar='NAME', help="compare p95 latencies against a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    database = args.db or os.path.join(BENCHMARK_DIR, f"bench-{args.patients}x{args.readings_per_patient}.db")
+    os.makedirs(os.path.dirname(database) or '.', exist_ok=True)
+    # Before anything imports db.py (the alert backfill during seeding does), so every module uses the benchmark database
+    os.environ['HEALTH_DB_PATH'] = database
+    print("--- Preparing benchmark database ---")
+    prepare_database(database, args.patients, args.readings_per_patient, args.reports_per_patient, args.seed, args.reseed)
+
+    # Must be set before the app (db.py, triage_llm.py) is imported
+    _, llm_url = start_stub_server(delay=args.llm_delay)
+    os.environ.update({'SMS_TRANSPORT': 'fake', 'OPENROUTER_URL': llm_url})
+    import app as health_app
+
+    conn = health_app.get_db_connection()
+    patient_rows = conn.execute("SELECT id, phone_number FROM patients ORDER BY id").fetchall()
+    conn.execute("DELETE FROM llm_report_cache")  # each run starts cold, so the LLM stub is on the measured path
+    conn.commit()
+    conn.close()
+    disease_model, _, _ = health_app.model_registry.get()
+    if disease_model is None:
+        print("!!! Local model not found: get_ai_prediction only measures the fallback path (see train_pipeline.py --promote)")
+    from synthetic_data import load_symptom_texts
+    context = {
+        'app': health_app,
+        'patient_ids': [row['id'] for row in patient_rows],
+        'phones': [row['phone_number'] for row in patient_rows],
+        'bodies': synthetic_bodies(1000, args.seed),
+        'complaints': [', '.join(symptoms.split(', ')[:3]) for symptoms, _ in load_symptom_texts()],
+        'request_numbers': count(),
+    }
+
+    print(f"--- Running {len(args.scenarios)} scenarios: {args.requests} requests each, concurrency {args.concurrency} ---")
+    results = {}
+    for name in args.scenarios:
+        results[name] = run_scenario(name, health_app, context, args.requests, args.concurrency, args.seed)
+        print(f"... {name}: p95 {results[name]['p95_ms']:.1f} ms")
+    health_app.reading_writer.flush()
+    health_app.triage_pipeline.shutdown()
+    print_results(results)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'dataset': {'patients': args.patients, 'readings_per_patient': args.readings_per_patient,
+                    'reports_per_patient': args.reports_per_patient, 'seed': args.seed},
+        'settings': {'requests': args.requests, 'concurrency': args.concurrency, 'llm_delay': args.llm_delay},
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'results': results,
+    }
+    if args.save_baseline:
+        save_baseline(args.save_baseline, report)
+        print(f"--- Baseline saved to '{baseline_path(args.save_baseline)}' ---")
+    if args.compare:
+        with open(baseline_path(args.compare), encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('dataset') != report['dataset'] or baseline.get('settings') != report['settings']:
+            print("!!! Baseline was recorded with a different dataset or settings; comparison is indicative only")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"!!! Regression in {name}: p95 {before:.1f} ms -> {after:.1f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"--- No p95 regressions against baseline '{args.compare}' (tolerance {args.tolerance:.0%}) ---")
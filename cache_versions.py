@@ -0,0 +1,32 @@
+"""
+Write counters for invalidating in-process caches.
+
+Each cached data set has a row in `cache_versions`. Triggers on the tables
+behind it bump the row on every INSERT / UPDATE / DELETE, whichever code path
+or process made the change. A cache keeps the version it was built from and
+rebuilds when `get_version()` (a primary-key lookup) returns something else.
+"""
+
+
+def version_triggers(name, table):
+    """CREATE TRIGGER statements that bump cache version `name` on any write to `table`."""
+    statements = []
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()} AFTER {event} ON {table} "
+            f"BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = '{name}'; END"
+        )
+    return statements
+
+
+def schema_statements(name, tables):
+    return [
+        "CREATE TABLE IF NOT EXISTS cache_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)",
+        f"INSERT OR IGNORE INTO cache_versions (name) VALUES ('{name}')",
+        *[statement for table in tables for statement in version_triggers(name, table)],
+    ]
+
+
+def get_version(conn, name):
+    row = conn.execute("SELECT version FROM cache_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
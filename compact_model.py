@@ -0,0 +1,264 @@
+"""
+Portable, memory-mappable export of the disease model.
+
+The pickled RandomForest + TfidfVectorizer need scikit-learn (of a matching
+version) to load, are slow to unpickle and every worker process ends up with
+its own private copy. `export_compact_model()` flattens them into plain .npy
+arrays plus a small JSON header:
+
+    final_model_compact/
+        meta.json        vectorizer settings, vocabulary, class names
+        idf.npy          per-feature idf weights
+        roots.npy        first node of every tree
+        left.npy / right.npy / feature.npy / threshold.npy   all trees' nodes, concatenated
+        leaf_index.npy   node -> row in the leaf probability table (-1 for split nodes)
+        leaf_ptr.npy / leaf_class.npy / leaf_prob.npy         sparse per-leaf class probabilities
+
+The arrays are opened with numpy's mmap_mode='r', so forked workers share the
+same read-only pages, and prediction only needs numpy.
+
+    python compact_model.py --export   # write final_model_compact/ from the pickles and check parity
+    python compact_model.py --check    # compare an existing export against the pickles
+"""
+import argparse
+import csv
+import json
+import os
+import pickle
+import re
+import sys
+
+import numpy as np
+
+from model_registry import COMPACT_MODEL_DIR
+
+FORMAT_VERSION = 1
+PARITY_THRESHOLD = 0.995  # minimum share of identical predictions vs the pickled model
+
+ARRAY_NAMES = ['idf', 'roots', 'left', 'right', 'feature', 'threshold', 'leaf_index', 'leaf_ptr', 'leaf_class', 'leaf_prob']
+
+
+# --- Vectorizer ---
+class CompactVectorizer:
+    """Re-implementation of TfidfVectorizer.transform() (word analyzer) over exported arrays."""
+
+    def __init__(self, meta, idf):
+        self.vocabulary = meta['vocabulary']
+        self.stop_words = frozenset(meta['stop_words'] or ())
+        self.token_pattern = re.compile(meta['token_pattern'])
+        self.lowercase = meta['lowercase']
+        self.ngram_range = tuple(meta['ngram_range'])
+        self.norm = meta['norm']
+        self.sublinear_tf = meta['sublinear_tf']
+        self.idf = idf
+
+    def _analyze(self, text):
+        if self.lowercase:
+            text = text.lower()
+        tokens = [token for token in self.token_pattern.findall(text) if token not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        terms = tokens if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def transform(self, texts):
+        """Dense (len(texts), n_features) float64 tf-idf matrix."""
+        X = np.zeros((len(texts), len(self.idf)), dtype=np.float64)
+        for row, text in enumerate(texts):
+            for term in self._analyze(text):
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    X[row, column] += 1
+        if self.sublinear_tf:
+            # 1 + log(tf) for the non-zero counts (a count of 1 becomes 1, not 0)
+            counted = X > 0
+            np.log(X, where=counted, out=X)
+            X[counted] += 1
+        X *= self.idf
+        if self.norm == 'l2':
+            norms = np.sqrt((X * X).sum(axis=1, keepdims=True))
+            np.divide(X, norms, out=X, where=norms > 0)
+        elif self.norm == 'l1':
+            norms = np.abs(X).sum(axis=1, keepdims=True)
+            np.divide(X, norms, out=X, where=norms > 0)
+        return X
+
+
+# --- Forest ---
+class CompactForest:
+    """Array-backed RandomForestClassifier.predict()/predict_proba()."""
+
+    def __init__(self, meta, arrays):
+        self.classes_ = np.array(meta['classes'], dtype=object)
+        self.n_trees = len(arrays['roots'])
+        for name in ARRAY_NAMES:
+            # Plain ndarray views over the memory map (no copy) index faster than np.memmap objects
+            setattr(self, name, np.asarray(arrays[name]))
+
+    def _leaves(self, X):
+        """Leaf node reached by every sample in every tree, shape (n_samples, n_trees)."""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+        node = np.tile(self.roots, n_samples)
+        sample = np.repeat(np.arange(n_samples), self.n_trees)
+        active = np.arange(node.size)
+        # Walk all (sample, tree) pairs one level per step, dropping the ones that reached a leaf
+        while active.size:
+            current = node[active]
+            left = self.left[current]
+            split = left != -1
+            active, current, left = active[split], current[split], left[split]
+            go_left = X[sample[active], self.feature[current]] <= self.threshold[current]
+            node[active] = np.where(go_left, left, self.right[current])
+        return node.reshape(n_samples, self.n_trees)
+
+    def predict_proba(self, X):
+        leaves = self.leaf_index[self._leaves(X)].ravel()
+        n_samples = leaves.size // self.n_trees
+        starts = self.leaf_ptr[leaves]
+        counts = self.leaf_ptr[leaves + 1] - starts
+        sample = np.repeat(np.repeat(np.arange(n_samples), self.n_trees), counts)
+        position = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        proba = np.zeros((n_samples, len(self.classes_)), dtype=np.float64)
+        np.add.at(proba, (sample, self.leaf_class[position]), self.leaf_prob[position])
+        return proba / self.n_trees
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+# --- Export / load ---
+def _check_supported(vectorizer):
+    """Raises ValueError for vectorizer settings CompactVectorizer does not reproduce."""
+    unsupported = []
+    if vectorizer.analyzer != 'word':
+        unsupported.append(f"analyzer={vectorizer.analyzer!r}")
+    for name in ('tokenizer', 'preprocessor', 'strip_accents'):
+        if getattr(vectorizer, name) is not None:
+            unsupported.append(f"{name}={getattr(vectorizer, name)!r}")
+    if vectorizer.binary:
+        unsupported.append("binary=True")
+    if not vectorizer.use_idf:
+        unsupported.append("use_idf=False")
+    if vectorizer.norm not in ('l1', 'l2', None):
+        unsupported.append(f"norm={vectorizer.norm!r}")
+    if unsupported:
+        raise ValueError(f"Cannot export a compact model for a TfidfVectorizer with {', '.join(unsupported)}")
+
+
+def export_compact_model(model, vectorizer, out_dir=COMPACT_MODEL_DIR):
+    _check_supported(vectorizer)
+    os.makedirs(out_dir, exist_ok=True)
+    stop_words = vectorizer.get_stop_words()
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'vocabulary': {term: int(index) for term, index in vectorizer.vocabulary_.items()},
+        'stop_words': sorted(stop_words) if stop_words else None,
+        'token_pattern': vectorizer.token_pattern,
+        'lowercase': vectorizer.lowercase,
+        'ngram_range': list(vectorizer.ngram_range),
+        'norm': vectorizer.norm,
+        'sublinear_tf': vectorizer.sublinear_tf,
+        'classes': [str(c) for c in model.classes_],
+    }
+
+    roots, left, right, feature, threshold, leaf_index = [], [], [], [], [], []
+    leaf_ptr, leaf_class, leaf_prob = [0], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        roots.append(offset)
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        node_leaf = np.full(tree.node_count, -1, dtype=np.int64)
+        values = tree.value[:, 0, :]
+        for node in np.flatnonzero(is_leaf):
+            node_leaf[node] = len(leaf_ptr) - 1
+            probs = values[node] / values[node].sum()
+            nonzero = np.flatnonzero(probs)
+            leaf_class.extend(nonzero)
+            leaf_prob.extend(probs[nonzero])
+            leaf_ptr.append(len(leaf_class))
+        leaf_index.append(node_leaf)
+        offset += tree.node_count
+
+    arrays = {
+        'idf': np.asarray(vectorizer.idf_, dtype=np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'left': np.concatenate(left).astype(np.int32),
+        'right': np.concatenate(right).astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'leaf_index': np.concatenate(leaf_index).astype(np.int32),
+        'leaf_ptr': np.asarray(leaf_ptr, dtype=np.int32),
+        'leaf_class': np.asarray(leaf_class, dtype=np.int32),
+        'leaf_prob': np.asarray(leaf_prob, dtype=np.float64),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+    with open(os.path.join(out_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return out_dir
+
+
+def load_compact_model(model_dir=COMPACT_MODEL_DIR):
+    """Returns (CompactForest, CompactVectorizer) backed by read-only memory-mapped arrays."""
+    with open(os.path.join(model_dir, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact model format {meta.get('format_version')} in {model_dir}")
+    arrays = {name: np.load(os.path.join(model_dir, f"{name}.npy"), mmap_mode='r') for name in ARRAY_NAMES}
+    return CompactForest(meta, arrays), CompactVectorizer(meta, arrays['idf'])
+
+
+def check_parity(model, vectorizer, compact_forest, compact_vectorizer, texts):
+    """Share of `texts` where the compact model predicts the same disease as the pickled one."""
+    expected = model.predict(vectorizer.transform(texts))
+    actual = compact_forest.predict(compact_vectorizer.transform(texts))
+    return float(np.mean(expected == actual))
+
+
+def _load_pickles(model_path='final_disease_model.pkl', vectorizer_path='final_vectorizer.pkl'):
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(vectorizer_path, 'rb') as f:
+        vectorizer = pickle.load(f)
+    return model, vectorizer
+
+
+def _sample_texts(csv_path='final_remedy_dataset.csv'):
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)  # header: Symptoms, Disease, Treatment
+        return [row[0] for row in reader]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export / verify the compact disease model")
+    parser.add_argument('--export', action='store_true', help="write the compact model from the pickled one")
+    parser.add_argument('--check', action='store_true', help="check prediction parity against the pickled model")
+    parser.add_argument('--out', default=COMPACT_MODEL_DIR)
+    args = parser.parse_args()
+    if not (args.export or args.check):
+        parser.print_help()
+        sys.exit(0)
+
+    model, vectorizer = _load_pickles()
+    if args.export:
+        export_compact_model(model, vectorizer, args.out)
+        size = sum(os.path.getsize(os.path.join(args.out, name)) for name in os.listdir(args.out))
+        print(f"... Compact model written to '{args.out}/' ({size / 1024:.0f} KB)")
+
+    compact_forest, compact_vectorizer = load_compact_model(args.out)
+    agreement = check_parity(model, vectorizer, compact_forest, compact_vectorizer, _sample_texts())
+    print(f"... Prediction parity with the pickled model: {agreement:.2%}")
+    if agreement < PARITY_THRESHOLD:
+        print(f"!!! Parity below {PARITY_THRESHOLD:.1%}, do not deploy this export.")
+        sys.exit(1)
@@ -0,0 +1,134 @@
+"""
+Batched data loader for the doctor's /dashboard monitoring view.
+
+Instead of running four queries for every patient, one page of patients is
+loaded first and then the readings, triage reports, prescriptions and BP
+chart points for *all* of them are fetched with one set-based query each.
+ROW_NUMBER() OVER (PARTITION BY patient_id ...) keeps the per-patient
+"last N" limits, so the page cost depends on the page size only.
+"""
+
+DASHBOARD_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+RECENT_READINGS_LIMIT = 5
+RECENT_REPORTS_LIMIT = 3
+BP_CHART_POINTS = 7
+RECENT_ALERTS_LIMIT = 3
+
+
+def _placeholders(values):
+    return ", ".join("?" for _ in values)
+
+
+def _group_by_patient(rows, patient_ids):
+    """Buckets rows (already ordered per patient) into {patient_id: [dict, ...]}."""
+    grouped = {patient_id: [] for patient_id in patient_ids}
+    for row in rows:
+        item = dict(row)
+        item.pop('rn', None)
+        grouped[item['patient_id']].append(item)
+    return grouped
+
+
+def _patient_filters(village=None, asha_phone=None):
+    clauses, params = [], []
+    if village:
+        clauses.append("village = ?")
+        params.append(village)
+    if asha_phone:
+        clauses.append("asha_worker_phone = ?")
+        params.append(asha_phone)
+    where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where_sql, params
+
+
+def get_filter_options(conn):
+    """Distinct villages and ASHA worker phones for the dashboard filter dropdowns."""
+    villages = [row[0] for row in conn.execute(
+        "SELECT DISTINCT village FROM patients WHERE village IS NOT NULL AND village != '' ORDER BY village")]
+    asha_phones = [row[0] for row in conn.execute(
+        "SELECT DISTINCT asha_worker_phone FROM patients WHERE asha_worker_phone IS NOT NULL AND asha_worker_phone != '' ORDER BY asha_worker_phone")]
+    return {'villages': villages, 'asha_phones': asha_phones}
+
+
+def load_monitoring_page(conn, page=1, per_page=DASHBOARD_PAGE_SIZE, village=None, asha_phone=None):
+    """
+    Builds the `patients_data` list for one page of the monitoring dashboard.
+    Returns a dict with the patients plus the pagination details the template needs.
+    """
+    per_page = max(1, min(int(per_page), MAX_PAGE_SIZE))
+    where_sql, params = _patient_filters(village, asha_phone)
+
+    total = conn.execute(f"SELECT COUNT(id) FROM patients {where_sql}", params).fetchone()[0]
+    pages = max(1, (total + per_page - 1) // per_page)
+    page = max(1, min(int(page), pages))
+    offset = (page - 1) * per_page
+
+    patient_rows = conn.execute(
+        f"SELECT * FROM patients {where_sql} ORDER BY name LIMIT ? OFFSET ?",
+        params + [per_page, offset]
+    ).fetchall()
+    patient_ids = [row['id'] for row in patient_rows]
+
+    pagination = {'page': page, 'pages': pages, 'per_page': per_page, 'total': total}
+    if not patient_ids:
+        return {'patients': [], 'pagination': pagination}
+
+    marks = _placeholders(patient_ids)
+
+    # 1. Last 5 SMS readings per patient
+    readings_rows = conn.execute(f"""
+        SELECT * FROM (
+            SELECT *, strftime('%Y-%m-%d %-I:%M %p', timestamp) as formatted_time,
+                   ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY timestamp DESC) as rn
+            FROM readings WHERE patient_id IN ({marks})
+        ) WHERE rn <= ? ORDER BY patient_id, rn
+    """, patient_ids + [RECENT_READINGS_LIMIT]).fetchall()
+
+    # 2. Last 3 triage reports per patient
+    reports_rows = conn.execute(f"""
+        SELECT * FROM (
+            SELECT *, strftime('%Y-%m-%d %-I:%M %p', timestamp) as formatted_time,
+                   ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY timestamp DESC) as rn
+            FROM triage_reports WHERE patient_id IN ({marks})
+        ) WHERE rn <= ? ORDER BY patient_id, rn
+    """, patient_ids + [RECENT_REPORTS_LIMIT]).fetchall()
+
+    # 3. Active prescriptions
+    prescriptions_rows = conn.execute(
+        f"SELECT * FROM prescriptions WHERE patient_id IN ({marks}) AND is_active = 1 ORDER BY patient_id, id",
+        patient_ids
+    ).fetchall()
+
+    # 4. BP chart points (first 7 BP readings in time order, as before)
+    bp_rows = conn.execute(f"""
+        SELECT * FROM (
+            SELECT patient_id, value1, value2, strftime('%d-%b', timestamp) as chart_time,
+                   ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY timestamp ASC) as rn
+            FROM readings WHERE patient_id IN ({marks}) AND reading_type = 'BP'
+        ) WHERE rn <= ? ORDER BY patient_id, rn
+    """, patient_ids + [BP_CHART_POINTS]).fetchall()
+
+    # 5. Latest alerts per patient, from the alert engine's `alerts` table
+    alerts_rows = conn.execute(f"""
+        SELECT * FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY reading_time DESC) as rn
+            FROM alerts WHERE patient_id IN ({marks})
+        ) WHERE rn <= ? ORDER BY patient_id, rn
+    """, patient_ids + [RECENT_ALERTS_LIMIT]).fetchall()
+
+    readings_by_patient = _group_by_patient(readings_rows, patient_ids)
+    reports_by_patient = _group_by_patient(reports_rows, patient_ids)
+    prescriptions_by_patient = _group_by_patient(prescriptions_rows, patient_ids)
+    bp_by_patient = _group_by_patient(bp_rows, patient_ids)
+    alerts_by_patient = _group_by_patient(alerts_rows, patient_ids)
+
+    patients_data = []
+    for patient_row in patient_rows:
+        patient_id = patient_row['id']
+        bp_points = bp_by_patient[patient_id]
+        chart_data = {'labels': [row['chart_time'] for row in bp_points], 'systolic': [row['value1'] for row in bp_points], 'diastolic': [row['value2'] for row in bp_points]}
+        patients_data.append({'info': dict(patient_row), 'readings': readings_by_patient[patient_id], 'reports': reports_by_patient[patient_id], 'prescriptions': prescriptions_by_patient[patient_id], 'alerts': alerts_by_patient[patient_id], 'chart_data': chart_data})
+
+    return {'patients': patients_data, 'pagination': pagination}
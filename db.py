@@ -0,0 +1,147 @@
+"""
+SQLite connection layer for the Flask app.
+
+Connections are opened once, tuned (WAL journaling + pragmas) and kept in a
+small pool instead of being created and torn down on every request. Inside a
+request, `get_db_connection()` always hands back the same connection (stored
+on `flask.g`) and the teardown hook returns it to the pool, so the existing
+`conn.close()` calls in the routes are harmless. Outside a request (scripts,
+background workers) `close()` simply gives the connection back to the pool.
+`get_pooled_connection()` always hands out a separate connection, for code
+that commits its own transaction without committing the route's writes too.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import g, has_app_context
+
+from metrics import record_query
+from migrations import apply_migrations
+
+DATABASE_PATH = os.environ.get('HEALTH_DB_PATH', 'health.db')
+
+POOL_SIZE = 8
+# Number of compiled statements sqlite3 keeps per connection (prepared-statement reuse)
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every new connection. WAL lets /sms writers and dashboard readers
+# work at the same time; NORMAL sync is safe under WAL and avoids an fsync per commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -20000",      # ~20 MB page cache
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped I/O
+    "PRAGMA busy_timeout = 5000",      # wait up to 5 s for a lock instead of failing
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() returns it to the pool instead of closing it."""
+
+    # Statement count and time go to the per-request metrics (see metrics.py)
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            record_query(time.perf_counter() - start)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            record_query(time.perf_counter() - start)
+
+    def close(self):
+        pool = getattr(self, 'pool', None)
+        if pool is None:
+            super().close()
+        elif not getattr(self, 'request_bound', False):
+            pool.release(self)
+        # Request-bound connections are released by the teardown hook.
+
+    def really_close(self):
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    def __init__(self, database, max_size=POOL_SIZE):
+        self.database = database
+        self.max_size = max_size
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False, timeout=5.0,
+                               cached_statements=STATEMENT_CACHE_SIZE, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.pool = self
+        conn.request_bound = False
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        conn.request_bound = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.really_close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.really_close()
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().really_close()
+                except queue.Empty:
+                    break
+
+
+pool = ConnectionPool(DATABASE_PATH)
+
+
+def get_db_connection():
+    """Returns a pooled connection; inside an app context the same one is reused until teardown."""
+    if has_app_context():
+        if 'db_conn' not in g:
+            g.db_conn = pool.acquire()
+            g.db_conn.request_bound = True
+        return g.db_conn
+    return pool.acquire()
+
+
+def get_pooled_connection():
+    """A pooled connection of its own, even inside a request; for work that commits independently of the route."""
+    return pool.acquire()
+
+
+def release_db_connection(exception=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+def init_app(app):
+    conn = pool.acquire()
+    try:
+        apply_migrations(conn)
+    finally:
+        conn.close()
+    app.teardown_appcontext(release_db_connection)
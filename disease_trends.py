@@ -0,0 +1,60 @@
+"""
+Disease-trend categories for triage reports.
+
+Every report gets a `disease_category` when it is inserted (by trigger, so all
+write paths are covered) using the same keyword rules the health department
+dashboard always used. With an index on (timestamp, disease_category) the
+trend chart is a single GROUP BY over the selected date range instead of a
+Python loop over every report ever filed.
+"""
+# (category, keywords) - checked in order, first match wins
+CATEGORY_KEYWORDS = [
+    ('Fever', ('fever', 'headache')),
+    ('Cough/Cold', ('cough', 'sore throat')),
+    ('Stomach Issues', ('stomach', 'indigestion', 'diarrhea')),
+]
+OTHER_CATEGORY = 'Other'
+
+
+def category_sql(alias):
+    """SQL CASE expression computing the category of the triage_reports row `alias`."""
+    text = f"lower(IFNULL({alias}.chief_complaint, '') || ' ' || IFNULL({alias}.notes, ''))"
+    whens = []
+    for category, keywords in CATEGORY_KEYWORDS:
+        condition = " OR ".join(f"instr({text}, '{keyword}') > 0" for keyword in keywords)
+        whens.append(f"WHEN {condition} THEN '{category}'")
+    return f"CASE {' '.join(whens)} ELSE '{OTHER_CATEGORY}' END"
+
+
+SCHEMA_STATEMENTS = [
+    "ALTER TABLE triage_reports ADD COLUMN disease_category TEXT",
+    f"UPDATE triage_reports SET disease_category = {category_sql('triage_reports')}",
+    # Covering index for "reports per category between two dates"
+    "CREATE INDEX IF NOT EXISTS idx_triage_time_category ON triage_reports(timestamp, disease_category)",
+    f'''CREATE TRIGGER IF NOT EXISTS trg_triage_category_insert AFTER INSERT ON triage_reports
+        WHEN NEW.disease_category IS NULL
+        BEGIN UPDATE triage_reports SET disease_category = {category_sql('NEW')} WHERE id = NEW.id; END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_triage_category_update AFTER UPDATE OF chief_complaint, notes ON triage_reports
+        BEGIN UPDATE triage_reports SET disease_category = {category_sql('NEW')} WHERE id = NEW.id; END''',
+]
+
+
+def get_disease_trends(conn, start_date=None, end_date=None):
+    """{category: report count} for reports filed between start_date and end_date (YYYY-MM-DD, inclusive)."""
+    query = "SELECT disease_category, COUNT(*) as count FROM triage_reports"
+    conditions, params = [], []
+    if start_date:
+        conditions.append("timestamp >= ?")
+        params.append(start_date)
+    if end_date:
+        # timestamps are 'YYYY-MM-DD HH:MM:SS', so compare against the start of the next day
+        conditions.append("timestamp < date(?, '+1 day')")
+        params.append(end_date)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " GROUP BY disease_category"
+    trends = {category: 0 for category, _ in CATEGORY_KEYWORDS}
+    trends[OTHER_CATEGORY] = 0
+    for row in conn.execute(query, params):
+        trends[row['disease_category'] or OTHER_CATEGORY] += row['count']
+    return trends
@@ -0,0 +1,149 @@
+"""
+Grid-based spatial index for nearest-pharmacy lookups.
+
+Points are bucketed into GRID_CELL_DEGREES x GRID_CELL_DEGREES cells. A query
+walks outward one ring of cells at a time and stops once the next ring cannot
+hold anything closer than the k-th match, so only a few cells are visited.
+Queries from outside the occupied area start at its edge, and once a ring
+would be larger than the number of occupied cells those are scanned directly,
+so a lookup stays well under a millisecond with thousands of pharmacies even
+for outlying coordinates.
+Distances are great-circle (haversine) kilometres.
+
+    python geo_index.py --import locations.csv   # columns: kind (pharmacy|village), name, latitude, longitude
+"""
+import argparse
+import csv
+import heapq
+import math
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180   # ~111 km per degree of latitude
+GRID_CELL_DEGREES = 0.1                          # ~11 km cells
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    def __init__(self, points, cell_degrees=GRID_CELL_DEGREES):
+        """`points` is an iterable of (latitude, longitude, item)."""
+        self.cell_degrees = cell_degrees
+        self.cells = defaultdict(list)
+        for latitude, longitude, item in points:
+            self.cells[self._cell(latitude, longitude)].append((latitude, longitude, item))
+        rows = [row for row, _ in self.cells] or [0]
+        cols = [col for _, col in self.cells] or [0]
+        self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self):
+        return sum(len(points) for points in self.cells.values())
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def _ring(self, row, col, radius):
+        if radius == 0:
+            yield row, col
+            return
+        for d in range(-radius, radius + 1):
+            yield row - radius, col + d
+            yield row + radius, col + d
+        for d in range(-radius + 1, radius):
+            yield row + d, col - radius
+            yield row + d, col + radius
+
+    def _ring_min_km(self, latitude, radius):
+        """Lower bound on the distance to anything in ring `radius` or beyond."""
+        if radius <= 1:
+            return 0.0
+        # Cells in the ring are at least (radius - 1) whole cells away in latitude or longitude;
+        # longitude degrees are shortest at the highest latitude the ring reaches.
+        span = (radius - 1) * self.cell_degrees
+        highest_latitude = min(89.9, abs(latitude) + (radius + 1) * self.cell_degrees)
+        return span * KM_PER_DEGREE * math.cos(math.radians(highest_latitude))
+
+    def nearest(self, latitude, longitude, k=5, accept=None, max_km=None):
+        """[(distance_km, item)] for the k closest items where accept(item) is true, nearest first."""
+        row, col = self._cell(latitude, longitude)
+        min_row, max_row, min_col, max_col = self._bounds
+        # Rings short of the occupied bounding box are empty: a point far outside it (bad or (0, 0)
+        # coordinates) starts at the box instead of walking thousands of empty rings
+        first_radius = max(min_row - row, row - max_row, min_col - col, col - max_col, 0)
+        max_radius = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        best = []   # max-heap of the k closest so far: (-distance, counter, item)
+        counter = 0
+
+        def consider(points):
+            nonlocal counter
+            for point_latitude, point_longitude, item in points:
+                if accept is not None and not accept(item):
+                    continue
+                distance = haversine_km(latitude, longitude, point_latitude, point_longitude)
+                if max_km is not None and distance > max_km:
+                    continue
+                counter += 1
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, counter, item))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, counter, item))
+
+        for radius in range(first_radius, max_radius + 1):
+            bound = self._ring_min_km(latitude, radius)
+            if (len(best) == k and bound > -best[0][0]) or (max_km is not None and bound > max_km):
+                break
+            if 8 * radius > len(self.cells):
+                # The ring has more cells than the whole grid has occupied ones (a sparse, spread-out
+                # grid): checking the remaining occupied cells directly is cheaper than walking the rings
+                for (cell_row, cell_col), points in self.cells.items():
+                    if max(abs(cell_row - row), abs(cell_col - col)) >= radius:
+                        consider(points)
+                break
+            for cell in self._ring(row, col, radius):
+                consider(self.cells.get(cell, ()))
+        return [(-negative, item) for negative, _, item in sorted(best, reverse=True)]
+
+
+def get_village_location(conn, village):
+    """(latitude, longitude) of a village from the `villages` table, or None."""
+    if not village:
+        return None
+    row = conn.execute("SELECT latitude, longitude FROM villages WHERE name = ?", (village.strip(),)).fetchone()
+    return (row['latitude'], row['longitude']) if row else None
+
+
+def import_locations(conn, rows):
+    """Sets coordinates from rows with kind (pharmacy|village), name, latitude, longitude. Returns (pharmacies, villages)."""
+    pharmacy_updates, villages = [], []
+    for row in rows:
+        kind = (row.get('kind') or '').strip().lower()
+        name = (row.get('name') or '').strip()
+        latitude, longitude = float(row['latitude']), float(row['longitude'])
+        if kind == 'pharmacy':
+            pharmacy_updates.append((latitude, longitude, name))
+        elif kind == 'village':
+            villages.append((name, latitude, longitude))
+    conn.executemany("UPDATE pharmacies SET latitude = ?, longitude = ? WHERE name = ?", pharmacy_updates)
+    conn.executemany("INSERT OR REPLACE INTO villages (name, latitude, longitude) VALUES (?, ?, ?)", villages)
+    conn.commit()
+    return len(pharmacy_updates), len(villages)
+
+
+if __name__ == '__main__':
+    from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Pharmacy / village coordinates")
+    parser.add_argument('--import', dest='import_path', help="CSV with kind, name, latitude, longitude")
+    args = parser.parse_args()
+    if not args.import_path:
+        parser.print_help()
+    else:
+        conn = get_db_connection()
+        with open(args.import_path, newline='', encoding='utf-8-sig') as f:
+            pharmacies, villages = import_locations(conn, csv.DictReader(f))
+        conn.close()
+        print(f"--- Imported coordinates for {pharmacies} pharmacies and {villages} villages ---")
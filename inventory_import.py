@@ -0,0 +1,196 @@
+"""
+Bulk pharmacy inventory sync.
+
+District stores send their whole stock list every night. `apply_stock_updates()`
+diffs the incoming rows against `pharmacy_inventory` (one query) and applies
+only the differences, with one executemany for new items and one for changed
+ones, in a single transaction. `last_updated` moves only for rows whose status
+actually changed. Items missing from the file are left alone.
+
+Rows identify the pharmacy by `pharmacy_id` or by `pharmacy` (name):
+
+    pharmacy_id,medication_name,stock_status
+    1,Paracetamol 500mg,In Stock
+
+Used by POST /pharmacy/inventory/bulk and from the command line:
+
+    python inventory_import.py stock.csv [--format csv|json|jsonl] [--dry-run]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+VALID_STATUSES = ('In Stock', 'Low Stock', 'Out of Stock')
+_STATUS_LOOKUP = {status.lower(): status for status in VALID_STATUSES}
+
+
+class InvalidStockPayload(ValueError):
+    """The payload is not a list of row objects. `errors` lists the offending rows as [(row number, reason), ...]."""
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+def _not_an_object(item):
+    return f"expected an object with medication_name / stock_status, got {type(item).__name__}"
+
+
+def stock_items(data):
+    """The rows of a decoded JSON payload (a list, or {"items": [...]}); raises InvalidStockPayload otherwise."""
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise InvalidStockPayload('expected a list of stock rows or {"items": [...]}')
+    errors = [(number, _not_an_object(item)) for number, item in enumerate(items, start=1) if not isinstance(item, dict)]
+    if errors:
+        raise InvalidStockPayload("every stock row must be an object", errors)
+    return items
+
+
+# --- Reading stock files ---
+def read_stock_rows(stream, fmt='csv'):
+    """Yields one dict per row of a CSV, JSON (list or {"items": [...]}) or JSON Lines text stream."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                item = json.loads(line)
+                if not isinstance(item, dict):
+                    raise InvalidStockPayload("every stock row must be an object", [(number, _not_an_object(item))])
+                yield item
+    elif fmt == 'json':
+        yield from stock_items(json.load(stream))
+    else:
+        raise ValueError(f"Unsupported stock file format '{fmt}'")
+
+
+def guess_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return extension if extension in ('csv', 'json', 'jsonl') else 'csv'
+
+
+# --- Diff + apply ---
+def _normalize_row(row, pharmacy_ids_by_name):
+    """(pharmacy_id, medication_name, stock_status) or raises ValueError with a readable reason."""
+    if not isinstance(row, dict):
+        raise ValueError(_not_an_object(row))
+    medication_name = str(row.get('medication_name') or '').strip()
+    if not medication_name:
+        raise ValueError("missing medication_name")
+    status = _STATUS_LOOKUP.get(str(row.get('stock_status') or '').strip().lower())
+    if status is None:
+        raise ValueError(f"invalid stock_status {row.get('stock_status')!r}")
+    pharmacy_id = row.get('pharmacy_id')
+    if pharmacy_id in (None, ''):
+        pharmacy_id = pharmacy_ids_by_name.get(str(row.get('pharmacy') or '').strip().lower())
+        if pharmacy_id is None:
+            raise ValueError(f"unknown pharmacy {row.get('pharmacy')!r}")
+    else:
+        try:
+            pharmacy_id = int(pharmacy_id)
+        except (ValueError, TypeError):
+            raise ValueError(f"invalid pharmacy_id {pharmacy_id!r}") from None
+        if pharmacy_id not in pharmacy_ids_by_name.values():
+            raise ValueError(f"unknown pharmacy_id {pharmacy_id}")
+    return pharmacy_id, medication_name, status
+
+
+def apply_stock_updates(conn, rows, dry_run=False):
+    """
+    Syncs `rows` (dicts, see module docstring) into pharmacy_inventory.
+    Returns {'inserted', 'updated', 'unchanged', 'errors': [(row number, reason), ...]}.
+    """
+    pharmacy_ids_by_name = {row['name'].lower(): row['id'] for row in conn.execute("SELECT id, name FROM pharmacies")}
+    current = {(row['pharmacy_id'], row['medication_name'].lower()): (row['id'], row['stock_status'])
+               for row in conn.execute("SELECT id, pharmacy_id, medication_name, stock_status FROM pharmacy_inventory")}
+
+    # Last row wins if the file lists the same item twice
+    incoming, errors = {}, []
+    for number, row in enumerate(rows, start=1):
+        try:
+            pharmacy_id, medication_name, status = _normalize_row(row, pharmacy_ids_by_name)
+        except (ValueError, TypeError) as e:
+            errors.append((number, str(e)))
+            continue
+        incoming[(pharmacy_id, medication_name.lower())] = (pharmacy_id, medication_name, status)
+
+    inserts, updates, unchanged = [], [], 0
+    for key, (pharmacy_id, medication_name, status) in incoming.items():
+        existing = current.get(key)
+        if existing is None:
+            inserts.append((pharmacy_id, medication_name, status))
+        elif existing[1] != status:
+            updates.append((status, existing[0]))
+        else:
+            unchanged += 1
+
+    if not dry_run and (inserts or updates):
+        try:
+            conn.executemany("UPDATE pharmacy_inventory SET stock_status = ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?", updates)
+            conn.executemany("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", inserts)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return {'inserted': len(inserts), 'updated': len(updates), 'unchanged': unchanged, 'errors': errors}
+
+
+def update_stock_by_id(conn, statuses):
+    """
+    Applies {inventory_id: stock_status}, touching only rows whose status changed. Returns the number updated.
+    Ids that are not integers and unknown statuses are ignored.
+    """
+    wanted = {}
+    for inventory_id, status in statuses.items():
+        try:
+            wanted[int(inventory_id)] = _STATUS_LOOKUP.get(str(status).strip().lower())
+        except (ValueError, TypeError):
+            continue
+    ids = list(wanted)
+    if not ids:
+        return 0
+    current = {row['id']: row['stock_status'] for row in conn.execute(
+        f"SELECT id, stock_status FROM pharmacy_inventory WHERE id IN ({', '.join('?' for _ in ids)})", ids)}
+    changes = []
+    for inventory_id, status in wanted.items():
+        if status and inventory_id in current and current[inventory_id] != status:
+            changes.append((status, inventory_id))
+    if changes:
+        conn.executemany("UPDATE pharmacy_inventory SET stock_status = ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?", changes)
+        conn.commit()
+    return len(changes)
+
+
+def import_upload(conn, file_storage=None, json_body=None, dry_run=False):
+    """Helper for the bulk endpoint: an uploaded CSV / JSON / JSONL file or a JSON request body."""
+    if file_storage is not None:
+        stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig')
+        return apply_stock_updates(conn, read_stock_rows(stream, guess_format(file_storage.filename)), dry_run)
+    return apply_stock_updates(conn, stock_items(json_body), dry_run)
+
+
+if __name__ == '__main__':
+    from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Bulk pharmacy inventory import")
+    parser.add_argument('path', help="stock file, '-' for stdin")
+    parser.add_argument('--format', choices=['csv', 'json', 'jsonl'])
+    parser.add_argument('--dry-run', action='store_true', help="report the diff without writing")
+    args = parser.parse_args()
+
+    fmt = args.format or guess_format(args.path)
+    conn = get_db_connection()
+    if args.path == '-':
+        summary = apply_stock_updates(conn, read_stock_rows(sys.stdin, fmt), args.dry_run)
+    else:
+        with open(args.path, newline='', encoding='utf-8-sig') as f:
+            summary = apply_stock_updates(conn, read_stock_rows(f, fmt), args.dry_run)
+    conn.close()
+    for number, reason in summary['errors'][:20]:
+        print(f"!!! row {number}: {reason}")
+    prefix = "Would apply" if args.dry_run else "Applied"
+    print(f"--- {prefix}: {summary['inserted']} new, {summary['updated']} changed, {summary['unchanged']} unchanged, {len(summary['errors'])} rejected ---")
@@ -0,0 +1,278 @@
+"""
+Materialized aggregates for the health department dashboard.
+
+Instead of re-counting `patients`, `readings`, `triage_reports` and `alerts`
+on every page view, small rollup tables are kept up to date by SQLite
+triggers, so every write path (the /sms webhook, triage reports, the alert
+engine, bulk seeding scripts) maintains them automatically:
+
+    kpi_counters         name -> value (total_patients, total_readings, total_reports, total_alerts)
+    village_daily_stats  per village and day: readings, triage reports
+    asha_stats           per ASHA worker phone: patients, triage reports
+    village_alert_stats  per village: alerts raised by the alert engine (hotspots)
+
+High risk is decided by the alert engine against the configured thresholds,
+so the dashboards count its alerts rather than re-testing readings here.
+
+Patients without a village / ASHA phone are grouped under ''.
+
+    python kpi_rollups.py --rebuild   # recompute every rollup from the base tables
+    python kpi_rollups.py --check     # compare the rollups with the live aggregate queries
+"""
+import sys
+
+KPI_NAMES = ('total_patients', 'total_readings', 'total_reports', 'total_alerts')
+
+
+def _day(alias):
+    return f"IFNULL(date({alias}.timestamp), '')"
+
+
+def _patient_village(patient_id):
+    return f"(SELECT IFNULL(village, '') FROM patients WHERE id = {patient_id})"
+
+
+def _patient_asha(patient_id):
+    return f"(SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = {patient_id})"
+
+
+def _reading_trigger_body(row, sign):
+    """Statements adding (sign '+') or removing (sign '-') one reading row from the rollups."""
+    return f"""
+        UPDATE kpi_counters SET value = value {sign} 1 WHERE name = 'total_readings';
+        INSERT OR IGNORE INTO village_daily_stats (village, day)
+            SELECT {_patient_village(f'{row}.patient_id')}, {_day(row)} WHERE EXISTS (SELECT 1 FROM patients WHERE id = {row}.patient_id);
+        UPDATE village_daily_stats SET readings_count = readings_count {sign} 1
+            WHERE village = {_patient_village(f'{row}.patient_id')} AND day = {_day(row)};
+    """
+
+
+def _report_trigger_body(row, sign):
+    return f"""
+        UPDATE kpi_counters SET value = value {sign} 1 WHERE name = 'total_reports';
+        INSERT OR IGNORE INTO village_daily_stats (village, day)
+            SELECT {_patient_village(f'{row}.patient_id')}, {_day(row)} WHERE EXISTS (SELECT 1 FROM patients WHERE id = {row}.patient_id);
+        UPDATE village_daily_stats SET reports_count = reports_count {sign} 1
+            WHERE village = {_patient_village(f'{row}.patient_id')} AND day = {_day(row)};
+        UPDATE asha_stats SET reports_count = reports_count {sign} 1 WHERE asha_worker_phone = {_patient_asha(f'{row}.patient_id')};
+    """
+
+
+def _patient_trigger_body(row, sign):
+    return f"""
+        UPDATE kpi_counters SET value = value {sign} 1 WHERE name = 'total_patients';
+        INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL({row}.asha_worker_phone, ''));
+        UPDATE asha_stats SET patients_count = patients_count {sign} 1,
+            reports_count = reports_count {sign} (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = {row}.id)
+            WHERE asha_worker_phone = IFNULL({row}.asha_worker_phone, '');
+    """
+
+
+def _patient_village_move(row, sign):
+    """Moves all of one patient's readings / reports into (+) or out of (-) their village's daily rows."""
+    return f"""
+        INSERT OR IGNORE INTO village_daily_stats (village, day)
+            SELECT IFNULL({row}.village, ''), day FROM (
+                SELECT {_day('r')} AS day FROM readings r WHERE r.patient_id = {row}.id
+                UNION SELECT {_day('t')} FROM triage_reports t WHERE t.patient_id = {row}.id
+            );
+        UPDATE village_daily_stats SET
+            readings_count = readings_count {sign} (SELECT COUNT(*) FROM readings r WHERE r.patient_id = {row}.id AND {_day('r')} = village_daily_stats.day),
+            reports_count = reports_count {sign} (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = {row}.id AND {_day('t')} = village_daily_stats.day)
+            WHERE village = IFNULL({row}.village, '');
+    """
+
+
+SCHEMA_STATEMENTS = [
+    "CREATE TABLE IF NOT EXISTS kpi_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+    '''CREATE TABLE IF NOT EXISTS village_daily_stats (
+        village TEXT NOT NULL, day TEXT NOT NULL, readings_count INTEGER NOT NULL DEFAULT 0,
+        reports_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (village, day)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS asha_stats (
+        asha_worker_phone TEXT PRIMARY KEY, patients_count INTEGER NOT NULL DEFAULT 0,
+        reports_count INTEGER NOT NULL DEFAULT 0
+    )''',
+    f"CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_insert AFTER INSERT ON readings BEGIN {_reading_trigger_body('NEW', '+')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_delete AFTER DELETE ON readings BEGIN {_reading_trigger_body('OLD', '-')} END",
+    f'''CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_update AFTER UPDATE OF patient_id, reading_type, value1, value2, timestamp ON readings
+        BEGIN {_reading_trigger_body('OLD', '-')} {_reading_trigger_body('NEW', '+')} END''',
+    f"CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_insert AFTER INSERT ON triage_reports BEGIN {_report_trigger_body('NEW', '+')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_delete AFTER DELETE ON triage_reports BEGIN {_report_trigger_body('OLD', '-')} END",
+    f'''CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_update AFTER UPDATE OF patient_id, timestamp ON triage_reports
+        BEGIN {_report_trigger_body('OLD', '-')} {_report_trigger_body('NEW', '+')} END''',
+    f"CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_insert AFTER INSERT ON patients BEGIN {_patient_trigger_body('NEW', '+')} END",
+    f'''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_delete AFTER DELETE ON patients
+        BEGIN {_patient_trigger_body('OLD', '-')} {_patient_village_move('OLD', '-')} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_asha AFTER UPDATE OF asha_worker_phone ON patients
+        WHEN IFNULL(OLD.asha_worker_phone, '') != IFNULL(NEW.asha_worker_phone, '')
+        BEGIN {_patient_trigger_body('OLD', '-')} {_patient_trigger_body('NEW', '+')} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_village AFTER UPDATE OF village ON patients
+        WHEN IFNULL(OLD.village, '') != IFNULL(NEW.village, '')
+        BEGIN {_patient_village_move('OLD', '-')} {_patient_village_move('NEW', '+')} END''',
+]
+
+# The asha trigger above reuses the insert/delete bodies, which also move total_patients by -1/+1 (net zero).
+
+REBUILD_STATEMENTS = [
+    "DELETE FROM kpi_counters",
+    "DELETE FROM village_daily_stats",
+    "DELETE FROM asha_stats",
+    "INSERT INTO kpi_counters (name, value) SELECT 'total_patients', COUNT(*) FROM patients",
+    "INSERT INTO kpi_counters (name, value) SELECT 'total_readings', COUNT(*) FROM readings",
+    "INSERT INTO kpi_counters (name, value) SELECT 'total_reports', COUNT(*) FROM triage_reports",
+    f'''INSERT INTO village_daily_stats (village, day, readings_count, reports_count)
+        SELECT village, day, SUM(readings_count), SUM(reports_count) FROM (
+            SELECT IFNULL(p.village, '') AS village, {_day('r')} AS day, COUNT(*) AS readings_count, 0 AS reports_count
+            FROM readings r JOIN patients p ON r.patient_id = p.id GROUP BY 1, 2
+            UNION ALL
+            SELECT IFNULL(p.village, ''), {_day('t')}, 0, COUNT(*)
+            FROM triage_reports t JOIN patients p ON t.patient_id = p.id GROUP BY 1, 2
+        ) GROUP BY village, day''',
+    '''INSERT INTO asha_stats (asha_worker_phone, patients_count, reports_count)
+        SELECT IFNULL(p.asha_worker_phone, ''), COUNT(*), SUM((SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = p.id))
+        FROM patients p GROUP BY 1''',
+]
+
+
+
+# --- Alert counts (the `alerts` table only exists from migration 10, so these are applied separately) ---
+def _alert_trigger_body(row, sign):
+    return f"""
+        UPDATE kpi_counters SET value = value {sign} 1 WHERE name = 'total_alerts';
+        INSERT OR IGNORE INTO village_alert_stats (village)
+            SELECT {_patient_village(f'{row}.patient_id')} WHERE EXISTS (SELECT 1 FROM patients WHERE id = {row}.patient_id);
+        UPDATE village_alert_stats SET alerts_count = alerts_count {sign} 1 WHERE village = {_patient_village(f'{row}.patient_id')};
+    """
+
+
+def _patient_alerts_move(row, sign):
+    """Moves all of one patient's alerts into (+) or out of (-) their village's hotspot row."""
+    return f"""
+        INSERT OR IGNORE INTO village_alert_stats (village) VALUES (IFNULL({row}.village, ''));
+        UPDATE village_alert_stats SET alerts_count = alerts_count {sign} (SELECT COUNT(*) FROM alerts a WHERE a.patient_id = {row}.id)
+            WHERE village = IFNULL({row}.village, '');
+    """
+
+
+ALERT_SCHEMA_STATEMENTS = [
+    "CREATE TABLE IF NOT EXISTS village_alert_stats (village TEXT PRIMARY KEY, alerts_count INTEGER NOT NULL DEFAULT 0)",
+    f"CREATE TRIGGER IF NOT EXISTS trg_alerts_rollup_insert AFTER INSERT ON alerts BEGIN {_alert_trigger_body('NEW', '+')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_alerts_rollup_delete AFTER DELETE ON alerts BEGIN {_alert_trigger_body('OLD', '-')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_patients_alerts_delete AFTER DELETE ON patients BEGIN {_patient_alerts_move('OLD', '-')} END",
+    f'''CREATE TRIGGER IF NOT EXISTS trg_patients_alerts_village AFTER UPDATE OF village ON patients
+        WHEN IFNULL(OLD.village, '') != IFNULL(NEW.village, '')
+        BEGIN {_patient_alerts_move('OLD', '-')} {_patient_alerts_move('NEW', '+')} END''',
+]
+
+ALERT_REBUILD_STATEMENTS = [
+    "DELETE FROM kpi_counters WHERE name = 'total_alerts'",
+    "DELETE FROM village_alert_stats",
+    "INSERT INTO kpi_counters (name, value) SELECT 'total_alerts', COUNT(*) FROM alerts",
+    '''INSERT INTO village_alert_stats (village, alerts_count)
+        SELECT IFNULL(p.village, ''), COUNT(*) FROM alerts a JOIN patients p ON a.patient_id = p.id GROUP BY 1''',
+]
+
+
+def rebuild_rollups(conn):
+    """Recomputes every rollup table from scratch in one transaction."""
+    try:
+        for statement in REBUILD_STATEMENTS + ALERT_REBUILD_STATEMENTS:
+            conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# --- Dashboard reads ---
+def get_kpis(conn):
+    counters = {row['name']: row['value'] for row in conn.execute("SELECT name, value FROM kpi_counters")}
+    active_ashas = conn.execute("SELECT COUNT(*) FROM asha_stats WHERE patients_count > 0 AND asha_worker_phone != ''").fetchone()[0]
+    return {
+        "total_patients": counters.get('total_patients', 0),
+        "active_ashas": active_ashas,
+        "high_risk_alerts": counters.get('total_alerts', 0),
+        "total_reports_filed": counters.get('total_reports', 0),
+    }
+
+
+def get_hotspots(conn, limit=5):
+    """Villages with the most alerts."""
+    rows = conn.execute("""
+        SELECT village, alerts_count as alert_count FROM village_alert_stats
+        WHERE alerts_count > 0 ORDER BY alerts_count DESC LIMIT ?
+    """, (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_asha_leaderboard(conn, limit=10):
+    rows = conn.execute("""
+        SELECT asha_worker_phone, reports_count as report_count FROM asha_stats
+        WHERE reports_count > 0 AND asha_worker_phone != '' ORDER BY reports_count DESC LIMIT ?
+    """, (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+
+# --- Consistency check against the live queries ---
+def _live_values(conn):
+    live = {
+        'kpi:total_patients': conn.execute("SELECT COUNT(id) FROM patients").fetchone()[0],
+        'kpi:total_readings': conn.execute("SELECT COUNT(id) FROM readings").fetchone()[0],
+        'kpi:total_alerts': conn.execute("SELECT COUNT(id) FROM alerts").fetchone()[0],
+        'kpi:total_reports': conn.execute("SELECT COUNT(id) FROM triage_reports").fetchone()[0],
+        'kpi:active_ashas': conn.execute("SELECT COUNT(DISTINCT asha_worker_phone) FROM patients WHERE asha_worker_phone != ''").fetchone()[0],
+    }
+    for row in conn.execute("""
+        SELECT IFNULL(p.village, '') as village, COUNT(a.id) as alert_count FROM alerts a JOIN patients p ON a.patient_id = p.id GROUP BY 1
+    """):
+        live[f"hotspot:{row['village']}"] = row['alert_count']
+    for row in conn.execute("""
+        SELECT IFNULL(p.asha_worker_phone, '') as asha, COUNT(t.id) as report_count FROM triage_reports t
+        JOIN patients p ON t.patient_id = p.id GROUP BY 1
+    """):
+        if row['asha']:
+            live[f"asha:{row['asha']}"] = row['report_count']
+    return live
+
+
+def _rollup_values(conn):
+    kpis = get_kpis(conn)
+    rollup = {
+        'kpi:total_patients': kpis['total_patients'],
+        'kpi:total_readings': conn.execute("SELECT IFNULL(MAX(value), 0) FROM kpi_counters WHERE name = 'total_readings'").fetchone()[0],
+        'kpi:total_alerts': kpis['high_risk_alerts'],
+        'kpi:total_reports': kpis['total_reports_filed'],
+        'kpi:active_ashas': kpis['active_ashas'],
+    }
+    for row in get_hotspots(conn, limit=-1):
+        rollup[f"hotspot:{row['village']}"] = row['alert_count']
+    for row in get_asha_leaderboard(conn, limit=-1):
+        rollup[f"asha:{row['asha_worker_phone']}"] = row['report_count']
+    return rollup
+
+
+def check_rollups(conn):
+    """Returns [(key, live_value, rollup_value)] for every aggregate that disagrees with the base tables."""
+    live, rollup = _live_values(conn), _rollup_values(conn)
+    return [(key, live.get(key, 0), rollup.get(key, 0))
+            for key in sorted(set(live) | set(rollup)) if live.get(key, 0) != rollup.get(key, 0)]
+
+
+if __name__ == '__main__':
+    from db import get_db_connection
+
+    conn = get_db_connection()
+    if '--rebuild' in sys.argv:
+        rebuild_rollups(conn)
+        print("... Dashboard rollup tables rebuilt.")
+    if '--check' in sys.argv:
+        mismatches = check_rollups(conn)
+        for key, live_value, rollup_value in mismatches:
+            print(f"!!! {key}: live={live_value} rollup={rollup_value}")
+        conn.close()
+        if mismatches:
+            sys.exit(1)
+        print("... Rollups match the live queries.")
+    conn.close()
@@ -0,0 +1,186 @@
+"""
+In-process request metrics, exposed in Prometheus text format at /metrics.
+
+- Every request records its wall time per route (Flask endpoint), method and
+  status, plus how many SQLite statements it ran and how long they took.
+  db.py's PooledConnection reports each execute() here. A request above
+  QUERY_WARNING_THRESHOLD statements is printed, so N+1 loops show up in the
+  logs as well as in the `db_queries_per_request` histogram.
+- `timed(name, **labels)` measures any block: the triage pipeline uses it for
+  the local model and the OpenRouter call, the SMS outbox for transport sends.
+- Opt-in profiling: with PROFILE_DIR set, a request with `?profile=1` (or
+  every request, with PROFILE_ALL_REQUESTS=1) runs under cProfile and the
+  stats are dumped to PROFILE_DIR/<time>-<endpoint>-<ms>ms.prof. Open them
+  with snakeviz, or turn them into a flamegraph with flameprof.
+
+Counters live in this process only, so each worker process exposes its own
+numbers.
+"""
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+QUERY_WARNING_THRESHOLD = 100
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+PROFILE_ALL_REQUESTS = os.environ.get('PROFILE_ALL_REQUESTS') == '1'
+
+HELP = {
+    'http_request_duration_seconds': 'Wall time of HTTP requests by route.',
+    'db_queries_per_request': 'SQLite statements executed per HTTP request.',
+    'db_query_duration_seconds_total': 'Time spent in SQLite execute() calls.',
+    'db_queries_total': 'SQLite statements executed.',
+    'triage_stage_duration_seconds': 'Time spent in each triage stage (local model, report incl. cache, OpenRouter call).',
+    'sms_send_duration_seconds': 'Latency of outbound SMS transport sends.',
+    'llm_cache_lookups_total': 'OpenRouter report cache lookups by result.',
+    'response_cache_total': 'Dashboard response cache lookups by view and result.',
+}
+
+
+class Registry:
+    """Thread-safe counters and histograms keyed by (name, sorted labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}     # key -> [bucket counts..., +Inf count, sum]
+        self._buckets = {}        # name -> bucket bounds
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._buckets.setdefault(name, buckets)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    def render(self):
+        """Everything in Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+        lines, described = [], set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), values in histograms:
+            describe(name, 'histogram')
+            for bound, count in zip(self._buckets[name], values):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {values[-2]}")
+            lines.append(f"{name}_count{_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value):
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list (0.0 when empty); used by the load tools."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+registry = Registry()
+_request_stats = threading.local()
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observes the duration of the block in histogram `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - start, **labels)
+
+
+# --- SQL accounting (called from db.PooledConnection) ---
+def record_query(seconds):
+    stats = getattr(_request_stats, 'current', None)
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+    else:
+        registry.inc('db_queries_total', route='background')
+        registry.inc('db_query_duration_seconds_total', seconds, route='background')
+
+
+# --- Flask hooks ---
+def _before_request():
+    from flask import g, request
+    _request_stats.current = [0, 0.0]
+    g.metrics_start = time.perf_counter()
+    if PROFILE_DIR and (PROFILE_ALL_REQUESTS or request.args.get('profile') == '1'):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _after_request(response):
+    from flask import g, request
+    start = g.pop('metrics_start', None)
+    stats = getattr(_request_stats, 'current', None)
+    _request_stats.current = None
+    if start is None or stats is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.endpoint or 'unmatched'
+    registry.observe('http_request_duration_seconds', elapsed, route=route, method=request.method, status=response.status_code)
+    registry.observe('db_queries_per_request', stats[0], buckets=QUERY_COUNT_BUCKETS, route=route)
+    registry.inc('db_queries_total', stats[0], route=route)
+    registry.inc('db_query_duration_seconds_total', stats[1], route=route)
+    if stats[0] > QUERY_WARNING_THRESHOLD:
+        print(f"!!! {request.method} {request.path} ran {stats[0]} SQL statements ({stats[1] * 1000:.0f} ms)")
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{route}-{elapsed * 1000:.0f}ms.prof")
+        profiler.dump_stats(path)
+        response.headers['X-Profile-Path'] = path
+    response.headers['Server-Timing'] = f"app;dur={elapsed * 1000:.1f}, db;dur={stats[1] * 1000:.1f};desc=\"{stats[0]} queries\""
+    return response
+
+
+def _teardown_request(exception=None):
+    # Requests that raised never reach after_request; do not let their counts leak into the next request on this thread
+    _request_stats.current = None
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,706 @@
+"""
+Versioned, non-destructive schema migrations for health.db.
+
+The schema version is kept in SQLite's `PRAGMA user_version`. Every entry in
+MIGRATIONS is applied once, in order, inside its own transaction, so running
+`apply_migrations()` on an up-to-date database is a no-op and existing data is
+never dropped. To change the schema, append a new (version, description,
+statements) entry - never edit one that has already shipped.
+
+Statements are written out as literals. Modules like kpi_rollups and sync_api
+keep their own copies of the SQL for rebuild tooling, but a migration never
+references them, so editing a module cannot change an applied migration.
+"""
+import sqlite3
+
+MIGRATIONS = [
+    (1, "initial schema", [
+        '''CREATE TABLE IF NOT EXISTS patients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, phone_number TEXT UNIQUE NOT NULL,
+            email TEXT, password_hash TEXT NOT NULL, active_call_link TEXT, age INTEGER, gender TEXT,
+            village TEXT, asha_worker_phone TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS pharmacies (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, location TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS pharmacy_inventory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, pharmacy_id INTEGER, medication_name TEXT NOT NULL,
+            stock_status TEXT NOT NULL, last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (pharmacy_id) REFERENCES pharmacies (id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS prescriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER, medication_name TEXT NOT NULL,
+            dosage TEXT, notes TEXT, is_active INTEGER DEFAULT 1, dispensing_pharmacy_id INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY (patient_id) REFERENCES patients (id),
+            FOREIGN KEY (dispensing_pharmacy_id) REFERENCES pharmacies (id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER, reading_type TEXT NOT NULL,
+            value1 INTEGER NOT NULL, value2 INTEGER, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS triage_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER, chief_complaint TEXT NOT NULL,
+            symptoms TEXT, notes TEXT, ai_prediction TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )''',
+    ]),
+    (2, "indexes for hot query paths", [
+        # Latest readings per patient (/dashboard, /user_dashboard) and BP chart points
+        "CREATE INDEX IF NOT EXISTS idx_readings_patient_time ON readings (patient_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_readings_patient_type_time ON readings (patient_id, reading_type, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_triage_patient_time ON triage_reports (patient_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_prescriptions_patient_active ON prescriptions (patient_id, is_active)",
+        # Dashboard ordering / filters and the ASHA leaderboard
+        "CREATE INDEX IF NOT EXISTS idx_patients_name ON patients (name)",
+        "CREATE INDEX IF NOT EXISTS idx_patients_village ON patients (village)",
+        "CREATE INDEX IF NOT EXISTS idx_patients_asha ON patients (asha_worker_phone)",
+        # Stock lookups by medication across pharmacies (add_prescription)
+        "CREATE INDEX IF NOT EXISTS idx_inventory_medication ON pharmacy_inventory (medication_name, pharmacy_id)",
+        # One row per medicine per pharmacy, case-insensitively (add_new_medicine).
+        # Older databases may already hold duplicates, keep the first row of each.
+        '''DELETE FROM pharmacy_inventory WHERE id NOT IN (
+            SELECT MIN(id) FROM pharmacy_inventory GROUP BY pharmacy_id, lower(medication_name)
+        )''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_inventory_pharmacy_medication ON pharmacy_inventory (pharmacy_id, lower(medication_name))",
+    ]),
+    (3, "outbound SMS queue", [
+        '''CREATE TABLE IF NOT EXISTS sms_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, to_number TEXT NOT NULL, body TEXT NOT NULL,
+            dedupe_key TEXT, status TEXT NOT NULL DEFAULT 'pending', -- pending / sending / sent / failed
+            attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, provider_id TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP, next_attempt_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            sent_at DATETIME
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_outbox_status_due ON sms_outbox (status, next_attempt_at)",
+        "CREATE INDEX IF NOT EXISTS idx_outbox_dedupe ON sms_outbox (dedupe_key, created_at)",
+    ]),
+    (4, "background triage status", [
+        # pending / done / failed - existing reports already carry their prediction
+        "ALTER TABLE triage_reports ADD COLUMN ai_status TEXT NOT NULL DEFAULT 'done'",
+        "CREATE INDEX IF NOT EXISTS idx_triage_pending ON triage_reports (ai_status) WHERE ai_status = 'pending'",
+    ]),
+    (5, "LLM triage report cache", [
+        '''CREATE TABLE IF NOT EXISTS llm_report_cache (
+            disease_key TEXT NOT NULL, prompt_version INTEGER NOT NULL, model TEXT NOT NULL,
+            report_json TEXT NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (disease_key, prompt_version, model)
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_report_cache (last_used_at)",
+    ]),
+    (6, "local model prediction on triage reports", [
+        # Raw label from the local model, kept apart from the LLM-formatted ai_prediction so it can be re-scored in bulk
+        "ALTER TABLE triage_reports ADD COLUMN predicted_disease TEXT",
+    ]),
+    (7, "trigger-maintained rollups for the health department dashboard", [
+        # Tables + triggers, then a backfill from the existing rows
+        "CREATE TABLE IF NOT EXISTS kpi_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+        '''CREATE TABLE IF NOT EXISTS village_daily_stats (
+            village TEXT NOT NULL, day TEXT NOT NULL, readings_count INTEGER NOT NULL DEFAULT 0,
+            reports_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (village, day)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS asha_stats (
+            asha_worker_phone TEXT PRIMARY KEY, patients_count INTEGER NOT NULL DEFAULT 0,
+            reports_count INTEGER NOT NULL DEFAULT 0
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_insert AFTER INSERT ON readings BEGIN
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_readings';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id), IFNULL(date(NEW.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_daily_stats SET readings_count = readings_count + 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) AND day = IFNULL(date(NEW.timestamp), '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_delete AFTER DELETE ON readings BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_readings';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id), IFNULL(date(OLD.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_daily_stats SET readings_count = readings_count - 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) AND day = IFNULL(date(OLD.timestamp), '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_update AFTER UPDATE OF patient_id, reading_type, value1, value2, timestamp ON readings
+            BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_readings';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id), IFNULL(date(OLD.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_daily_stats SET readings_count = readings_count - 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) AND day = IFNULL(date(OLD.timestamp), '');
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_readings';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id), IFNULL(date(NEW.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_daily_stats SET readings_count = readings_count + 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) AND day = IFNULL(date(NEW.timestamp), '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_insert AFTER INSERT ON triage_reports BEGIN
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_reports';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id), IFNULL(date(NEW.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_daily_stats SET reports_count = reports_count + 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) AND day = IFNULL(date(NEW.timestamp), '');
+            UPDATE asha_stats SET reports_count = reports_count + 1 WHERE asha_worker_phone = (SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = NEW.patient_id);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_delete AFTER DELETE ON triage_reports BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_reports';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id), IFNULL(date(OLD.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_daily_stats SET reports_count = reports_count - 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) AND day = IFNULL(date(OLD.timestamp), '');
+            UPDATE asha_stats SET reports_count = reports_count - 1 WHERE asha_worker_phone = (SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = OLD.patient_id);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_update AFTER UPDATE OF patient_id, timestamp ON triage_reports
+            BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_reports';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id), IFNULL(date(OLD.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_daily_stats SET reports_count = reports_count - 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) AND day = IFNULL(date(OLD.timestamp), '');
+            UPDATE asha_stats SET reports_count = reports_count - 1 WHERE asha_worker_phone = (SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = OLD.patient_id);
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_reports';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id), IFNULL(date(NEW.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_daily_stats SET reports_count = reports_count + 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) AND day = IFNULL(date(NEW.timestamp), '');
+            UPDATE asha_stats SET reports_count = reports_count + 1 WHERE asha_worker_phone = (SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = NEW.patient_id);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_insert AFTER INSERT ON patients BEGIN
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_patients';
+            INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL(NEW.asha_worker_phone, ''));
+            UPDATE asha_stats SET patients_count = patients_count + 1,
+                reports_count = reports_count + (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = NEW.id)
+                WHERE asha_worker_phone = IFNULL(NEW.asha_worker_phone, '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_delete AFTER DELETE ON patients
+            BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_patients';
+            INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL(OLD.asha_worker_phone, ''));
+            UPDATE asha_stats SET patients_count = patients_count - 1,
+                reports_count = reports_count - (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = OLD.id)
+                WHERE asha_worker_phone = IFNULL(OLD.asha_worker_phone, '');
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT IFNULL(OLD.village, ''), day FROM (
+                    SELECT IFNULL(date(r.timestamp), '') AS day FROM readings r WHERE r.patient_id = OLD.id
+                    UNION SELECT IFNULL(date(t.timestamp), '') FROM triage_reports t WHERE t.patient_id = OLD.id
+        );
+            UPDATE village_daily_stats SET
+                readings_count = readings_count - (SELECT COUNT(*) FROM readings r WHERE r.patient_id = OLD.id AND IFNULL(date(r.timestamp), '') = village_daily_stats.day),
+                reports_count = reports_count - (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = OLD.id AND IFNULL(date(t.timestamp), '') = village_daily_stats.day)
+                WHERE village = IFNULL(OLD.village, '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_asha AFTER UPDATE OF asha_worker_phone ON patients
+            WHEN IFNULL(OLD.asha_worker_phone, '') != IFNULL(NEW.asha_worker_phone, '')
+            BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_patients';
+            INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL(OLD.asha_worker_phone, ''));
+            UPDATE asha_stats SET patients_count = patients_count - 1,
+                reports_count = reports_count - (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = OLD.id)
+                WHERE asha_worker_phone = IFNULL(OLD.asha_worker_phone, '');
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_patients';
+            INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL(NEW.asha_worker_phone, ''));
+            UPDATE asha_stats SET patients_count = patients_count + 1,
+                reports_count = reports_count + (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = NEW.id)
+                WHERE asha_worker_phone = IFNULL(NEW.asha_worker_phone, '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_village AFTER UPDATE OF village ON patients
+            WHEN IFNULL(OLD.village, '') != IFNULL(NEW.village, '')
+            BEGIN
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT IFNULL(OLD.village, ''), day FROM (
+                    SELECT IFNULL(date(r.timestamp), '') AS day FROM readings r WHERE r.patient_id = OLD.id
+                    UNION SELECT IFNULL(date(t.timestamp), '') FROM triage_reports t WHERE t.patient_id = OLD.id
+        );
+            UPDATE village_daily_stats SET
+                readings_count = readings_count - (SELECT COUNT(*) FROM readings r WHERE r.patient_id = OLD.id AND IFNULL(date(r.timestamp), '') = village_daily_stats.day),
+                reports_count = reports_count - (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = OLD.id AND IFNULL(date(t.timestamp), '') = village_daily_stats.day)
+                WHERE village = IFNULL(OLD.village, '');
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT IFNULL(NEW.village, ''), day FROM (
+                    SELECT IFNULL(date(r.timestamp), '') AS day FROM readings r WHERE r.patient_id = NEW.id
+                    UNION SELECT IFNULL(date(t.timestamp), '') FROM triage_reports t WHERE t.patient_id = NEW.id
+        );
+            UPDATE village_daily_stats SET
+                readings_count = readings_count + (SELECT COUNT(*) FROM readings r WHERE r.patient_id = NEW.id AND IFNULL(date(r.timestamp), '') = village_daily_stats.day),
+                reports_count = reports_count + (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = NEW.id AND IFNULL(date(t.timestamp), '') = village_daily_stats.day)
+                WHERE village = IFNULL(NEW.village, '');
+        END''',
+        "DELETE FROM kpi_counters",
+        "DELETE FROM village_daily_stats",
+        "DELETE FROM asha_stats",
+        "INSERT INTO kpi_counters (name, value) SELECT 'total_patients', COUNT(*) FROM patients",
+        "INSERT INTO kpi_counters (name, value) SELECT 'total_readings', COUNT(*) FROM readings",
+        "INSERT INTO kpi_counters (name, value) SELECT 'total_reports', COUNT(*) FROM triage_reports",
+        '''INSERT INTO village_daily_stats (village, day, readings_count, reports_count)
+            SELECT village, day, SUM(readings_count), SUM(reports_count) FROM (
+                SELECT IFNULL(p.village, '') AS village, IFNULL(date(r.timestamp), '') AS day, COUNT(*) AS readings_count, 0 AS reports_count
+                FROM readings r JOIN patients p ON r.patient_id = p.id GROUP BY 1, 2
+                UNION ALL
+                SELECT IFNULL(p.village, ''), IFNULL(date(t.timestamp), ''), 0, COUNT(*)
+                FROM triage_reports t JOIN patients p ON t.patient_id = p.id GROUP BY 1, 2
+        ) GROUP BY village, day''',
+        '''INSERT INTO asha_stats (asha_worker_phone, patients_count, reports_count)
+            SELECT IFNULL(p.asha_worker_phone, ''), COUNT(*), SUM((SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = p.id))
+            FROM patients p GROUP BY 1''',
+    ]),
+    (8, "indexed disease category on triage reports", [
+        "ALTER TABLE triage_reports ADD COLUMN disease_category TEXT",
+        "UPDATE triage_reports SET disease_category = CASE WHEN instr(lower(IFNULL(triage_reports.chief_complaint, '') || ' ' || IFNULL(triage_reports.notes, '')), 'fever') > 0 OR instr(lower(IFNULL(triage_reports.chief_complaint, '') || ' ' || IFNULL(triage_reports.notes, '')), 'headache') > 0 THEN 'Fever' WHEN instr(lower(IFNULL(triage_reports.chief_complaint, '') || ' ' || IFNULL(triage_reports.notes, '')), 'cough') > 0 OR instr(lower(IFNULL(triage_reports.chief_complaint, '') || ' ' || IFNULL(triage_reports.notes, '')), 'sore throat') > 0 THEN 'Cough/Cold' WHEN instr(lower(IFNULL(triage_reports.chief_complaint, '') || ' ' || IFNULL(triage_reports.notes, '')), 'stomach') > 0 OR instr(lower(IFNULL(triage_reports.chief_complaint, '') || ' ' || IFNULL(triage_reports.notes, '')), 'indigestion') > 0 OR instr(lower(IFNULL(triage_reports.chief_complaint, '') || ' ' || IFNULL(triage_reports.notes, '')), 'diarrhea') > 0 THEN 'Stomach Issues' ELSE 'Other' END",
+        "CREATE INDEX IF NOT EXISTS idx_triage_time_category ON triage_reports(timestamp, disease_category)",
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_category_insert AFTER INSERT ON triage_reports
+            WHEN NEW.disease_category IS NULL
+            BEGIN UPDATE triage_reports SET disease_category = CASE WHEN instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'fever') > 0 OR instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'headache') > 0 THEN 'Fever' WHEN instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'cough') > 0 OR instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'sore throat') > 0 THEN 'Cough/Cold' WHEN instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'stomach') > 0 OR instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'indigestion') > 0 OR instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'diarrhea') > 0 THEN 'Stomach Issues' ELSE 'Other' END WHERE id = NEW.id; END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_category_update AFTER UPDATE OF chief_complaint, notes ON triage_reports
+            BEGIN UPDATE triage_reports SET disease_category = CASE WHEN instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'fever') > 0 OR instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'headache') > 0 THEN 'Fever' WHEN instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'cough') > 0 OR instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'sore throat') > 0 THEN 'Cough/Cold' WHEN instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'stomach') > 0 OR instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'indigestion') > 0 OR instr(lower(IFNULL(NEW.chief_complaint, '') || ' ' || IFNULL(NEW.notes, '')), 'diarrhea') > 0 THEN 'Stomach Issues' ELSE 'Other' END WHERE id = NEW.id; END''',
+    ]),
+    (9, "daily / weekly reading buckets", [
+        '''CREATE TABLE IF NOT EXISTS reading_buckets (
+            patient_id INTEGER NOT NULL, reading_type TEXT NOT NULL, bucket TEXT NOT NULL, bucket_start TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0, min1 REAL, max1 REAL, sum1 REAL NOT NULL DEFAULT 0,
+            count2 INTEGER NOT NULL DEFAULT 0, min2 REAL, max2 REAL, sum2 REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (patient_id, reading_type, bucket, bucket_start)
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_reading_buckets_start ON reading_buckets(bucket, bucket_start)",
+        '''CREATE TRIGGER IF NOT EXISTS trg_readings_buckets_insert AFTER INSERT ON readings
+            BEGIN
+            INSERT OR IGNORE INTO reading_buckets (patient_id, reading_type, bucket, bucket_start)
+                VALUES (NEW.patient_id, NEW.reading_type, 'day', date(NEW.timestamp));
+            UPDATE reading_buckets SET
+                count = count + 1,
+                min1 = CASE WHEN min1 IS NULL OR NEW.value1 < min1 THEN NEW.value1 ELSE min1 END,
+                max1 = CASE WHEN max1 IS NULL OR NEW.value1 > max1 THEN NEW.value1 ELSE max1 END,
+                sum1 = sum1 + IFNULL(NEW.value1, 0),
+                count2 = count2 + (NEW.value2 IS NOT NULL),
+                min2 = CASE WHEN NEW.value2 IS NOT NULL AND (min2 IS NULL OR NEW.value2 < min2) THEN NEW.value2 ELSE min2 END,
+                max2 = CASE WHEN NEW.value2 IS NOT NULL AND (max2 IS NULL OR NEW.value2 > max2) THEN NEW.value2 ELSE max2 END,
+                sum2 = sum2 + IFNULL(NEW.value2, 0)
+                WHERE patient_id = NEW.patient_id AND reading_type = NEW.reading_type AND bucket = 'day' AND bucket_start = date(NEW.timestamp);
+            INSERT OR IGNORE INTO reading_buckets (patient_id, reading_type, bucket, bucket_start)
+                VALUES (NEW.patient_id, NEW.reading_type, 'week', date(NEW.timestamp, 'weekday 0', '-6 days'));
+            UPDATE reading_buckets SET
+                count = count + 1,
+                min1 = CASE WHEN min1 IS NULL OR NEW.value1 < min1 THEN NEW.value1 ELSE min1 END,
+                max1 = CASE WHEN max1 IS NULL OR NEW.value1 > max1 THEN NEW.value1 ELSE max1 END,
+                sum1 = sum1 + IFNULL(NEW.value1, 0),
+                count2 = count2 + (NEW.value2 IS NOT NULL),
+                min2 = CASE WHEN NEW.value2 IS NOT NULL AND (min2 IS NULL OR NEW.value2 < min2) THEN NEW.value2 ELSE min2 END,
+                max2 = CASE WHEN NEW.value2 IS NOT NULL AND (max2 IS NULL OR NEW.value2 > max2) THEN NEW.value2 ELSE max2 END,
+                sum2 = sum2 + IFNULL(NEW.value2, 0)
+                WHERE patient_id = NEW.patient_id AND reading_type = NEW.reading_type AND bucket = 'week' AND bucket_start = date(NEW.timestamp, 'weekday 0', '-6 days');
+        END''',
+        '''INSERT INTO reading_buckets (patient_id, reading_type, bucket, bucket_start, count, min1, max1, sum1, count2, min2, max2, sum2)
+            SELECT patient_id, reading_type, 'day', date(readings.timestamp), COUNT(*), MIN(value1), MAX(value1), IFNULL(SUM(value1), 0),
+                   COUNT(value2), MIN(value2), MAX(value2), IFNULL(SUM(value2), 0)
+            FROM readings GROUP BY patient_id, reading_type, date(readings.timestamp)''',
+        '''INSERT INTO reading_buckets (patient_id, reading_type, bucket, bucket_start, count, min1, max1, sum1, count2, min2, max2, sum2)
+            SELECT patient_id, reading_type, 'week', date(readings.timestamp, 'weekday 0', '-6 days'), COUNT(*), MIN(value1), MAX(value1), IFNULL(SUM(value1), 0),
+                   COUNT(value2), MIN(value2), MAX(value2), IFNULL(SUM(value2), 0)
+            FROM readings GROUP BY patient_id, reading_type, date(readings.timestamp, 'weekday 0', '-6 days')''',
+    ]),
+    (10, "high-risk alerts from the streaming alert engine", [
+        '''CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER NOT NULL, rule TEXT NOT NULL,
+            reading_type TEXT NOT NULL, reading_id INTEGER NOT NULL, reading_time DATETIME NOT NULL,
+            message TEXT NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_alerts_patient_rule_time ON alerts(patient_id, rule, reading_time)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_reading_time ON alerts(reading_time)",
+        "CREATE TABLE IF NOT EXISTS alert_engine_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        # Starts at 0, so the engine's first run builds alerts for the existing history (without paging anyone)
+        "INSERT OR IGNORE INTO alert_engine_state (name, value) VALUES ('last_reading_id', 0)",
+    ]),
+    (11, "inventory cache version counter", [
+        "CREATE TABLE IF NOT EXISTS cache_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)",
+        "INSERT OR IGNORE INTO cache_versions (name) VALUES ('inventory')",
+        "CREATE TRIGGER IF NOT EXISTS trg_pharmacies_version_insert AFTER INSERT ON pharmacies BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'inventory'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_pharmacies_version_update AFTER UPDATE ON pharmacies BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'inventory'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_pharmacies_version_delete AFTER DELETE ON pharmacies BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'inventory'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_pharmacy_inventory_version_insert AFTER INSERT ON pharmacy_inventory BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'inventory'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_pharmacy_inventory_version_update AFTER UPDATE ON pharmacy_inventory BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'inventory'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_pharmacy_inventory_version_delete AFTER DELETE ON pharmacy_inventory BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'inventory'; END",
+    ]),
+    (12, "coordinates for pharmacies and villages", [
+        "ALTER TABLE pharmacies ADD COLUMN latitude REAL",
+        "ALTER TABLE pharmacies ADD COLUMN longitude REAL",
+        "CREATE TABLE IF NOT EXISTS villages (name TEXT PRIMARY KEY COLLATE NOCASE, latitude REAL NOT NULL, longitude REAL NOT NULL)",
+    ]),
+    (13, "doctor-confirmed diagnosis on triage reports (training labels)", [
+        "ALTER TABLE triage_reports ADD COLUMN confirmed_disease TEXT",
+    ]),
+    (14, "per-table cache versions for the dashboard response cache", [
+        "CREATE TABLE IF NOT EXISTS cache_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)",
+        "INSERT OR IGNORE INTO cache_versions (name) VALUES ('patients')",
+        "CREATE TRIGGER IF NOT EXISTS trg_patients_version_insert AFTER INSERT ON patients BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'patients'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_patients_version_update AFTER UPDATE ON patients BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'patients'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_patients_version_delete AFTER DELETE ON patients BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'patients'; END",
+        "INSERT OR IGNORE INTO cache_versions (name) VALUES ('readings')",
+        "CREATE TRIGGER IF NOT EXISTS trg_readings_version_insert AFTER INSERT ON readings BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'readings'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_readings_version_update AFTER UPDATE ON readings BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'readings'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_readings_version_delete AFTER DELETE ON readings BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'readings'; END",
+        "INSERT OR IGNORE INTO cache_versions (name) VALUES ('triage_reports')",
+        "CREATE TRIGGER IF NOT EXISTS trg_triage_reports_version_insert AFTER INSERT ON triage_reports BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'triage_reports'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_triage_reports_version_update AFTER UPDATE ON triage_reports BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'triage_reports'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_triage_reports_version_delete AFTER DELETE ON triage_reports BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'triage_reports'; END",
+        "INSERT OR IGNORE INTO cache_versions (name) VALUES ('prescriptions')",
+        "CREATE TRIGGER IF NOT EXISTS trg_prescriptions_version_insert AFTER INSERT ON prescriptions BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'prescriptions'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_prescriptions_version_update AFTER UPDATE ON prescriptions BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'prescriptions'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_prescriptions_version_delete AFTER DELETE ON prescriptions BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'prescriptions'; END",
+        "INSERT OR IGNORE INTO cache_versions (name) VALUES ('alerts')",
+        "CREATE TRIGGER IF NOT EXISTS trg_alerts_version_insert AFTER INSERT ON alerts BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'alerts'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_alerts_version_update AFTER UPDATE ON alerts BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'alerts'; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_alerts_version_delete AFTER DELETE ON alerts BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = 'alerts'; END",
+    ]),
+    (15, "since-cursor sync sequence for the JSON API", [
+        "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+        "ALTER TABLE patients ADD COLUMN sync_seq INTEGER",
+        "UPDATE patients SET sync_seq = id",
+        "INSERT OR IGNORE INTO sync_state (name, value) SELECT 'patients', IFNULL(MAX(id), 0) FROM patients",
+        "CREATE INDEX IF NOT EXISTS idx_patients_sync_seq ON patients(sync_seq)",
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_sync_insert AFTER INSERT ON patients BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'patients';
+            UPDATE patients SET sync_seq = (SELECT value FROM sync_state WHERE name = 'patients') WHERE id = NEW.id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_sync_update AFTER UPDATE ON patients
+                WHEN NEW.sync_seq IS OLD.sync_seq BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'patients';
+            UPDATE patients SET sync_seq = (SELECT value FROM sync_state WHERE name = 'patients') WHERE id = NEW.id;
+        END''',
+        "ALTER TABLE triage_reports ADD COLUMN sync_seq INTEGER",
+        "UPDATE triage_reports SET sync_seq = id",
+        "INSERT OR IGNORE INTO sync_state (name, value) SELECT 'triage_reports', IFNULL(MAX(id), 0) FROM triage_reports",
+        "CREATE INDEX IF NOT EXISTS idx_triage_reports_sync_seq ON triage_reports(sync_seq)",
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_reports_sync_insert AFTER INSERT ON triage_reports BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'triage_reports';
+            UPDATE triage_reports SET sync_seq = (SELECT value FROM sync_state WHERE name = 'triage_reports') WHERE id = NEW.id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_reports_sync_update AFTER UPDATE ON triage_reports
+                WHEN NEW.sync_seq IS OLD.sync_seq BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'triage_reports';
+            UPDATE triage_reports SET sync_seq = (SELECT value FROM sync_state WHERE name = 'triage_reports') WHERE id = NEW.id;
+        END''',
+        "ALTER TABLE prescriptions ADD COLUMN sync_seq INTEGER",
+        "UPDATE prescriptions SET sync_seq = id",
+        "INSERT OR IGNORE INTO sync_state (name, value) SELECT 'prescriptions', IFNULL(MAX(id), 0) FROM prescriptions",
+        "CREATE INDEX IF NOT EXISTS idx_prescriptions_sync_seq ON prescriptions(sync_seq)",
+        '''CREATE TRIGGER IF NOT EXISTS trg_prescriptions_sync_insert AFTER INSERT ON prescriptions BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'prescriptions';
+            UPDATE prescriptions SET sync_seq = (SELECT value FROM sync_state WHERE name = 'prescriptions') WHERE id = NEW.id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_prescriptions_sync_update AFTER UPDATE ON prescriptions
+                WHEN NEW.sync_seq IS OLD.sync_seq BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'prescriptions';
+            UPDATE prescriptions SET sync_seq = (SELECT value FROM sync_state WHERE name = 'prescriptions') WHERE id = NEW.id;
+        END''',
+        "ALTER TABLE pharmacy_inventory ADD COLUMN sync_seq INTEGER",
+        "UPDATE pharmacy_inventory SET sync_seq = id",
+        "INSERT OR IGNORE INTO sync_state (name, value) SELECT 'pharmacy_inventory', IFNULL(MAX(id), 0) FROM pharmacy_inventory",
+        "CREATE INDEX IF NOT EXISTS idx_pharmacy_inventory_sync_seq ON pharmacy_inventory(sync_seq)",
+        '''CREATE TRIGGER IF NOT EXISTS trg_pharmacy_inventory_sync_insert AFTER INSERT ON pharmacy_inventory BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'pharmacy_inventory';
+            UPDATE pharmacy_inventory SET sync_seq = (SELECT value FROM sync_state WHERE name = 'pharmacy_inventory') WHERE id = NEW.id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_pharmacy_inventory_sync_update AFTER UPDATE ON pharmacy_inventory
+                WHEN NEW.sync_seq IS OLD.sync_seq BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'pharmacy_inventory';
+            UPDATE pharmacy_inventory SET sync_seq = (SELECT value FROM sync_state WHERE name = 'pharmacy_inventory') WHERE id = NEW.id;
+        END''',
+    ]),
+    (16, "dashboard alert counts in the rollups, no hard-coded high-risk readings", [
+        # The readings triggers no longer test a hard-coded high-risk condition (the dashboards count
+        # the alert engine's alerts instead), so they and village_daily_stats are recreated without it
+        "DROP TRIGGER IF EXISTS trg_readings_rollup_insert",
+        "DROP TRIGGER IF EXISTS trg_readings_rollup_delete",
+        "DROP TRIGGER IF EXISTS trg_readings_rollup_update",
+        "DROP TRIGGER IF EXISTS trg_patients_rollup_delete",
+        "DROP TRIGGER IF EXISTS trg_patients_rollup_village",
+        "DROP TABLE IF EXISTS village_daily_stats",
+        "CREATE TABLE IF NOT EXISTS kpi_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+        '''CREATE TABLE IF NOT EXISTS village_daily_stats (
+            village TEXT NOT NULL, day TEXT NOT NULL, readings_count INTEGER NOT NULL DEFAULT 0,
+            reports_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (village, day)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS asha_stats (
+            asha_worker_phone TEXT PRIMARY KEY, patients_count INTEGER NOT NULL DEFAULT 0,
+            reports_count INTEGER NOT NULL DEFAULT 0
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_insert AFTER INSERT ON readings BEGIN
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_readings';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id), IFNULL(date(NEW.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_daily_stats SET readings_count = readings_count + 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) AND day = IFNULL(date(NEW.timestamp), '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_delete AFTER DELETE ON readings BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_readings';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id), IFNULL(date(OLD.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_daily_stats SET readings_count = readings_count - 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) AND day = IFNULL(date(OLD.timestamp), '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_readings_rollup_update AFTER UPDATE OF patient_id, reading_type, value1, value2, timestamp ON readings
+            BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_readings';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id), IFNULL(date(OLD.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_daily_stats SET readings_count = readings_count - 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) AND day = IFNULL(date(OLD.timestamp), '');
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_readings';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id), IFNULL(date(NEW.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_daily_stats SET readings_count = readings_count + 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) AND day = IFNULL(date(NEW.timestamp), '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_insert AFTER INSERT ON triage_reports BEGIN
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_reports';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id), IFNULL(date(NEW.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_daily_stats SET reports_count = reports_count + 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) AND day = IFNULL(date(NEW.timestamp), '');
+            UPDATE asha_stats SET reports_count = reports_count + 1 WHERE asha_worker_phone = (SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = NEW.patient_id);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_delete AFTER DELETE ON triage_reports BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_reports';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id), IFNULL(date(OLD.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_daily_stats SET reports_count = reports_count - 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) AND day = IFNULL(date(OLD.timestamp), '');
+            UPDATE asha_stats SET reports_count = reports_count - 1 WHERE asha_worker_phone = (SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = OLD.patient_id);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_triage_rollup_update AFTER UPDATE OF patient_id, timestamp ON triage_reports
+            BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_reports';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id), IFNULL(date(OLD.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_daily_stats SET reports_count = reports_count - 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) AND day = IFNULL(date(OLD.timestamp), '');
+            UPDATE asha_stats SET reports_count = reports_count - 1 WHERE asha_worker_phone = (SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = OLD.patient_id);
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_reports';
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id), IFNULL(date(NEW.timestamp), '') WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_daily_stats SET reports_count = reports_count + 1
+                WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) AND day = IFNULL(date(NEW.timestamp), '');
+            UPDATE asha_stats SET reports_count = reports_count + 1 WHERE asha_worker_phone = (SELECT IFNULL(asha_worker_phone, '') FROM patients WHERE id = NEW.patient_id);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_insert AFTER INSERT ON patients BEGIN
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_patients';
+            INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL(NEW.asha_worker_phone, ''));
+            UPDATE asha_stats SET patients_count = patients_count + 1,
+                reports_count = reports_count + (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = NEW.id)
+                WHERE asha_worker_phone = IFNULL(NEW.asha_worker_phone, '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_delete AFTER DELETE ON patients
+            BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_patients';
+            INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL(OLD.asha_worker_phone, ''));
+            UPDATE asha_stats SET patients_count = patients_count - 1,
+                reports_count = reports_count - (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = OLD.id)
+                WHERE asha_worker_phone = IFNULL(OLD.asha_worker_phone, '');
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT IFNULL(OLD.village, ''), day FROM (
+                    SELECT IFNULL(date(r.timestamp), '') AS day FROM readings r WHERE r.patient_id = OLD.id
+                    UNION SELECT IFNULL(date(t.timestamp), '') FROM triage_reports t WHERE t.patient_id = OLD.id
+        );
+            UPDATE village_daily_stats SET
+                readings_count = readings_count - (SELECT COUNT(*) FROM readings r WHERE r.patient_id = OLD.id AND IFNULL(date(r.timestamp), '') = village_daily_stats.day),
+                reports_count = reports_count - (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = OLD.id AND IFNULL(date(t.timestamp), '') = village_daily_stats.day)
+                WHERE village = IFNULL(OLD.village, '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_asha AFTER UPDATE OF asha_worker_phone ON patients
+            WHEN IFNULL(OLD.asha_worker_phone, '') != IFNULL(NEW.asha_worker_phone, '')
+            BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_patients';
+            INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL(OLD.asha_worker_phone, ''));
+            UPDATE asha_stats SET patients_count = patients_count - 1,
+                reports_count = reports_count - (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = OLD.id)
+                WHERE asha_worker_phone = IFNULL(OLD.asha_worker_phone, '');
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_patients';
+            INSERT OR IGNORE INTO asha_stats (asha_worker_phone) VALUES (IFNULL(NEW.asha_worker_phone, ''));
+            UPDATE asha_stats SET patients_count = patients_count + 1,
+                reports_count = reports_count + (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = NEW.id)
+                WHERE asha_worker_phone = IFNULL(NEW.asha_worker_phone, '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_village AFTER UPDATE OF village ON patients
+            WHEN IFNULL(OLD.village, '') != IFNULL(NEW.village, '')
+            BEGIN
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT IFNULL(OLD.village, ''), day FROM (
+                    SELECT IFNULL(date(r.timestamp), '') AS day FROM readings r WHERE r.patient_id = OLD.id
+                    UNION SELECT IFNULL(date(t.timestamp), '') FROM triage_reports t WHERE t.patient_id = OLD.id
+        );
+            UPDATE village_daily_stats SET
+                readings_count = readings_count - (SELECT COUNT(*) FROM readings r WHERE r.patient_id = OLD.id AND IFNULL(date(r.timestamp), '') = village_daily_stats.day),
+                reports_count = reports_count - (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = OLD.id AND IFNULL(date(t.timestamp), '') = village_daily_stats.day)
+                WHERE village = IFNULL(OLD.village, '');
+            INSERT OR IGNORE INTO village_daily_stats (village, day)
+                SELECT IFNULL(NEW.village, ''), day FROM (
+                    SELECT IFNULL(date(r.timestamp), '') AS day FROM readings r WHERE r.patient_id = NEW.id
+                    UNION SELECT IFNULL(date(t.timestamp), '') FROM triage_reports t WHERE t.patient_id = NEW.id
+        );
+            UPDATE village_daily_stats SET
+                readings_count = readings_count + (SELECT COUNT(*) FROM readings r WHERE r.patient_id = NEW.id AND IFNULL(date(r.timestamp), '') = village_daily_stats.day),
+                reports_count = reports_count + (SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = NEW.id AND IFNULL(date(t.timestamp), '') = village_daily_stats.day)
+                WHERE village = IFNULL(NEW.village, '');
+        END''',
+        "DELETE FROM kpi_counters",
+        "DELETE FROM village_daily_stats",
+        "DELETE FROM asha_stats",
+        "INSERT INTO kpi_counters (name, value) SELECT 'total_patients', COUNT(*) FROM patients",
+        "INSERT INTO kpi_counters (name, value) SELECT 'total_readings', COUNT(*) FROM readings",
+        "INSERT INTO kpi_counters (name, value) SELECT 'total_reports', COUNT(*) FROM triage_reports",
+        '''INSERT INTO village_daily_stats (village, day, readings_count, reports_count)
+            SELECT village, day, SUM(readings_count), SUM(reports_count) FROM (
+                SELECT IFNULL(p.village, '') AS village, IFNULL(date(r.timestamp), '') AS day, COUNT(*) AS readings_count, 0 AS reports_count
+                FROM readings r JOIN patients p ON r.patient_id = p.id GROUP BY 1, 2
+                UNION ALL
+                SELECT IFNULL(p.village, ''), IFNULL(date(t.timestamp), ''), 0, COUNT(*)
+                FROM triage_reports t JOIN patients p ON t.patient_id = p.id GROUP BY 1, 2
+        ) GROUP BY village, day''',
+        '''INSERT INTO asha_stats (asha_worker_phone, patients_count, reports_count)
+            SELECT IFNULL(p.asha_worker_phone, ''), COUNT(*), SUM((SELECT COUNT(*) FROM triage_reports t WHERE t.patient_id = p.id))
+            FROM patients p GROUP BY 1''',
+        "CREATE TABLE IF NOT EXISTS village_alert_stats (village TEXT PRIMARY KEY, alerts_count INTEGER NOT NULL DEFAULT 0)",
+        '''CREATE TRIGGER IF NOT EXISTS trg_alerts_rollup_insert AFTER INSERT ON alerts BEGIN
+            UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_alerts';
+            INSERT OR IGNORE INTO village_alert_stats (village)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id) WHERE EXISTS (SELECT 1 FROM patients WHERE id = NEW.patient_id);
+            UPDATE village_alert_stats SET alerts_count = alerts_count + 1 WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = NEW.patient_id);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_alerts_rollup_delete AFTER DELETE ON alerts BEGIN
+            UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_alerts';
+            INSERT OR IGNORE INTO village_alert_stats (village)
+                SELECT (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id) WHERE EXISTS (SELECT 1 FROM patients WHERE id = OLD.patient_id);
+            UPDATE village_alert_stats SET alerts_count = alerts_count - 1 WHERE village = (SELECT IFNULL(village, '') FROM patients WHERE id = OLD.patient_id);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_alerts_delete AFTER DELETE ON patients BEGIN
+            INSERT OR IGNORE INTO village_alert_stats (village) VALUES (IFNULL(OLD.village, ''));
+            UPDATE village_alert_stats SET alerts_count = alerts_count - (SELECT COUNT(*) FROM alerts a WHERE a.patient_id = OLD.id)
+                WHERE village = IFNULL(OLD.village, '');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_alerts_village AFTER UPDATE OF village ON patients
+            WHEN IFNULL(OLD.village, '') != IFNULL(NEW.village, '')
+            BEGIN
+            INSERT OR IGNORE INTO village_alert_stats (village) VALUES (IFNULL(OLD.village, ''));
+            UPDATE village_alert_stats SET alerts_count = alerts_count - (SELECT COUNT(*) FROM alerts a WHERE a.patient_id = OLD.id)
+                WHERE village = IFNULL(OLD.village, '');
+            INSERT OR IGNORE INTO village_alert_stats (village) VALUES (IFNULL(NEW.village, ''));
+            UPDATE village_alert_stats SET alerts_count = alerts_count + (SELECT COUNT(*) FROM alerts a WHERE a.patient_id = NEW.id)
+                WHERE village = IFNULL(NEW.village, '');
+        END''',
+        "DELETE FROM kpi_counters WHERE name = 'total_alerts'",
+        "DELETE FROM village_alert_stats",
+        "INSERT INTO kpi_counters (name, value) SELECT 'total_alerts', COUNT(*) FROM alerts",
+        '''INSERT INTO village_alert_stats (village, alerts_count)
+            SELECT IFNULL(p.village, ''), COUNT(*) FROM alerts a JOIN patients p ON a.patient_id = p.id GROUP BY 1''',
+    ]),
+    (17, "SMS outbox sending lease and race-free dedupe", [
+        "ALTER TABLE sms_outbox ADD COLUMN claimed_at DATETIME",
+        # Only the newest row per key keeps it, so the UNIQUE index can be built on older databases
+        '''UPDATE sms_outbox SET dedupe_key = NULL WHERE dedupe_key IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM sms_outbox WHERE dedupe_key IS NOT NULL GROUP BY dedupe_key
+        )''',
+        "DROP INDEX IF EXISTS idx_outbox_dedupe",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_outbox_dedupe_key ON sms_outbox (dedupe_key)",
+    ]),
+    (18, "claimed (running) state for background triage jobs", [
+        # pending -> running (claimed by one worker) -> done / failed
+        "ALTER TABLE triage_reports ADD COLUMN ai_claimed_at DATETIME",
+        "CREATE INDEX IF NOT EXISTS idx_triage_running ON triage_reports (ai_claimed_at) WHERE ai_status = 'running'",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn, verbose=False):
+    """Brings the database up to LATEST_VERSION. Returns the list of versions applied."""
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have migrated while we waited for the write lock
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+        if verbose:
+            print(f"... Applied migration {version}: {description}")
+    return applied
+
+
+# --- EXPLAIN QUERY PLAN check ---
+# (route, table that must be searched via an index, query, sample parameters)
+HOT_QUERIES = [
+    ("/sms", "patients", "SELECT * FROM patients WHERE phone_number = ?", ("+910000000000",)),
+    ("/dashboard", "patients", "SELECT * FROM patients WHERE village = ? ORDER BY name LIMIT 20", ("Songir",)),
+    ("/dashboard", "patients", "SELECT * FROM patients WHERE asha_worker_phone = ? ORDER BY name LIMIT 20", ("+910000000000",)),
+    ("/dashboard", "readings",
+     "SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY timestamp DESC) as rn FROM readings WHERE patient_id IN (?, ?)) WHERE rn <= 5",
+     (1, 2)),
+    ("/dashboard", "readings",
+     "SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY timestamp ASC) as rn FROM readings WHERE patient_id IN (?, ?) AND reading_type = 'BP') WHERE rn <= 7",
+     (1, 2)),
+    ("/dashboard", "triage_reports",
+     "SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY timestamp DESC) as rn FROM triage_reports WHERE patient_id IN (?, ?)) WHERE rn <= 3",
+     (1, 2)),
+    ("/dashboard", "alerts",
+     "SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY reading_time DESC) as rn FROM alerts WHERE patient_id IN (?, ?)) WHERE rn <= 3",
+     (1, 2)),
+    ("/dashboard", "prescriptions", "SELECT * FROM prescriptions WHERE patient_id IN (?, ?) AND is_active = 1", (1, 2)),
+    ("/user_dashboard", "readings",
+     "SELECT * FROM readings WHERE patient_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT 21",
+     (1, "2025-01-01 00:00:00", 100)),
+    ("/user_dashboard", "reading_buckets",
+     "SELECT * FROM reading_buckets WHERE patient_id = ? AND reading_type = 'BP' AND bucket = 'day' ORDER BY bucket_start DESC LIMIT 7",
+     (1,)),
+    ("/patient/<id>/add_prescription", "pharmacy_inventory",
+     "SELECT pharmacies.id, pharmacy_inventory.id, medication_name, stock_status FROM pharmacies LEFT JOIN pharmacy_inventory ON pharmacy_inventory.pharmacy_id = pharmacies.id ORDER BY pharmacies.name, pharmacies.id, medication_name",
+     ()),
+    ("/patient/<id>/add_prescription", "cache_versions", "SELECT version FROM cache_versions WHERE name = ?", ("inventory",)),
+    ("dashboard response cache", "cache_versions", "SELECT name, version FROM cache_versions WHERE name IN (?, ?)", ("patients", "readings")),
+    ("/pharmacy/add_medicine", "pharmacy_inventory",
+     "SELECT id FROM pharmacy_inventory WHERE pharmacy_id = ? AND lower(medication_name) = ?", (1, "paracetamol 500mg")),
+    ("/api/v1/<resource>", "triage_reports",
+     "SELECT sync_seq AS sync_cursor, id, ai_status FROM triage_reports WHERE sync_seq > ? ORDER BY sync_seq LIMIT ?", (0, 101)),
+    ("/api/v1/<resource>", "readings",
+     "SELECT id AS sync_cursor, id, value1 FROM readings WHERE id > ? ORDER BY id LIMIT ?", (0, 101)),
+    ("/health_dept/dashboard", "triage_reports",
+     "SELECT disease_category, COUNT(*) as count FROM triage_reports WHERE timestamp >= ? AND timestamp < date(?, '+1 day') GROUP BY disease_category",
+     ("2025-01-01", "2025-12-31")),
+]
+
+
+def _uses_index(plan_details, table):
+    """True if every access to `table` in the plan goes through an index (no bare table SCAN)."""
+    touched = False
+    for detail in plan_details:
+        words = detail.split()
+        if table not in words:
+            continue
+        touched = True
+        if "INDEX" not in words and "PRIMARY" not in words:
+            return False
+    return touched
+
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """
+    Runs EXPLAIN QUERY PLAN for every hot query.
+    Returns a list of (route, query, plan_details) that do not hit an index.
+    """
+    failures = []
+    for route, table, query, params in queries:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        details = [row[3] for row in plan]
+        if not _uses_index(details, table):
+            failures.append((route, query, details))
+    return failures
@@ -0,0 +1,72 @@
+"""
+Lazy loader for the triage ML artifacts.
+
+Unpickling the RandomForest pulls in scikit-learn and takes seconds, and only
+the triage pipeline needs it. The registry loads the model, vectorizer and
+remedy index on first use (thread-safe), or ahead of time on a background
+thread when MODEL_WARMUP=background is set, so routes like / and /login start
+serving at plain Flask speed. If the compact export from compact_model.py is
+present it is used instead of the pickles (numpy only, memory-mapped).
+"""
+import os
+import pickle
+import threading
+import time
+
+from remedy_index import load_remedy_index
+
+MODEL_PATH = 'final_disease_model.pkl'
+VECTORIZER_PATH = 'final_vectorizer.pkl'
+# Written by compact_model.py; that module (and numpy) is only imported when the model is loaded
+COMPACT_MODEL_DIR = 'final_model_compact'
+
+
+class ModelRegistry:
+    def __init__(self, model_path=MODEL_PATH, vectorizer_path=VECTORIZER_PATH, compact_dir=COMPACT_MODEL_DIR):
+        self.model_path = model_path
+        self.compact_dir = compact_dir
+        self.vectorizer_path = vectorizer_path
+        self._artifacts = None
+        self._lock = threading.Lock()
+        self._reported_missing = False
+
+    @property
+    def loaded(self):
+        return self._artifacts is not None
+
+    def get(self):
+        """Returns (disease_model, vectorizer, remedy_index), or (None, None, None) if the files are missing."""
+        if self._artifacts is not None:
+            return self._artifacts
+        with self._lock:
+            if self._artifacts is None:
+                try:
+                    self._artifacts = self._load()
+                except FileNotFoundError:
+                    if not self._reported_missing:
+                        print("--- FINAL MODEL FILES NOT FOUND. Please run train_final_model.py first. ---")
+                        self._reported_missing = True
+                    return None, None, None
+        return self._artifacts
+
+    def warm_up_in_background(self):
+        thread = threading.Thread(target=self.get, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _load(self):
+        start = time.perf_counter()
+        if os.path.exists(os.path.join(self.compact_dir, 'meta.json')):
+            from compact_model import load_compact_model
+            disease_model, vectorizer = load_compact_model(self.compact_dir)
+        else:
+            with open(self.model_path, 'rb') as f:
+                disease_model = pickle.load(f)
+            with open(self.vectorizer_path, 'rb') as f:
+                vectorizer = pickle.load(f)
+        remedy_index = load_remedy_index()
+        print(f"--- Final AI Model and Remedy Dataset loaded in {time.perf_counter() - start:.2f}s ---")
+        return disease_model, vectorizer, remedy_index
+
+
+registry = ModelRegistry()
@@ -0,0 +1,101 @@
+"""
+Pharmacy stock availability service.
+
+add_prescription() used to run one inventory query per pharmacy, and so did
+pharmacy_dashboard(). This service loads every pharmacy with its inventory in
+one LEFT JOIN and keeps the result in process. It answers "which pharmacies
+have medication X", "the k nearest pharmacies with X in stock" (grid index,
+see geo_index.py) and "full inventory for all pharmacies" from memory. The snapshot is rebuilt when the 'inventory' cache version changes;
+triggers on pharmacies / pharmacy_inventory bump it (see cache_versions.py).
+"""
+import threading
+
+from cache_versions import get_version
+from geo_index import GridIndex
+
+CACHE_NAME = 'inventory'
+NOT_STOCKED = 'Not Stocked'
+AVAILABLE_STATUSES = ('In Stock', 'Low Stock')
+
+
+class _Snapshot:
+    def __init__(self, rows):
+        self.pharmacies = []             # ordered by name
+        self.inventory = {}              # pharmacy_id -> [item dict, ...] ordered by medication_name
+        self.stock = {}                  # medication_name -> {pharmacy_id: stock_status}
+        for row in rows:
+            pharmacy_id = row['pharmacy_id']
+            if pharmacy_id not in self.inventory:
+                self.pharmacies.append({'id': pharmacy_id, 'name': row['pharmacy_name'], 'location': row['location'],
+                                        'latitude': row['latitude'], 'longitude': row['longitude']})
+                self.inventory[pharmacy_id] = []
+            if row['id'] is None:
+                continue  # pharmacy without any inventory
+            item = {'id': row['id'], 'pharmacy_id': pharmacy_id, 'medication_name': row['medication_name'],
+                    'stock_status': row['stock_status'], 'last_updated': row['last_updated']}
+            self.inventory[pharmacy_id].append(item)
+            self.stock.setdefault(row['medication_name'], {})[pharmacy_id] = row['stock_status']
+        self.medications = sorted(self.stock)
+        self._grid = None
+
+    @property
+    def grid(self):
+        """Spatial index over the pharmacies that have coordinates, built on first use."""
+        if self._grid is None:
+            self._grid = GridIndex((p['latitude'], p['longitude'], p) for p in self.pharmacies
+                                   if p['latitude'] is not None and p['longitude'] is not None)
+        return self._grid
+
+
+class PharmacyAvailability:
+    def __init__(self):
+        self._snapshot = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _current(self, conn):
+        version = get_version(conn, CACHE_NAME)
+        snapshot = self._snapshot
+        if snapshot is not None and version is not None and version == self._version:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or version is None or version != self._version:
+                rows = conn.execute("""
+                    SELECT pharmacies.id as pharmacy_id, pharmacies.name as pharmacy_name, pharmacies.location, latitude, longitude,
+                           pharmacy_inventory.id, medication_name, stock_status, last_updated
+                    FROM pharmacies LEFT JOIN pharmacy_inventory ON pharmacy_inventory.pharmacy_id = pharmacies.id
+                    ORDER BY pharmacies.name, pharmacies.id, medication_name
+                """).fetchall()
+                self._snapshot, self._version = _Snapshot(rows), version
+            return self._snapshot
+
+    def medications(self, conn):
+        """Every medication stocked anywhere in the network, sorted."""
+        return self._current(conn).medications
+
+    def stock_for(self, conn, medication_name):
+        """[{'pharmacy': {...}, 'status': ...}] for every pharmacy, NOT_STOCKED where it is not listed."""
+        snapshot = self._current(conn)
+        statuses = snapshot.stock.get(medication_name, {})
+        return [{'pharmacy': pharmacy, 'status': statuses.get(pharmacy['id'], NOT_STOCKED)}
+                for pharmacy in snapshot.pharmacies]
+
+    def pharmacies_with(self, conn, medication_name, statuses=AVAILABLE_STATUSES):
+        """Pharmacies where the medication's stock status is one of `statuses`."""
+        return [entry for entry in self.stock_for(conn, medication_name) if entry['status'] in statuses]
+
+    def nearest_with(self, conn, medication_name, latitude, longitude, k=5, statuses=AVAILABLE_STATUSES):
+        """The k pharmacies closest to (latitude, longitude) where the medication's status is in `statuses`."""
+        snapshot = self._current(conn)
+        stock = snapshot.stock.get(medication_name, {})
+        nearest = snapshot.grid.nearest(latitude, longitude, k, accept=lambda pharmacy: stock.get(pharmacy['id']) in statuses)
+        return [{'pharmacy': pharmacy, 'status': stock[pharmacy['id']], 'distance_km': round(distance, 1)}
+                for distance, pharmacy in nearest]
+
+    def inventory(self, conn):
+        """(pharmacies, {pharmacy_id: [inventory items]}) for the pharmacy dashboard."""
+        snapshot = self._current(conn)
+        return snapshot.pharmacies, snapshot.inventory
+
+
+availability = PharmacyAvailability()
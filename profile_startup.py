@@ -0,0 +1,55 @@
+"""
+Import-time profile of the Flask app.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter and prints the
+total cold-start time plus the slowest imports (cumulative, including their
+children), so regressions like an eager pandas / sklearn / Twilio import show up.
+
+    python profile_startup.py [--top 20] [--module app]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+def profile_imports(module='app'):
+    env = dict(os.environ, SMS_TRANSPORT=os.environ.get('SMS_TRANSPORT', 'fake'))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, env=env)
+    wall_time = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except (ValueError, IndexError):
+            continue
+        name = fields[2]
+        imports.append((name.rstrip(), self_us, cumulative_us))  # leading spaces = nesting depth
+    return wall_time, imports
+
+
+def print_report(wall_time, imports, top=20):
+    print(f"--- Cold start (interpreter + import): {wall_time * 1000:.0f} ms ---")
+    # The module itself and the packages it imports directly
+    direct = [entry for entry in imports if (len(entry[0]) - len(entry[0].lstrip()) - 1) // 2 <= 1]
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(direct, key=lambda e: e[2], reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name.strip()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import-time profile of the Flask app")
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+    print_report(*profile_imports(args.module), top=args.top)
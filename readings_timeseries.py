@@ -0,0 +1,194 @@
+"""
+Time-series layer over `readings`.
+
+- Raw history is read a page at a time with a (timestamp, id) cursor, so
+  /user_dashboard never loads a patient's whole history.
+- `reading_buckets` holds per-patient daily and weekly count / min / max /
+  sum for value1 and value2. It is filled by an insert trigger, so the charts
+  read a handful of pre-aggregated rows however many readings exist.
+- `compact_readings()` is the retention job. It deletes raw readings older
+  than RAW_RETENTION_DAYS, which the buckets already summarise, and daily
+  buckets older than DAILY_BUCKET_RETENTION_DAYS. Weekly buckets are kept
+  forever.
+
+Buckets are an append-only summary: deleting raw readings (e.g. by the
+compaction job) does not remove them from their buckets. The dashboard KPI
+rollups (kpi_rollups.py) follow the raw table and only count retained readings.
+
+    python readings_timeseries.py --compact [--raw-days 365] [--daily-days 730]
+"""
+import argparse
+from datetime import date
+
+READINGS_PAGE_SIZE = 20
+CHART_BUCKETS = 7
+RAW_RETENTION_DAYS = 365
+DAILY_BUCKET_RETENTION_DAYS = 730
+COMPACTION_BATCH_SIZE = 5000
+
+# bucket name -> SQL expression for the bucket's start date, `{t}` is the readings alias / NEW
+BUCKET_START_SQL = {
+    'day': "date({t}.timestamp)",
+    'week': "date({t}.timestamp, 'weekday 0', '-6 days')",  # Monday of the reading's week
+}
+
+
+def _bucket_trigger_statements(bucket):
+    start = BUCKET_START_SQL[bucket].format(t='NEW')
+    return f"""
+        INSERT OR IGNORE INTO reading_buckets (patient_id, reading_type, bucket, bucket_start)
+            VALUES (NEW.patient_id, NEW.reading_type, '{bucket}', {start});
+        UPDATE reading_buckets SET
+            count = count + 1,
+            min1 = CASE WHEN min1 IS NULL OR NEW.value1 < min1 THEN NEW.value1 ELSE min1 END,
+            max1 = CASE WHEN max1 IS NULL OR NEW.value1 > max1 THEN NEW.value1 ELSE max1 END,
+            sum1 = sum1 + IFNULL(NEW.value1, 0),
+            count2 = count2 + (NEW.value2 IS NOT NULL),
+            min2 = CASE WHEN NEW.value2 IS NOT NULL AND (min2 IS NULL OR NEW.value2 < min2) THEN NEW.value2 ELSE min2 END,
+            max2 = CASE WHEN NEW.value2 IS NOT NULL AND (max2 IS NULL OR NEW.value2 > max2) THEN NEW.value2 ELSE max2 END,
+            sum2 = sum2 + IFNULL(NEW.value2, 0)
+            WHERE patient_id = NEW.patient_id AND reading_type = NEW.reading_type AND bucket = '{bucket}' AND bucket_start = {start};
+    """
+
+
+def _bucket_backfill_statement(bucket):
+    start = BUCKET_START_SQL[bucket].format(t='readings')
+    return f'''INSERT INTO reading_buckets (patient_id, reading_type, bucket, bucket_start, count, min1, max1, sum1, count2, min2, max2, sum2)
+        SELECT patient_id, reading_type, '{bucket}', {start}, COUNT(*), MIN(value1), MAX(value1), IFNULL(SUM(value1), 0),
+               COUNT(value2), MIN(value2), MAX(value2), IFNULL(SUM(value2), 0)
+        FROM readings GROUP BY patient_id, reading_type, {start}'''
+
+
+SCHEMA_STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS reading_buckets (
+        patient_id INTEGER NOT NULL, reading_type TEXT NOT NULL, bucket TEXT NOT NULL, bucket_start TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0, min1 REAL, max1 REAL, sum1 REAL NOT NULL DEFAULT 0,
+        count2 INTEGER NOT NULL DEFAULT 0, min2 REAL, max2 REAL, sum2 REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (patient_id, reading_type, bucket, bucket_start)
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_reading_buckets_start ON reading_buckets(bucket, bucket_start)",
+    f'''CREATE TRIGGER IF NOT EXISTS trg_readings_buckets_insert AFTER INSERT ON readings
+        BEGIN {_bucket_trigger_statements('day')} {_bucket_trigger_statements('week')} END''',
+    _bucket_backfill_statement('day'),
+    _bucket_backfill_statement('week'),
+]
+
+
+# --- Raw history, cursor paginated ---
+def _encode_cursor(row):
+    return f"{row['timestamp']}|{row['id']}"
+
+
+def _decode_cursor(cursor):
+    timestamp, _, reading_id = (cursor or '').rpartition('|')
+    if not timestamp or not reading_id.isdigit():
+        return None
+    return timestamp, int(reading_id)
+
+
+def get_readings_page(conn, patient_id, before=None, limit=READINGS_PAGE_SIZE):
+    """
+    One page of a patient's readings, newest first. `before` is the cursor returned
+    by the previous page. Returns (rows, next_cursor), next_cursor is None on the last page.
+    """
+    query = "SELECT *, strftime('%Y-%m-%d %-I:%M %p', timestamp) as formatted_time FROM readings WHERE patient_id = ?"
+    params = [patient_id]
+    position = _decode_cursor(before)
+    if position:
+        query += " AND (timestamp, id) < (?, ?)"
+        params.extend(position)
+    query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    rows = conn.execute(query, params).fetchall()
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+# --- Pre-aggregated chart series ---
+def get_bucket_series(conn, patient_id, reading_type='BP', bucket='day', limit=CHART_BUCKETS):
+    """The last `limit` buckets for a patient, oldest first, with min / max / mean per value."""
+    rows = conn.execute("""
+        SELECT bucket_start, count,
+               min1, max1, sum1 / count as mean1, min2, max2, CASE WHEN count2 > 0 THEN sum2 / count2 END as mean2
+        FROM reading_buckets WHERE patient_id = ? AND reading_type = ? AND bucket = ?
+        ORDER BY bucket_start DESC LIMIT ?
+    """, (patient_id, reading_type, bucket, limit)).fetchall()
+    series = []
+    for row in reversed(rows):
+        point = dict(row)
+        point['label'] = date.fromisoformat(row['bucket_start']).strftime('%d-%b')
+        series.append(point)
+    return series
+
+
+# --- Retention / compaction ---
+def compact_readings(conn, raw_retention_days=RAW_RETENTION_DAYS, daily_retention_days=DAILY_BUCKET_RETENTION_DAYS,
+                     batch_size=COMPACTION_BATCH_SIZE, verbose=False):
+    """Deletes expired raw readings and daily buckets in short batches. Returns (readings, daily buckets) removed."""
+    removed_readings = 0
+    while True:
+        # Small transactions so the /sms webhook is never blocked for long
+        cursor = conn.execute("""
+            DELETE FROM readings WHERE id IN (
+                SELECT id FROM readings WHERE timestamp < datetime('now', ?) LIMIT ?
+            )
+        """, (f"-{int(raw_retention_days)} days", batch_size))
+        conn.commit()
+        removed_readings += cursor.rowcount
+        if verbose and cursor.rowcount:
+            print(f"... {removed_readings} raw readings removed")
+        if cursor.rowcount < batch_size:
+            break
+    cursor = conn.execute("DELETE FROM reading_buckets WHERE bucket = 'day' AND bucket_start < date('now', ?)",
+                          (f"-{int(daily_retention_days)} days",))
+    conn.commit()
+    return removed_readings, cursor.rowcount
+
+
+def add_to_buckets(conn, after_id=0):
+    """
+    Folds readings with id > after_id into reading_buckets with one GROUP BY per bucket size.
+    For bulk loads that run with the bucket trigger dropped (see synthetic_data.py); the caller commits.
+    """
+    for bucket, start_sql in BUCKET_START_SQL.items():
+        start = start_sql.format(t='readings')
+        conn.execute("DROP TABLE IF EXISTS temp.new_buckets")
+        conn.execute(f'''CREATE TEMP TABLE new_buckets AS
+            SELECT patient_id, reading_type, {start} AS bucket_start, COUNT(*) AS count, MIN(value1) AS min1, MAX(value1) AS max1,
+                   IFNULL(SUM(value1), 0) AS sum1, COUNT(value2) AS count2, MIN(value2) AS min2, MAX(value2) AS max2, IFNULL(SUM(value2), 0) AS sum2
+            FROM readings WHERE id > ? GROUP BY patient_id, reading_type, {start}''', (after_id,))
+        conn.execute(f'''INSERT OR IGNORE INTO reading_buckets (patient_id, reading_type, bucket, bucket_start)
+            SELECT patient_id, reading_type, '{bucket}', bucket_start FROM new_buckets''')
+        conn.execute(f'''UPDATE reading_buckets SET
+                count = reading_buckets.count + n.count,
+                min1 = CASE WHEN reading_buckets.min1 IS NULL OR n.min1 < reading_buckets.min1 THEN n.min1 ELSE reading_buckets.min1 END,
+                max1 = CASE WHEN reading_buckets.max1 IS NULL OR n.max1 > reading_buckets.max1 THEN n.max1 ELSE reading_buckets.max1 END,
+                sum1 = reading_buckets.sum1 + n.sum1,
+                count2 = reading_buckets.count2 + n.count2,
+                min2 = CASE WHEN n.min2 IS NOT NULL AND (reading_buckets.min2 IS NULL OR n.min2 < reading_buckets.min2) THEN n.min2 ELSE reading_buckets.min2 END,
+                max2 = CASE WHEN n.max2 IS NOT NULL AND (reading_buckets.max2 IS NULL OR n.max2 > reading_buckets.max2) THEN n.max2 ELSE reading_buckets.max2 END,
+                sum2 = reading_buckets.sum2 + n.sum2
+            FROM new_buckets n
+            WHERE reading_buckets.patient_id = n.patient_id AND reading_buckets.reading_type = n.reading_type
+              AND reading_buckets.bucket = '{bucket}' AND reading_buckets.bucket_start = n.bucket_start''')
+        conn.execute("DROP TABLE temp.new_buckets")
+
+
+if __name__ == '__main__':
+    from db import get_db_connection
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Readings retention / compaction job")
+    parser.add_argument('--compact', action='store_true', help="delete expired raw readings and daily buckets")
+    parser.add_argument('--raw-days', type=int, default=RAW_RETENTION_DAYS)
+    parser.add_argument('--daily-days', type=int, default=DAILY_BUCKET_RETENTION_DAYS)
+    args = parser.parse_args()
+    if not args.compact:
+        parser.print_help()
+    else:
+        conn = get_db_connection()
+        apply_migrations(conn)
+        readings_removed, buckets_removed = compact_readings(conn, args.raw_days, args.daily_days, verbose=True)
+        conn.execute("PRAGMA optimize")
+        conn.close()
+        print(f"--- Compaction done: {readings_removed} raw readings and {buckets_removed} daily buckets removed ---")
@@ -0,0 +1,57 @@
+"""
+Disease -> trusted treatment lookup used by get_ai_prediction().
+
+final_remedy_dataset.csv holds ~2.7k rows for 100 diseases, but only the first
+treatment per disease is ever used. It is compiled once into a plain dict keyed
+by the lower-cased disease name, so a lookup is a single O(1) dict access and
+pandas is not needed at serving time. train_model_remedies.py also writes the
+compiled index to final_remedy_index.json, which loads faster than the CSV.
+"""
+import csv
+import json
+import os
+
+REMEDY_CSV_PATH = 'final_remedy_dataset.csv'
+REMEDY_INDEX_PATH = 'final_remedy_index.json'
+
+
+def disease_key(name):
+    """Case- and whitespace-insensitive key for a disease name."""
+    return ' '.join(name.split()).lower()
+
+
+def build_remedy_index(csv_path=REMEDY_CSV_PATH):
+    """{disease_key(Disease): (Disease, Treatment)} keeping the first row per disease."""
+    index = {}
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            index.setdefault(disease_key(row['Disease']), (row['Disease'], row['Treatment']))
+    return index
+
+
+def save_remedy_index(index, index_path=REMEDY_INDEX_PATH):
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_remedy_index(index_path=REMEDY_INDEX_PATH, csv_path=REMEDY_CSV_PATH):
+    """Loads the compiled index, rebuilding it from the CSV if it is missing or older than the CSV."""
+    csv_exists = os.path.exists(csv_path)
+    if os.path.exists(index_path) and (not csv_exists or os.path.getmtime(index_path) >= os.path.getmtime(csv_path)):
+        with open(index_path, encoding='utf-8') as f:
+            return {key: tuple(value) for key, value in json.load(f).items()}
+    if not csv_exists:
+        raise FileNotFoundError(csv_path)
+    return build_remedy_index(csv_path)
+
+
+def lookup_treatment(index, disease):
+    """Returns the trusted treatment text for `disease`, or None if it is not in the dataset."""
+    entry = index.get(disease_key(disease))
+    return entry[1] if entry else None
+
+
+def canonical_disease(index, disease):
+    """The dataset's spelling of `disease`, or the name with its whitespace collapsed if it is not a known class."""
+    entry = index.get(disease_key(disease))
+    return entry[0] if entry else ' '.join(disease.split())
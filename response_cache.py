@@ -0,0 +1,119 @@
+"""
+Server-side cache for the read-heavy dashboard pages, with ETag / 304 support.
+
+A cached view names the tables it reads. Each of them has a write counter in
+`cache_versions`, bumped by triggers (see cache_versions.py). So /sms readings,
+triage reports and their AI updates, inventory edits, new medicines, bulk
+imports and the alert engine all invalidate the right pages, whichever code
+path or process wrote.
+
+For a GET, the decorator reads those versions in one query and builds an ETag
+from (view, role, query args, versions):
+
+- If-None-Match matches: 304, no aggregation and no rendering.
+- The page for that ETag is in the in-process LRU: it is returned without
+  running the view.
+- Otherwise the view runs and its 200 response is stored.
+
+Entries also expire after TTL_SECONDS. Pages are not cached while the session
+holds flash messages, because those are rendered into the page once.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session
+
+import metrics
+from db import get_db_connection
+
+MAX_ENTRIES = 256
+TTL_SECONDS = 300
+
+# Write counters behind each dashboard (cache_versions names: the table, or 'inventory')
+MONITORING_TABLES = ('patients', 'readings', 'triage_reports', 'prescriptions', 'alerts')
+HEALTH_DEPT_TABLES = ('patients', 'readings', 'triage_reports', 'alerts', 'inventory')
+PHARMACY_TABLES = ('inventory',)
+
+
+class ResponseCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # etag -> (expires_at, body, mimetype)
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[etag]
+                return None
+            self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag, body, mimetype):
+        with self._lock:
+            self._entries[etag] = (time.monotonic() + self.ttl, body, mimetype)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = ResponseCache()
+
+
+def get_versions(conn, names):
+    marks = ', '.join('?' for _ in names)
+    versions = dict(conn.execute(f"SELECT name, version FROM cache_versions WHERE name IN ({marks})", names).fetchall())
+    return tuple(versions.get(name) for name in names)
+
+
+def make_etag(view, role, args, versions):
+    """Opaque tag value (sent as a weak ETag: the page is equivalent, not byte-identical, across renders)."""
+    key = repr((view, role, sorted(args.items(multi=True)), versions))
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def cached_view(role, tables):
+    """
+    Caches a dashboard view's GET responses for users with session[role] set.
+    Other requests (POST, logged-out redirects) go straight to the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or not session.get(role) or session.get('_flashes'):
+                return view(*args, **kwargs)
+            conn = get_db_connection()
+            versions = get_versions(conn, tables)
+            conn.close()
+            if None in versions:   # schema without the version counters: never serve stale pages
+                return view(*args, **kwargs)
+            etag = make_etag(view.__name__, role, request.args, versions)
+            headers = {'ETag': f'W/"{etag}"', 'Cache-Control': 'private, no-cache'}
+
+            if request.if_none_match.contains_weak(etag):
+                metrics.registry.inc('response_cache_total', view=view.__name__, result='not_modified')
+                return '', 304, headers
+            entry = cache.get(etag)
+            if entry is not None:
+                metrics.registry.inc('response_cache_total', view=view.__name__, result='hit')
+                return entry[1], 200, dict(headers, **{'Content-Type': entry[2]})
+
+            metrics.registry.inc('response_cache_total', view=view.__name__, result='miss')
+            response = view(*args, **kwargs)
+            if isinstance(response, str):
+                cache.put(etag, response, 'text/html; charset=utf-8')
+                return response, 200, headers
+            return response
+        return wrapper
+    return decorator
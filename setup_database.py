@@ -1,78 +1,68 @@
 import sqlite3
+import sys
 from werkzeug.security import generate_password_hash
+from db import DATABASE_PATH
+from migrations import apply_migrations, check_query_plans, get_schema_version
 
-connection = sqlite3.connect('health.db')
-cursor = connection.cursor()
+# Usage:
+#   python setup_database.py                -> create / upgrade the schema, keep existing data
+#   python setup_database.py --reset        -> drop every table first (old "clean start" behaviour)
+#   python setup_database.py --check-plans  -> verify the hot queries in app.py use an index
 
-# --- Drop all existing tables to ensure a clean start ---
-cursor.execute("DROP TABLE IF EXISTS readings")
-cursor.execute("DROP TABLE IF EXISTS prescriptions")
-cursor.execute("DROP TABLE IF EXISTS triage_reports")
-cursor.execute("DROP TABLE IF EXISTS pharmacy_inventory")
-cursor.execute("DROP TABLE IF EXISTS pharmacies")
-cursor.execute("DROP TABLE IF EXISTS patients")
+connection = sqlite3.connect(DATABASE_PATH)
+cursor = connection.cursor()
 
-# --- Create Patients Table ---
-cursor.execute('''
-CREATE TABLE patients (
-    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, phone_number TEXT UNIQUE NOT NULL,
-    email TEXT, password_hash TEXT NOT NULL, active_call_link TEXT, age INTEGER, gender TEXT,
-    village TEXT, asha_worker_phone TEXT 
-)''')
+if '--reset' in sys.argv:
+    # --- Drop all existing tables to ensure a clean start ---
+    # Every table, not just the original six: outbox, caches, rollups, alerts and engine/sync cursors
+    # would otherwise survive and point at rows (and patient ids) that no longer exist.
+    tables = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    for table in tables:
+        cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        cursor.execute("DELETE FROM sqlite_stat1")
+    cursor.execute("PRAGMA user_version = 0")
+    connection.commit()
 
-# --- Create Pharmacies & Inventory Tables ---
-cursor.execute('''CREATE TABLE pharmacies (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, location TEXT)''')
-cursor.execute('''
-CREATE TABLE pharmacy_inventory (
-    id INTEGER PRIMARY KEY AUTOINCREMENT, pharmacy_id INTEGER, medication_name TEXT NOT NULL,
-    stock_status TEXT NOT NULL, last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (pharmacy_id) REFERENCES pharmacies (id)
-)''')
+# --- Create / upgrade the schema (see migrations.py) ---
+applied = apply_migrations(connection, verbose=True)
+print(f"... Schema is at version {get_schema_version(connection)} ({len(applied)} migration(s) applied).")
 
-# --- Create Prescriptions Table ---
-cursor.execute('''
-CREATE TABLE prescriptions (
-    id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER, medication_name TEXT NOT NULL,
-    dosage TEXT, notes TEXT, is_active INTEGER DEFAULT 1, dispensing_pharmacy_id INTEGER, 
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY (patient_id) REFERENCES patients (id),
-    FOREIGN KEY (dispensing_pharmacy_id) REFERENCES pharmacies (id)
-)''')
+# --- Insert Sample Data (only into an empty database) ---
+if cursor.execute("SELECT COUNT(id) FROM pharmacies").fetchone()[0] == 0:
+    cursor.execute("INSERT INTO pharmacies (name, location, latitude, longitude) VALUES (?, ?, ?, ?)", ('Nabha Civil Hospital Pharmacy', 'Nabha City', 30.3747, 76.1527))
+    cursor.execute("INSERT INTO pharmacies (name, location, latitude, longitude) VALUES (?, ?, ?, ?)", ('PHC Bhadson Pharmacy', 'Bhadson Village', 30.3510, 76.2066))
+    cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (1, 'Paracetamol 500mg', 'In Stock'))
+    cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (1, 'Metformin 500mg', 'Out of Stock'))
+    cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (2, 'Metformin 500mg', 'In Stock'))
+    # Near the sample patient's village (Songir, Dhule district), so "nearest in stock" has real candidates
+    cursor.execute("INSERT INTO pharmacies (name, location, latitude, longitude) VALUES (?, ?, ?, ?)", ('PHC Songir Pharmacy', 'Songir Village', 21.0789, 74.7845))
+    cursor.execute("INSERT INTO pharmacies (name, location, latitude, longitude) VALUES (?, ?, ?, ?)", ('Dhule Civil Hospital Pharmacy', 'Dhule City', 20.9042, 74.7749))
+    cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (3, 'Paracetamol 500mg', 'In Stock'))
+    cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (3, 'Metformin 500mg', 'Out of Stock'))
+    cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (4, 'Metformin 500mg', 'In Stock'))
 
-# --- Create Readings Table ---
-cursor.execute('''
-CREATE TABLE readings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER, reading_type TEXT NOT NULL, 
-    value1 INTEGER NOT NULL, value2 INTEGER, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, 
-    FOREIGN KEY (patient_id) REFERENCES patients (id)
-)''')
+if cursor.execute("SELECT COUNT(name) FROM villages").fetchone()[0] == 0:
+    cursor.executemany("INSERT INTO villages (name, latitude, longitude) VALUES (?, ?, ?)", [
+        ('Nabha', 30.3747, 76.1527), ('Bhadson', 30.3510, 76.2066), ('Songir', 21.0760, 74.7890), ('Dhule', 20.9042, 74.7749),
+    ])
 
-# --- Create Triage Reports Table (UPDATED SCHEMA) ---
-cursor.execute('''
-CREATE TABLE triage_reports (
-    id INTEGER PRIMARY KEY AUTOINCREMENT, 
-    patient_id INTEGER, 
-    chief_complaint TEXT NOT NULL,
-    symptoms TEXT, 
-    notes TEXT, 
-    ai_prediction TEXT, -- NEW COLUMN for AI output
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (patient_id) REFERENCES patients (id)
-)
-''')
+if cursor.execute("SELECT COUNT(id) FROM patients").fetchone()[0] == 0:
+    hashed_password = generate_password_hash('password123')
+    asha_phone = '+919123456789'
+    cursor.execute("INSERT INTO patients (name, phone_number, age, gender, village, password_hash, asha_worker_phone) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ('Ramesh Patil', '+919876543210', 65, 'Male', 'Songir', hashed_password, asha_phone))
 
-# --- Insert Sample Data ---
-cursor.execute("INSERT INTO pharmacies (name, location) VALUES (?, ?)", ('Nabha Civil Hospital Pharmacy', 'Nabha City'))
-cursor.execute("INSERT INTO pharmacies (name, location) VALUES (?, ?)", ('PHC Bhadson Pharmacy', 'Bhadson Village'))
-cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (1, 'Paracetamol 500mg', 'In Stock'))
-cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (1, 'Metformin 500mg', 'Out of Stock'))
-cursor.execute("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", (2, 'Metformin 500mg', 'In Stock'))
+connection.commit()
 
-hashed_password = generate_password_hash('password123')
-asha_phone = '+919123456789'
-cursor.execute("INSERT INTO patients (name, phone_number, age, gender, village, password_hash, asha_worker_phone) VALUES (?, ?, ?, ?, ?, ?, ?)", 
-    ('Ramesh Patil', '+919876543210', 65, 'Male', 'Songir', hashed_password, asha_phone))
+if '--check-plans' in sys.argv:
+    failures = check_query_plans(connection)
+    for route, query, details in failures:
+        print(f"!!! {route}: query does not use an index\n    {query}\n    plan: {details}")
+    if failures:
+        connection.close()
+        sys.exit(1)
+    print("... EXPLAIN QUERY PLAN: every hot query uses an index.")
 
-connection.commit()
 connection.close()
-print("Database `health.db` was reset with the complete schema, including the new AI prediction column.")
-
+print(f"Database `{DATABASE_PATH}` is ready.")
@@ -0,0 +1,304 @@
+"""
+High-throughput ingestion path for the /sms webhook.
+
+On camp days ASHA workers forward hundreds of readings in a burst. Instead of
+a patient lookup, an INSERT and a commit per message:
+
+- `parse_readings()` parses and validates the table-driven command grammar
+  (READING_TYPES, several readings per message, English / Hindi / Punjabi
+  keywords) before anything touches the database.
+- `PatientCache` resolves phone -> patient from memory. Only a miss, or an
+  entry older than PATIENT_CACHE_TTL_SECONDS, queries `patients`.
+- `ReadingWriter` queues validated readings. A background thread writes them
+  with one executemany + commit per micro-batch (up to WRITE_BATCH_SIZE rows
+  or WRITE_FLUSH_SECONDS), so Twilio gets its reply without waiting for the
+  commit. A failed batch (e.g. 'database is locked', disk errors) is retried
+  with backoff up to WRITE_MAX_ATTEMPTS times; only then are its readings
+  appended to the dead-letter file (DEAD_LETTER_PATH, one JSON object per
+  reading) for re-import by hand. A crash can lose at most one unflushed
+  micro-batch.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import unicodedata
+
+from db import get_db_connection
+
+PATIENT_CACHE_TTL_SECONDS = 300
+WRITE_BATCH_SIZE = 200
+WRITE_FLUSH_SECONDS = 0.05
+WRITE_MAX_ATTEMPTS = 5
+WRITE_RETRY_BASE_SECONDS = 0.5      # 0.5s, 1s, 2s, 4s (on top of the connection's busy_timeout)
+DEAD_LETTER_PATH = os.environ.get('SMS_DEAD_LETTER_PATH', 'sms_dead_letter.jsonl')
+
+# Command grammar: one entry per reading type. A message is any sequence of
+# "<keyword> <value> [<value>]" groups, e.g. "BP 130 85 SUGAR 160 PULSE 72" or "BP 130/85".
+# `ranges` are physically plausible bounds per value; anything outside is almost certainly a typo.
+READING_TYPES = {
+    'BP': {
+        'keywords': ('BP', 'बीपी', 'रक्तचाप', 'ਬੀਪੀ', 'ਬਲੱਡਪ੍ਰੈਸ਼ਰ'),
+        'labels': ('Systolic BP', 'Diastolic BP'),
+        'ranges': ((50, 300), (30, 200)),
+        'unit': '',
+    },
+    'SUGAR': {
+        'keywords': ('SUGAR', 'शुगर', 'ਸ਼ੂਗਰ'),
+        'labels': ('Sugar level',),
+        'ranges': ((20, 800),),
+        'unit': ' mg/dL',
+    },
+    'PULSE': {
+        'keywords': ('PULSE', 'नब्ज़', 'नाड़ी', 'ਨਬਜ਼'),
+        'labels': ('Pulse',),
+        'ranges': ((25, 250),),
+        'unit': ' bpm',
+    },
+}
+
+INVALID_FORMAT_MESSAGE = "Invalid format. Please use: 'BP 120 80', 'SUGAR 150', 'PULSE 72' or several, e.g. 'BP 120 80 SUGAR 150'."
+
+
+def _normalize(token):
+    return unicodedata.normalize('NFC', token).upper()
+
+
+KEYWORD_TO_TYPE = {_normalize(keyword): reading_type
+                   for reading_type, spec in READING_TYPES.items() for keyword in spec['keywords']}
+
+
+class InvalidReading(ValueError):
+    """Raised for SMS bodies that are not a valid reading; the message is sent back to the patient."""
+
+
+def _parse_value(token, label, value_range):
+    try:
+        value = int(token)
+    except ValueError:
+        raise InvalidReading(INVALID_FORMAT_MESSAGE) from None
+    low, high = value_range
+    if not low <= value <= high:
+        raise InvalidReading(f"{label} {value} looks wrong. Please check the reading and send it again.")
+    return value
+
+
+def parse_readings(text):
+    """
+    Parses every reading in an SMS body in one pass.
+    Returns [(reading_type, value1, value2), ...], raises InvalidReading if any part is malformed.
+    """
+    tokens = [_normalize(token) for token in (text or '').replace('/', ' ').split()]
+    readings, position = [], 0
+    while position < len(tokens):
+        reading_type = KEYWORD_TO_TYPE.get(tokens[position])
+        if reading_type is None:
+            raise InvalidReading(INVALID_FORMAT_MESSAGE)
+        spec = READING_TYPES[reading_type]
+        value_tokens = tokens[position + 1:position + 1 + len(spec['labels'])]
+        if len(value_tokens) < len(spec['labels']):
+            raise InvalidReading(INVALID_FORMAT_MESSAGE)
+        values = [_parse_value(token, label, value_range)
+                  for token, label, value_range in zip(value_tokens, spec['labels'], spec['ranges'])]
+        if reading_type == 'BP' and values[1] >= values[0]:
+            raise InvalidReading(f"BP {values[0]}/{values[1]} looks wrong. Please send the top number first.")
+        readings.append((reading_type, values[0], values[1] if len(values) > 1 else None))
+        position += 1 + len(values)
+    if not readings:
+        raise InvalidReading(INVALID_FORMAT_MESSAGE)
+    return readings
+
+
+def format_reading(reading_type, value1, value2=None):
+    """'BP 130/85', 'Sugar 160 mg/dL', 'Pulse 72 bpm' for SMS replies and alerts."""
+    values = f"{value1}/{value2}" if value2 is not None else f"{value1}"
+    name = reading_type if reading_type == 'BP' else reading_type.capitalize()
+    return f"{name} {values}{READING_TYPES[reading_type]['unit']}"
+
+
+# --- Alert thresholds ---
+# Per reading type: (value1 min, value1 max, value2 min, value2 max), None = no limit.
+# Overridden by the JSON file at ALERT_THRESHOLDS_PATH, e.g. {"BP": [null, 140, null, 90]}.
+ALERT_THRESHOLDS_PATH = os.environ.get('ALERT_THRESHOLDS_PATH', 'alert_thresholds.json')
+DEFAULT_ALERT_THRESHOLDS = {
+    'BP': (None, 140, None, 90),
+    'SUGAR': (None, 180, None, None),
+    'PULSE': (50, 120, None, None),
+}
+
+
+def load_alert_thresholds(path=ALERT_THRESHOLDS_PATH):
+    thresholds = dict(DEFAULT_ALERT_THRESHOLDS)
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for reading_type, limits in json.load(f).items():
+                thresholds[reading_type.upper()] = tuple(limits) + (None,) * (4 - len(limits))
+    return thresholds
+
+
+def alert_direction(reading_type, value1, value2, thresholds):
+    """'High' or 'Low' depending on which configured limit the reading crosses ('High' wins), None if within limits."""
+    limits = thresholds.get(reading_type)
+    if not limits:
+        return None
+    crossed = set()
+    for value, low, high in ((value1, limits[0], limits[1]), (value2, limits[2], limits[3])):
+        if value is None:
+            continue
+        if high is not None and value > high:
+            crossed.add('High')
+        elif low is not None and value < low:
+            crossed.add('Low')
+    if 'High' in crossed:
+        return 'High'
+    return 'Low' if crossed else None
+
+
+# --- Phone -> patient cache ---
+class PatientCache:
+    def __init__(self, ttl=PATIENT_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries = {}   # phone -> (expires_at, {'id', 'name'})
+        self._lock = threading.Lock()
+
+    def get(self, phone_number):
+        """{'id', 'name'} of the patient registered with this number, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(phone_number)
+        if entry and entry[0] > now:
+            return entry[1]
+        conn = get_db_connection()
+        try:
+            row = conn.execute('SELECT id, name FROM patients WHERE phone_number = ?', (phone_number,)).fetchone()
+        finally:
+            conn.close()
+        # Unknown numbers are not cached, so a patient can text right after signing up
+        if row is None:
+            return None
+        patient = {'id': row['id'], 'name': row['name']}
+        with self._lock:
+            self._entries[phone_number] = (now + self.ttl, patient)
+        return patient
+
+    def invalidate(self, phone_number=None):
+        with self._lock:
+            if phone_number is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(phone_number, None)
+
+
+# --- Micro-batched writer ---
+class ReadingWriter:
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, flush_seconds=WRITE_FLUSH_SECONDS, on_commit=None,
+                 max_attempts=WRITE_MAX_ATTEMPTS, retry_base_seconds=WRITE_RETRY_BASE_SECONDS, dead_letter_path=DEAD_LETTER_PATH):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.dead_letter_path = dead_letter_path
+        self.on_commit = on_commit  # called after every committed batch, e.g. to wake the alert engine
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop = threading.Event()
+        self.written = 0
+        self.dead_lettered = 0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sms-ingest", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        batch = self._drain()
+        while batch:
+            self._write_batch(batch)
+            batch = self._drain()
+
+    def submit(self, patient_id, readings):
+        """Queues [(reading_type, value1, value2), ...] for one patient."""
+        for reading_type, value1, value2 in readings:
+            self._queue.put((patient_id, reading_type, value1, value2))
+
+    def flush(self):
+        """Blocks until everything submitted so far is committed."""
+        self._queue.join()
+
+    def _drain(self, first=None):
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # Give a burst a moment to accumulate so it shares one commit
+            time.sleep(self.flush_seconds)
+            self._write_batch(self._drain(first))
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    self._insert(batch)
+                    break
+                except Exception as e:
+                    if attempt == self.max_attempts:
+                        self._dead_letter(batch, e)
+                        return
+                    delay = self.retry_base_seconds * (2 ** (attempt - 1))
+                    print(f"Error writing {len(batch)} SMS readings (attempt {attempt}), retrying in {delay}s: {e}")
+                    time.sleep(delay)
+            self.written += len(batch)
+            if self.on_commit:
+                try:
+                    self.on_commit()
+                except Exception as e:
+                    print(f"Error in SMS ingest commit hook: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _insert(self, batch):
+        conn = get_db_connection()
+        try:
+            conn.executemany('INSERT INTO readings (patient_id, reading_type, value1, value2) VALUES (?, ?, ?, ?)', batch)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _dead_letter(self, batch, error):
+        """Keeps readings that could not be written after every retry, instead of dropping them silently."""
+        failed_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        lines = [json.dumps({'patient_id': patient_id, 'reading_type': reading_type, 'value1': value1, 'value2': value2,
+                             'failed_at': failed_at, 'error': str(error)}, ensure_ascii=False)
+                 for patient_id, reading_type, value1, value2 in batch]
+        try:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"!!! Could not write dead-letter file '{self.dead_letter_path}' ({e}); lost readings follow")
+            for line in lines:
+                print(f"!!! {line}")
+        else:
+            print(f"!!! Gave up on {len(batch)} SMS readings after {self.max_attempts} attempts ({error}); saved to '{self.dead_letter_path}'")
+        self.dead_lettered += len(batch)
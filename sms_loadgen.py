@@ -0,0 +1,118 @@
+"""
+Load generator for the /sms webhook.
+
+Replays synthetic Twilio POSTs (form-encoded `From` / `Body`, like Twilio sends)
+from registered patients' phone numbers and reports messages/sec and latency
+percentiles. By default the app is driven in-process through Flask's test
+client (with the fake SMS transport), and the run also waits for the
+micro-batched writer so the rate includes the commits. With --url it targets a
+running server instead.
+
+    python sms_loadgen.py [--messages 2000] [--concurrency 8] [--url http://localhost:5000/sms]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import percentile
+
+DEFAULT_MESSAGES = 2000
+DEFAULT_CONCURRENCY = 8
+
+
+def synthetic_bodies(count, seed=42):
+    """Mostly valid readings (some multi-reading), a few high ones (alerts) and a few malformed."""
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.45:
+            bodies.append(f"BP {rng.randint(100, 165)} {rng.randint(60, 99)}")
+        elif roll < 0.6:
+            bodies.append(f"BP {rng.randint(100, 165)} {rng.randint(60, 99)} SUGAR {rng.randint(70, 260)} PULSE {rng.randint(55, 110)}")
+        elif roll < 0.95:
+            bodies.append(f"SUGAR {rng.randint(70, 260)}")
+        else:
+            bodies.append(rng.choice(["BP 120", "SUGAR high", "hello", "BP 80 120"]))
+    return bodies
+
+
+def registered_phones(database_path, limit=500):
+    conn = sqlite3.connect(database_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT phone_number FROM patients LIMIT ?", (limit,))]
+    finally:
+        conn.close()
+
+
+def run_load(post, phones, bodies, concurrency=DEFAULT_CONCURRENCY):
+    """Sends every body via post(from_number, body) -> status code. Returns (elapsed seconds, latencies, errors)."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def send(i):
+        nonlocal errors
+        start = time.perf_counter()
+        status = post(phones[i % len(phones)], bodies[i])
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(len(bodies))))
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+def print_report(label, elapsed, latencies, errors):
+    count = len(latencies)
+    print(f"--- {label}: {count} messages in {elapsed:.2f}s = {count / elapsed:.0f} msg/s ({errors} errors) ---")
+    print(f"    latency p50 {percentile(latencies, 0.50) * 1000:.1f} ms | p95 {percentile(latencies, 0.95) * 1000:.1f} ms"
+          f" | p99 {percentile(latencies, 0.99) * 1000:.1f} ms | mean {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay synthetic Twilio SMS webhooks")
+    parser.add_argument('--messages', type=int, default=DEFAULT_MESSAGES)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--url', help="POST to a running server instead of the in-process app")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SMS_TRANSPORT', 'fake')
+    from db import DATABASE_PATH
+    phones = registered_phones(DATABASE_PATH)
+    if not phones:
+        raise SystemExit("No registered patients found. Run setup_database.py (or seed data) first.")
+    bodies = synthetic_bodies(args.messages, args.seed)
+
+    if args.url:
+        import requests
+        session = requests.Session()
+
+        def post(from_number, body):
+            return session.post(args.url, data={'From': from_number, 'Body': body}, timeout=30).status_code
+
+        print_report(f"POST {args.url}", *run_load(post, phones, bodies, args.concurrency))
+    else:
+        import app as health_app
+        client_local = threading.local()
+
+        def post(from_number, body):
+            if not hasattr(client_local, 'client'):
+                client_local.client = health_app.app.test_client()
+            return client_local.client.post('/sms', data={'From': from_number, 'Body': body}).status_code
+
+        elapsed, latencies, errors = run_load(post, phones, bodies, args.concurrency)
+        print_report("webhook replies", elapsed, latencies, errors)
+        flush_start = time.perf_counter()
+        health_app.reading_writer.flush()
+        total = elapsed + time.perf_counter() - flush_start
+        print(f"--- including batched commits: {len(bodies) / total:.0f} msg/s, {health_app.reading_writer.written} readings written ---")
@@ -0,0 +1,241 @@
+"""
+Durable outbound SMS queue.
+
+Routes no longer call Twilio directly: they `enqueue()` a message into the
+`sms_outbox` table and return straight away. A small pool of worker threads
+claims pending rows, sends them through a pluggable transport (Twilio in
+production, `FakeTransport` for tests / local runs), retries failures with
+exponential backoff and respects the per-number send rate Twilio allows.
+Repeated alerts with the same dedupe key inside DEDUPE_WINDOW_MINUTES are
+dropped instead of paging the health worker again (enforced by a UNIQUE index
+on dedupe_key, so concurrent enqueues cannot both get through).
+
+A claimed row holds a lease of SENDING_LEASE_SECONDS. Only rows whose lease
+has expired (their worker crashed mid-send) go back to the queue, so several
+app processes can share one outbox without re-sending each other's messages.
+"""
+import threading
+import time
+
+import metrics
+from db import get_pooled_connection
+
+WORKER_COUNT = 2
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 5          # 5s, 10s, 20s, 40s ...
+POLL_INTERVAL_SECONDS = 2.0
+SENDS_PER_SECOND = 1.0          # Twilio long-code throughput per sending number
+DEDUPE_WINDOW_MINUTES = 30
+SENDING_LEASE_SECONDS = 300     # far longer than any Twilio call; afterwards a 'sending' row counts as abandoned
+
+
+# --- Transports ---
+class TwilioTransport:
+    def __init__(self, client_factory, from_number):
+        # A factory rather than a client so the Twilio SDK is only loaded when something is sent
+        self.client_factory = client_factory
+        self.from_number = from_number
+
+    def send(self, to_number, body):
+        message = self.client_factory().messages.create(to=to_number, from_=self.from_number, body=body)
+        return getattr(message, 'sid', None)
+
+
+class FakeTransport:
+    """Records messages instead of sending them. `fail_times` makes the first N sends raise."""
+
+    def __init__(self, fail_times=0, latency=0.0):
+        self.sent = []
+        self.fail_times = fail_times
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def send(self, to_number, body):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError("Fake transport failure")
+            self.sent.append({'to': to_number, 'body': body})
+            return f"FAKE{len(self.sent)}"
+
+
+class RateLimiter:
+    """Token bucket shared by all workers so the pool as a whole stays under the send rate."""
+
+    def __init__(self, rate_per_second, burst=1):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# --- Queue + workers ---
+class SmsOutbox:
+    def __init__(self, transport, workers=WORKER_COUNT, sends_per_second=SENDS_PER_SECOND):
+        self.transport = transport
+        self.workers = workers
+        self.rate_limiter = RateLimiter(sends_per_second)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_recovery = 0.0
+
+    def enqueue(self, to_number, body, dedupe_key=None, conn=None):
+        """
+        Stores a message for delivery. Returns the outbox id, or None if an identical
+        alert (same dedupe_key) was already queued within the dedupe window.
+
+        With `conn` the message joins the caller's transaction and the caller commits.
+        Otherwise it is committed on a separate pooled connection, so a route's own
+        uncommitted writes are never committed as a side effect.
+        """
+        own_connection = conn is None
+        if own_connection:
+            conn = get_pooled_connection()
+        try:
+            if dedupe_key:
+                # Release the key once its window has passed; the UNIQUE index then admits exactly one new row
+                conn.execute(
+                    "UPDATE sms_outbox SET dedupe_key = NULL WHERE dedupe_key = ? AND created_at < datetime('now', ?)",
+                    (dedupe_key, f"-{DEDUPE_WINDOW_MINUTES} minutes")
+                )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO sms_outbox (to_number, body, dedupe_key) VALUES (?, ?, ?)",
+                (to_number, body, dedupe_key)
+            )
+            if own_connection:
+                conn.commit()
+        finally:
+            if own_connection:
+                conn.close()
+        if cursor.rowcount == 0:
+            print(f"Skipping duplicate SMS ({dedupe_key}) to {to_number}")
+            return None
+        self._wake.set()
+        return cursor.lastrowid
+
+    def start(self):
+        if self._threads:
+            return
+        self._recover_stale()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"sms-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def process_pending(self):
+        """Sends every message that is due right now on the calling thread. Returns how many were attempted."""
+        attempted = 0
+        while True:
+            job = self._claim_next()
+            if job is None:
+                return attempted
+            self._deliver(job)
+            attempted += 1
+
+    def _recover_stale(self):
+        """Puts rows whose sending lease expired (their process crashed mid-send) back in the queue."""
+        self._last_recovery = time.monotonic()
+        conn = get_pooled_connection()
+        try:
+            cursor = conn.execute(
+                "UPDATE sms_outbox SET status = 'pending', claimed_at = NULL WHERE status = 'sending' AND (claimed_at IS NULL OR claimed_at < datetime('now', ?))",
+                (f"-{SENDING_LEASE_SECONDS} seconds",)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        if cursor.rowcount:
+            print(f"Re-queued {cursor.rowcount} SMS left in 'sending' for over {SENDING_LEASE_SECONDS}s")
+        return cursor.rowcount
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - self._last_recovery > SENDING_LEASE_SECONDS:
+                    self._recover_stale()
+                job = self._claim_next()
+            except Exception as e:
+                print(f"SMS outbox worker error: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(POLL_INTERVAL_SECONDS)
+                self._wake.clear()
+                continue
+            self._deliver(job)
+
+    def _claim_next(self):
+        conn = get_pooled_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            job = conn.execute(
+                "SELECT * FROM sms_outbox WHERE status = 'pending' AND next_attempt_at <= datetime('now') ORDER BY next_attempt_at, id LIMIT 1"
+            ).fetchone()
+            if job is not None:
+                conn.execute("UPDATE sms_outbox SET status = 'sending', claimed_at = datetime('now'), attempts = attempts + 1 WHERE id = ?", (job['id'],))
+            conn.commit()
+            return dict(job) if job is not None else None
+        finally:
+            conn.close()
+
+    def _deliver(self, job):
+        self.rate_limiter.acquire()
+        transport = type(self.transport).__name__
+        start = time.perf_counter()
+        try:
+            provider_id = self.transport.send(job['to_number'], job['body'])
+        except Exception as e:
+            metrics.registry.observe('sms_send_duration_seconds', time.perf_counter() - start, transport=transport, outcome='error')
+            self._mark_failed(job, e)
+            return
+        metrics.registry.observe('sms_send_duration_seconds', time.perf_counter() - start, transport=transport, outcome='sent')
+        conn = get_pooled_connection()
+        try:
+            conn.execute(
+                "UPDATE sms_outbox SET status = 'sent', sent_at = datetime('now'), provider_id = ?, last_error = NULL WHERE id = ?",
+                (provider_id, job['id'])
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _mark_failed(self, job, error):
+        attempts = job['attempts'] + 1
+        conn = get_pooled_connection()
+        try:
+            if attempts >= MAX_ATTEMPTS:
+                print(f"Giving up on SMS {job['id']} to {job['to_number']} after {attempts} attempts: {error}")
+                conn.execute("UPDATE sms_outbox SET status = 'failed', last_error = ? WHERE id = ?", (str(error), job['id']))
+            else:
+                delay = RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+                print(f"Error sending SMS {job['id']} to {job['to_number']} (attempt {attempts}), retrying in {delay}s: {error}")
+                conn.execute(
+                    "UPDATE sms_outbox SET status = 'pending', last_error = ?, next_attempt_at = datetime('now', ?) WHERE id = ?",
+                    (str(error), f"+{delay} seconds", job['id'])
+                )
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,60 @@
+"""
+Local stand-in for the OpenRouter chat completions API, for tests and benchmarks.
+
+    python stub_llm_server.py --port 8099 --delay 0.5
+    OPENROUTER_URL=http://127.0.0.1:8099/api/v1/chat/completions python app.py
+
+Every POST gets back a fixed triage JSON in the OpenAI response shape, after an
+optional artificial delay to mimic a slow upstream.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REPORT = {
+    "intensity": "Moderate",
+    "recommendation": ["Rest and drink plenty of fluids", "Visit the PHC if symptoms last more than 3 days"],
+    "home_remedies": ["Drink warm water (ਕੋਸਾ ਪਾਣੀ ਪੀਓ)", "Take light, home-cooked food (ਹਲਕਾ ਘਰ ਦਾ ਖਾਣਾ ਖਾਓ)"],
+    "emergency": "If symptoms do not improve or worsen, a physical hospital visit is required.",
+    "doctor_note": "Stub LLM response for local testing.",
+}
+
+
+def make_handler(delay=0.0):
+    class StubLLMHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+            self.server.requests_served = getattr(self.server, 'requests_served', 0) + 1
+            if delay:
+                time.sleep(delay)
+            body = json.dumps({"choices": [{"message": {"role": "assistant", "content": json.dumps(STUB_REPORT, ensure_ascii=False)}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubLLMHandler
+
+
+def start_stub_server(port=0, delay=0.0):
+    """Starts the stub in a daemon thread. Returns (server, chat_completions_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v1/chat/completions"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stub of the OpenRouter chat completions API")
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.delay))
+    print(f"--- Stub LLM listening on http://127.0.0.1:{args.port}/api/v1/chat/completions ---")
+    server.serve_forever()
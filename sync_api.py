@@ -0,0 +1,171 @@
+"""
+Incremental (since-cursor) sync for the JSON API at /api/v1/<resource>.
+
+Clients keep one cursor per resource and ask only for what changed after it:
+
+    GET /api/v1/readings?since=0&limit=500&fields=patient_id,reading_type,value1,value2
+    -> {"items": [...], "next_cursor": "500", "has_more": true}
+
+They repeat with since=next_cursor until has_more is false, then store the
+cursor for the next sync. Cursors are opaque strings.
+
+- readings are append-only, so their cursor is the row id.
+- patients, triage reports, prescriptions and inventory rows also change in
+  place: AI results, confirmations, is_active, stock status. Each of these
+  tables gets a `sync_seq` column. Triggers stamp it from a per-table counter
+  in `sync_state` on every INSERT and UPDATE, so an edited row moves to the
+  end of the feed.
+
+Under SQLite's single writer, sequence numbers commit in order, so a cursor
+never skips a row. Deletions (e.g. readings removed by compaction) are not
+sent.
+
+Responses are gzip- or brotli-compressed when the client accepts it. Brotli
+is used only if the `brotli` package is installed.
+"""
+import gzip
+import json
+
+SYNC_TABLES = ('patients', 'triage_reports', 'prescriptions', 'pharmacy_inventory')
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MIN_COMPRESS_BYTES = 1024
+
+# resource -> table, cursor column, exposed fields, column linking a row to a patient (None: not patient data)
+RESOURCES = {
+    'patients': {
+        'table': 'patients', 'cursor': 'sync_seq', 'patient_column': 'id',
+        'fields': ('id', 'name', 'phone_number', 'email', 'age', 'gender', 'village', 'asha_worker_phone'),
+    },
+    'readings': {
+        'table': 'readings', 'cursor': 'id', 'patient_column': 'patient_id',
+        'fields': ('id', 'patient_id', 'reading_type', 'value1', 'value2', 'timestamp'),
+    },
+    'reports': {
+        'table': 'triage_reports', 'cursor': 'sync_seq', 'patient_column': 'patient_id',
+        'fields': ('id', 'patient_id', 'chief_complaint', 'notes', 'ai_prediction', 'ai_status', 'predicted_disease',
+                   'confirmed_disease', 'disease_category', 'timestamp'),
+    },
+    'prescriptions': {
+        'table': 'prescriptions', 'cursor': 'sync_seq', 'patient_column': 'patient_id',
+        'fields': ('id', 'patient_id', 'medication_name', 'dosage', 'notes', 'is_active', 'dispensing_pharmacy_id', 'timestamp'),
+    },
+    'inventory': {
+        'table': 'pharmacy_inventory', 'cursor': 'sync_seq', 'patient_column': None,
+        'fields': ('id', 'pharmacy_id', 'medication_name', 'stock_status', 'last_updated'),
+    },
+}
+
+# Session flag -> resources it may read in full. A logged-in patient (session['user_id']) gets only their own rows.
+ROLE_RESOURCES = {
+    'admin_logged_in': set(RESOURCES),
+    'health_dept_logged_in': set(RESOURCES),
+    'pharmacy_logged_in': {'prescriptions', 'inventory'},
+}
+
+
+class SyncError(ValueError):
+    """Bad request parameters; the message is safe to show to the client."""
+
+
+def _sync_trigger_body(table):
+    return f"""
+        UPDATE sync_state SET value = value + 1 WHERE name = '{table}';
+        UPDATE {table} SET sync_seq = (SELECT value FROM sync_state WHERE name = '{table}') WHERE id = NEW.id;
+    """
+
+
+SCHEMA_STATEMENTS = ["CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)"]
+for _table in SYNC_TABLES:
+    SCHEMA_STATEMENTS += [
+        f"ALTER TABLE {_table} ADD COLUMN sync_seq INTEGER",
+        f"UPDATE {_table} SET sync_seq = id",
+        f"INSERT OR IGNORE INTO sync_state (name, value) SELECT '{_table}', IFNULL(MAX(id), 0) FROM {_table}",
+        f"CREATE INDEX IF NOT EXISTS idx_{_table}_sync_seq ON {_table}(sync_seq)",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{_table}_sync_insert AFTER INSERT ON {_table} BEGIN {_sync_trigger_body(_table)} END",
+        # The nested UPDATE above changes sync_seq, so it does not re-stamp the row
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{_table}_sync_update AFTER UPDATE ON {_table}
+            WHEN NEW.sync_seq IS OLD.sync_seq BEGIN {_sync_trigger_body(_table)} END''',
+    ]
+
+
+def stamp_unsynced_rows(conn):
+    """Gives rows written with the sync triggers off (bulk loads) a sequence number. The caller commits."""
+    for table in SYNC_TABLES:
+        first = conn.execute(f"SELECT MIN(id) FROM {table} WHERE sync_seq IS NULL").fetchone()[0]
+        if first is None:
+            continue
+        current = conn.execute("SELECT value FROM sync_state WHERE name = ?", (table,)).fetchone()[0]
+        conn.execute(f"UPDATE {table} SET sync_seq = id - ? + ? WHERE sync_seq IS NULL", (first, current + 1))
+        conn.execute(f"UPDATE sync_state SET value = (SELECT MAX(sync_seq) FROM {table}) WHERE name = ?", (table,))
+
+
+# --- Queries ---
+def allowed_scope(session, resource):
+    """(allowed, patient_id): patient_id limits a patient's session to their own rows."""
+    if any(session.get(role) and resource in resources for role, resources in ROLE_RESOURCES.items()):
+        return True, None
+    if session.get('user_id') is not None:
+        if RESOURCES[resource]['patient_column'] is None:
+            return True, None
+        return True, session['user_id']
+    return False, None
+
+
+def parse_fields(resource, fields_param):
+    fields = RESOURCES[resource]['fields']
+    if not fields_param:
+        return list(fields)
+    requested = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in fields]
+    if unknown:
+        raise SyncError(f"Unknown field(s) for {resource}: {', '.join(unknown)}. Available: {', '.join(fields)}")
+    # id is always sent so clients can merge the rows
+    return ['id'] + [field for field in requested if field != 'id']
+
+
+def get_changes(conn, resource, since=None, limit=DEFAULT_LIMIT, fields=None, patient_id=None):
+    """One page of rows changed after `since`. Returns {'items', 'next_cursor', 'has_more'}."""
+    spec = RESOURCES[resource]
+    try:
+        since_value = int(since or 0)
+        limit = int(limit or DEFAULT_LIMIT)
+    except ValueError:
+        raise SyncError("'since' and 'limit' must be integers") from None
+    limit = max(1, min(limit, MAX_LIMIT))
+    fields = fields or list(spec['fields'])
+
+    where, params = [f"{spec['cursor']} > ?"], [since_value]
+    if patient_id is not None:
+        where.append(f"{spec['patient_column']} = ?")
+        params.append(patient_id)
+    rows = conn.execute(
+        f"SELECT {spec['cursor']} AS sync_cursor, {', '.join(fields)} FROM {spec['table']} "
+        f"WHERE {' AND '.join(where)} ORDER BY {spec['cursor']} LIMIT ?",
+        params + [limit + 1]
+    ).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'items': [{field: row[field] for field in fields} for row in rows],
+        'next_cursor': str(rows[-1]['sync_cursor'] if rows else since_value),
+        'has_more': has_more,
+    }
+
+
+# --- Compression ---
+def compress_json(payload, accept_encodings):
+    """(body bytes, Content-Encoding or None). `accept_encodings` is werkzeug's request.accept_encodings."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    if accept_encodings['br']:
+        try:
+            import brotli  # optional dependency
+        except ImportError:
+            brotli = None
+        if brotli is not None:
+            return brotli.compress(body, quality=5), 'br'
+    if accept_encodings['gzip']:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
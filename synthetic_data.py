@@ -0,0 +1,275 @@
+"""
+Synthetic data generator for benchmarks and scale testing.
+
+`seed_synthetic_data()` appends a realistic-looking district to a (migrated)
+database:
+
+- villages with coordinates around Nabha, of very different sizes;
+- ASHA workers per village, each patient assigned to one in their village;
+- patients with an age-dependent chance of hypertension / diabetes;
+- multi-year reading histories (BP, SUGAR, PULSE) that follow each patient's
+  profile, so the share of high-risk readings looks like a real caseload;
+- triage reports whose complaints are symptom texts from
+  final_remedy_dataset.csv, some with a doctor-confirmed diagnosis;
+- pharmacies near the villages with partial inventories, and prescriptions for
+  the chronic patients.
+
+Everything comes from one random seed, so the same arguments give the same
+rows (timestamps are UTC, like SQLite's CURRENT_TIMESTAMP, and relative to the day of the run). Writes are executemany in large transactions. The per-row triggers on
+patients / readings / triage_reports are dropped during the load, and the
+rollups, reading buckets, disease categories and sync sequence numbers they
+maintain are rebuilt at the end in a few set-based statements. That keeps multi-million-row loads to
+minutes. The alert engine then runs over the new history (without sending
+SMS), so the alert-based dashboards see a realistic number of alerts;
+--skip-alerts leaves them out for faster loads, at the cost of unrepresentative
+high-risk KPIs and hotspots. Every synthetic patient can log in with SYNTHETIC_PASSWORD.
+
+    python synthetic_data.py --db scale.db --patients 200000 --readings-per-patient 120 --years 3
+    python synthetic_data.py --patients 1000        # append to health.db
+"""
+import argparse
+import csv
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.security import generate_password_hash
+
+import alert_engine
+import disease_trends
+import kpi_rollups
+import readings_timeseries
+import sync_api
+
+SYNTHETIC_PASSWORD = 'password'
+PHONE_PREFIX = '+9170'
+ASHA_PHONE_PREFIX = '+9179'
+DATASET_PATH = 'final_remedy_dataset.csv'
+CENTER = (30.3747, 76.1527)              # Nabha
+SPREAD_DEGREES = 0.6
+CHUNK_PATIENTS = 5000                    # patients (with all their rows) per transaction
+ALERT_BATCH_SIZE = 5000                  # readings per alert engine batch during the backfill
+BULK_LOAD_TABLES = ('patients', 'readings', 'triage_reports')
+
+VILLAGE_PREFIXES = ['Bhad', 'Roh', 'Kak', 'Dhin', 'Ghan', 'Thu', 'Sang', 'Mal', 'Ban', 'Chhaj', 'Agau', 'Kal', 'Dul', 'Lub', 'Sek', 'Bir']
+VILLAGE_SUFFIXES = ['son', 'ti', 'rala', 'gi', 'urki', 'hi', 'pur', 'wal', 'kheri', 'garh', 'majra', 'ke']
+FIRST_NAMES = ['Gurpreet', 'Harjit', 'Manpreet', 'Simran', 'Baljit', 'Kuldeep', 'Amandeep', 'Jaspreet', 'Rajesh',
+               'Sunita', 'Paramjit', 'Navdeep', 'Harpreet', 'Kamaljit', 'Sukhwinder', 'Ravinder', 'Anita', 'Mohan']
+LAST_NAMES = ['Singh', 'Kaur', 'Sharma', 'Gill', 'Sidhu', 'Brar', 'Dhillon', 'Sandhu', 'Grewal', 'Verma', 'Bains']
+MEDICATIONS = ['Paracetamol 500mg', 'Metformin 500mg', 'Amlodipine 5mg', 'Telmisartan 40mg', 'Atenolol 50mg',
+               'Glimepiride 1mg', 'Amoxicillin 500mg', 'Azithromycin 500mg', 'Cetirizine 10mg', 'ORS Sachet',
+               'Omeprazole 20mg', 'Ibuprofen 400mg', 'Iron Folic Acid', 'Salbutamol Inhaler', 'Insulin Glargine',
+               'Atorvastatin 10mg', 'Losartan 50mg', 'Vitamin D3', 'Calcium 500mg', 'Albendazole 400mg']
+STOCK_WEIGHTS = {'In Stock': 0.7, 'Low Stock': 0.2, 'Out of Stock': 0.1}
+HYPERTENSION_MEDICATIONS = ['Amlodipine 5mg', 'Telmisartan 40mg', 'Losartan 50mg']
+DIABETES_MEDICATIONS = ['Metformin 500mg', 'Glimepiride 1mg']
+
+
+def load_symptom_texts(path=DATASET_PATH):
+    """[(symptoms, disease)] from the remedy dataset (columns read by position)."""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [(row[0].strip(), row[1].strip()) for row in reader if len(row) >= 2 and row[0].strip()]
+
+
+# --- Population ---
+def _villages(rng, count):
+    names, villages = set(), []
+    while len(villages) < count:
+        name = rng.choice(VILLAGE_PREFIXES) + rng.choice(VILLAGE_SUFFIXES)
+        if name in names:
+            name = f"{name} {len(villages)}"
+        names.add(name)
+        angle, distance = rng.uniform(0, 2 * math.pi), SPREAD_DEGREES * math.sqrt(rng.random())
+        villages.append((name, round(CENTER[0] + distance * math.sin(angle), 5), round(CENTER[1] + distance * math.cos(angle), 5)))
+    return villages
+
+
+def _profile(rng, age):
+    """(hypertensive, diabetic) with prevalence rising with age."""
+    return rng.random() < min(0.6, 0.05 + age * 0.006), rng.random() < min(0.35, 0.02 + age * 0.003)
+
+
+def _readings(rng, patient_id, hypertensive, diabetic, count, start, span_seconds):
+    """A patient's history, ordered by time (so index inserts stay near-sequential)."""
+    systolic_base = rng.gauss(152, 10) if hypertensive else rng.gauss(118, 9)
+    sugar_base = rng.gauss(195, 35) if diabetic else rng.gauss(102, 12)
+    offsets = sorted(rng.randrange(span_seconds) for _ in range(count))
+    for offset in offsets:
+        timestamp = (start + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+        roll = rng.random()
+        if roll < 0.55:
+            systolic = int(rng.gauss(systolic_base, 9))
+            yield patient_id, 'BP', systolic, int(systolic * 0.63 + rng.gauss(0, 5)), timestamp
+        elif roll < 0.9:
+            yield patient_id, 'SUGAR', max(50, int(rng.gauss(sugar_base, 18))), None, timestamp
+        else:
+            yield patient_id, 'PULSE', int(rng.gauss(76, 9)), None, timestamp
+
+
+# --- Bulk-load trigger handling ---
+def _drop_row_triggers(conn):
+    """Drops the per-row triggers on BULK_LOAD_TABLES; returns their SQL so they can be recreated."""
+    triggers = conn.execute(f"""SELECT name, sql FROM sqlite_master WHERE type = 'trigger'
+        AND tbl_name IN ({', '.join('?' for _ in BULK_LOAD_TABLES)})""", BULK_LOAD_TABLES).fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+    return [sql for _, sql in triggers]
+
+
+def _rebuild_derived(conn, first_reading_id, first_report_id, alerts=True, verbose=False):
+    """What the dropped triggers (and the alert engine) would have done, as set-based statements."""
+    conn.execute(f"UPDATE triage_reports SET disease_category = {disease_trends.category_sql('triage_reports')} WHERE id >= ? AND disease_category IS NULL", (first_report_id,))
+    readings_timeseries.add_to_buckets(conn, first_reading_id - 1)
+    sync_api.stamp_unsynced_rows(conn)
+    # The version triggers were dropped with the others; invalidate every cached page / snapshot
+    conn.execute("UPDATE cache_versions SET version = version + 1")
+    if not alerts:
+        # The alert engine skips the synthetic history (alert-based dashboards will look too quiet)
+        conn.execute("UPDATE alert_engine_state SET value = MAX(value, (SELECT IFNULL(MAX(id), 0) FROM readings)) WHERE name = 'last_reading_id'")
+    conn.commit()
+    if alerts:
+        # History is not news: alerts are recorded without paging anyone
+        engine, raised = alert_engine.AlertEngine(), 0
+        while True:
+            processed, batch_raised = engine.process_pending(ALERT_BATCH_SIZE, send=False, conn=conn)
+            if not processed:
+                break
+            raised += batch_raised
+        if verbose:
+            print(f"... Alert engine raised {raised} alerts over the synthetic history")
+    kpi_rollups.rebuild_rollups(conn)
+
+
+# --- Generator ---
+def seed_synthetic_data(conn, patients=1000, readings_per_patient=20, reports_per_patient=2, seed=42, verbose=False,
+                        villages=50, ashas_per_village=3, pharmacies=20, years=2, confirmed_share=0.2, alerts=True):
+    """
+    Appends a synthetic district. readings_per_patient / reports_per_patient are averages (individual counts vary).
+    alerts=False skips the alert engine backfill. Returns row counts per table.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    start, span_seconds = now - timedelta(days=365 * years), 365 * years * 86400
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)  # hashing is slow, so every patient shares one
+    symptom_texts = load_symptom_texts()
+    counts = dict.fromkeys(('villages', 'pharmacies', 'pharmacy_inventory', 'patients', 'readings', 'triage_reports', 'prescriptions'), 0)
+
+    # Villages, sized roughly Zipf-like, with their ASHA workers
+    village_rows = _villages(rng, villages)
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(villages)]
+    first_asha = conn.execute("SELECT COUNT(*) FROM asha_stats").fetchone()[0]
+    ashas = {name: [f"{ASHA_PHONE_PREFIX}{first_asha + index * ashas_per_village + n:07d}" for n in range(ashas_per_village)]
+             for index, (name, _, _) in enumerate(village_rows)}
+
+    first_patient = (conn.execute("SELECT MAX(id) FROM patients").fetchone()[0] or 0) + 1
+    first_reading = (conn.execute("SELECT MAX(id) FROM readings").fetchone()[0] or 0) + 1
+    first_report = (conn.execute("SELECT MAX(id) FROM triage_reports").fetchone()[0] or 0) + 1
+    first_pharmacy = (conn.execute("SELECT MAX(id) FROM pharmacies").fetchone()[0] or 0) + 1
+    load_start = time.perf_counter()
+    conn.commit()
+    triggers = _drop_row_triggers(conn)
+    conn.commit()
+    try:
+        conn.executemany("INSERT OR IGNORE INTO villages (name, latitude, longitude) VALUES (?, ?, ?)", village_rows)
+        counts['villages'] = len(village_rows)
+
+        pharmacy_rows, inventory_rows = [], []
+        for n in range(pharmacies):
+            village, latitude, longitude = village_rows[n % villages]
+            pharmacy_id = first_pharmacy + n
+            pharmacy_rows.append((pharmacy_id, f"{village} Pharmacy {pharmacy_id}", f"{village} Village",
+                                  latitude + rng.uniform(-0.01, 0.01), longitude + rng.uniform(-0.01, 0.01)))
+            for medication in rng.sample(MEDICATIONS, rng.randint(len(MEDICATIONS) // 2, len(MEDICATIONS))):
+                inventory_rows.append((pharmacy_id, medication, rng.choices(list(STOCK_WEIGHTS), list(STOCK_WEIGHTS.values()))[0]))
+        conn.executemany("INSERT INTO pharmacies (id, name, location, latitude, longitude) VALUES (?, ?, ?, ?, ?)", pharmacy_rows)
+        conn.executemany("INSERT INTO pharmacy_inventory (pharmacy_id, medication_name, stock_status) VALUES (?, ?, ?)", inventory_rows)
+        conn.commit()
+        counts['pharmacies'], counts['pharmacy_inventory'] = len(pharmacy_rows), len(inventory_rows)
+
+        for chunk_start in range(0, patients, CHUNK_PATIENTS):
+            patient_rows, readings, reports, prescriptions = [], [], [], []
+            for offset in range(chunk_start, min(patients, chunk_start + CHUNK_PATIENTS)):
+                patient_id = first_patient + offset
+                village = rng.choices(village_rows, weights)[0][0]
+                age = int(rng.triangular(18, 90, 42))
+                hypertensive, diabetic = _profile(rng, age)
+                patient_rows.append((patient_id, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"{PHONE_PREFIX}{patient_id:08d}",
+                                     password_hash, age, rng.choice(['Male', 'Female']), village, rng.choice(ashas[village])))
+                # Chronic patients report far more often
+                mean_readings = readings_per_patient * (1.6 if hypertensive or diabetic else 0.5)
+                readings.extend(_readings(rng, patient_id, hypertensive, diabetic, round(rng.expovariate(1 / mean_readings)) if mean_readings else 0, start, span_seconds))
+                for _ in range(round(rng.expovariate(1 / reports_per_patient)) if reports_per_patient else 0):
+                    symptoms, disease = rng.choice(symptom_texts)
+                    complaint = ', '.join(symptoms.split(', ')[:rng.randint(2, 4)])
+                    confirmed = disease if rng.random() < confirmed_share else None
+                    reports.append((patient_id, complaint, '', 'Synthetic report.', f"<b>Predicted Issue:</b> {disease}", 'done', disease, confirmed,
+                                    (start + timedelta(seconds=rng.randrange(span_seconds))).strftime('%Y-%m-%d %H:%M:%S')))
+                if hypertensive:
+                    prescriptions.append((patient_id, rng.choice(HYPERTENSION_MEDICATIONS), '1 tablet daily', 'Synthetic'))
+                if diabetic:
+                    prescriptions.append((patient_id, rng.choice(DIABETES_MEDICATIONS), '1 tablet twice daily', 'Synthetic'))
+
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO patients (id, name, phone_number, password_hash, age, gender, village, asha_worker_phone) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", patient_rows)
+            conn.executemany("INSERT INTO readings (patient_id, reading_type, value1, value2, timestamp) VALUES (?, ?, ?, ?, ?)", readings)
+            conn.executemany("INSERT INTO triage_reports (patient_id, chief_complaint, symptoms, notes, ai_prediction, ai_status, predicted_disease, confirmed_disease, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", reports)
+            conn.executemany("INSERT INTO prescriptions (patient_id, medication_name, dosage, notes) VALUES (?, ?, ?, ?)", prescriptions)
+            conn.commit()
+            counts['patients'] += len(patient_rows)
+            counts['readings'] += len(readings)
+            counts['triage_reports'] += len(reports)
+            counts['prescriptions'] += len(prescriptions)
+            if verbose:
+                elapsed = time.perf_counter() - load_start
+                print(f"... {counts['patients']}/{patients} patients, {counts['readings']} readings ({counts['readings'] / elapsed:,.0f} readings/s)")
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        for sql in triggers:
+            conn.execute(sql)
+        conn.commit()
+
+    if verbose:
+        print("... Rebuilding rollups, reading buckets and disease categories")
+    _rebuild_derived(conn, first_reading, first_report, alerts, verbose)
+    if verbose:
+        print(f"... Seeded {', '.join(f'{count} {table}' for table, count in counts.items())} in {time.perf_counter() - load_start:.1f}s")
+    return counts
+
+
+if __name__ == '__main__':
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic district in health.db (or another database)")
+    parser.add_argument('--db', default=None, help="database file (default: HEALTH_DB_PATH / health.db)")
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--readings-per-patient', type=int, default=20, help="average; chronic patients report more often")
+    parser.add_argument('--reports-per-patient', type=float, default=2)
+    parser.add_argument('--villages', type=int, default=50)
+    parser.add_argument('--ashas-per-village', type=int, default=3)
+    parser.add_argument('--pharmacies', type=int, default=20)
+    parser.add_argument('--years', type=int, default=2, help="length of the reading history")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-alerts', action='store_true', help="do not run the alert engine over the history (faster; alert dashboards look too quiet)")
+    args = parser.parse_args()
+
+    if args.db is None:
+        from db import DATABASE_PATH
+        args.db = DATABASE_PATH
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    # Bulk-load settings for this connection only; the app's connections keep their own pragmas
+    for pragma in ("PRAGMA journal_mode = WAL", "PRAGMA synchronous = OFF", "PRAGMA cache_size = -256000", "PRAGMA temp_store = MEMORY"):
+        conn.execute(pragma)
+    apply_migrations(conn)
+    print(f"--- Generating synthetic data in '{args.db}' ---")
+    seed_synthetic_data(conn, args.patients, args.readings_per_patient, args.reports_per_patient, args.seed, verbose=True,
+                        villages=args.villages, ashas_per_village=args.ashas_per_village, pharmacies=args.pharmacies, years=args.years,
+                        alerts=not args.skip_alerts)
+    conn.execute("ANALYZE")
+    conn.close()
+    print("--- Synthetic data ready ---")
@@ -0,0 +1,15 @@
+"""
+Shared pytest setup. The app modules read HEALTH_DB_PATH when they are first
+imported, so every test session gets its own throwaway database here.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # data files (CSV, thresholds) are opened relative to the repo root
+
+_db_dir = tempfile.mkdtemp(prefix='health-test-')
+os.environ['HEALTH_DB_PATH'] = os.path.join(_db_dir, 'health.db')
+os.environ['SMS_TRANSPORT'] = 'fake'
@@ -0,0 +1,69 @@
+"""rescore_triage_reports(): changed predictions get a regenerated report, everything else is left alone."""
+import pytest
+
+import batch_predict
+import triage_llm
+from db import get_db_connection
+from migrations import apply_migrations
+from remedy_index import build_remedy_index
+from stub_llm_server import start_stub_server
+
+
+class _FixedModel:
+    def predict(self, vectors):
+        return ['Ascites'] * len(vectors)
+
+
+class _Vectorizer:
+    def transform(self, texts):
+        return texts
+
+
+class _Registry:
+    def get(self):
+        return _FixedModel(), _Vectorizer(), build_remedy_index()
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    server, url = start_stub_server()
+    monkeypatch.setattr(triage_llm, 'OPENROUTER_URL', url)
+    monkeypatch.setattr(batch_predict, 'registry', _Registry())
+    conn = get_db_connection()
+    apply_migrations(conn)
+    conn.execute("DELETE FROM llm_report_cache")
+    conn.commit()
+    yield conn
+    conn.close()
+    server.shutdown()
+
+
+def _report(conn, predicted_disease, ai_prediction, ai_status='done'):
+    report_id = conn.execute(
+        "INSERT INTO triage_reports (chief_complaint, notes, ai_prediction, ai_status, predicted_disease) VALUES ('swollen belly', '', ?, ?, ?)",
+        (ai_prediction, ai_status, predicted_disease)
+    ).lastrowid
+    conn.commit()
+    return report_id
+
+
+def _row(conn, report_id):
+    return conn.execute("SELECT predicted_disease, ai_prediction, ai_status, sync_seq FROM triage_reports WHERE id = ?", (report_id,)).fetchone()
+
+
+def test_rescore_regenerates_report_only_where_prediction_changed(conn):
+    unchanged = _report(conn, 'Ascites', "<b>Predicted Issue:</b> Ascites")
+    stale = _report(conn, 'Achalasia', "<b>Predicted Issue:</b> Achalasia")
+    failed = _report(conn, None, "Could not analyze symptoms.", 'failed')
+    pending = _report(conn, None, "AI analysis in progress...", 'pending')
+    before = {report_id: tuple(_row(conn, report_id)) for report_id in (unchanged, stale, failed, pending)}
+
+    assert batch_predict.rescore_triage_reports(workers=1) >= 2
+
+    assert tuple(_row(conn, unchanged)) == before[unchanged]  # not rewritten, so not re-sent by the sync feed
+    assert tuple(_row(conn, pending)) == before[pending]      # the triage worker will fill it in
+    for report_id in (stale, failed):
+        row = _row(conn, report_id)
+        assert (row['predicted_disease'], row['ai_status']) == ('Ascites', 'done')
+        assert 'Stub LLM response for local testing.' in row['ai_prediction']
+        assert 'Achalasia' not in row['ai_prediction']
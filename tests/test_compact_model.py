@@ -0,0 +1,47 @@
+"""Prediction parity of the compact (numpy-only) export with the scikit-learn pipeline."""
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from compact_model import check_parity, export_compact_model, load_compact_model
+from synthetic_data import load_symptom_texts
+
+VECTORIZER_CONFIGS = [
+    {'max_features': 1500, 'stop_words': 'english'},                     # train_model_remedies.py
+    {'sublinear_tf': True, 'ngram_range': (1, 2), 'min_df': 2},          # train_pipeline.py style
+    {'norm': 'l1', 'lowercase': False, 'ngram_range': (2, 3)},
+]
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    rows = load_symptom_texts()
+    # Repeated symptoms make sublinear_tf matter (counts above 1)
+    texts = [symptoms if i % 3 else f"{symptoms}, {symptoms.split(', ')[0]}" for i, (symptoms, _) in enumerate(rows)]
+    return texts, [disease for _, disease in rows]
+
+
+@pytest.mark.parametrize('params', VECTORIZER_CONFIGS)
+def test_compact_model_matches_sklearn(tmp_path, dataset, params):
+    texts, labels = dataset
+    vectorizer = TfidfVectorizer(**params)
+    X = vectorizer.fit_transform(texts)
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, labels)
+
+    export_compact_model(model, vectorizer, str(tmp_path))
+    compact_forest, compact_vectorizer = load_compact_model(str(tmp_path))
+
+    np.testing.assert_allclose(compact_vectorizer.transform(texts), X.toarray(), rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(compact_forest.predict_proba(compact_vectorizer.transform(texts)),
+                               model.predict_proba(X), rtol=1e-9, atol=1e-12)
+    assert check_parity(model, vectorizer, compact_forest, compact_vectorizer, texts) == 1.0
+
+
+@pytest.mark.parametrize('params', [{'binary': True}, {'use_idf': False}, {'analyzer': 'char'}])
+def test_export_rejects_unsupported_vectorizers(tmp_path, dataset, params):
+    texts, labels = dataset
+    vectorizer = TfidfVectorizer(**params)
+    model = RandomForestClassifier(n_estimators=2, random_state=0).fit(vectorizer.fit_transform(texts), labels)
+    with pytest.raises(ValueError):
+        export_compact_model(model, vectorizer, str(tmp_path))
@@ -0,0 +1,31 @@
+"""Nearest-neighbour results of the grid index against a brute-force scan."""
+import random
+import time
+
+from geo_index import GridIndex, haversine_km
+
+
+def _brute_force(points, latitude, longitude, k):
+    distances = sorted((haversine_km(latitude, longitude, lat, lon), item) for lat, lon, item in points)
+    return distances[:k]
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(1)
+    points = [(30.37 + rng.uniform(-0.6, 0.6), 76.15 + rng.uniform(-0.6, 0.6), n) for n in range(500)]
+    # A few far-away outliers make the occupied bounding box huge and sparse
+    points += [(21.07, 74.78, 'songir'), (8.5, 77.0, 'south'), (0.0, 0.0, 'null island')]
+    index = GridIndex(points)
+    for latitude, longitude in [(30.4, 76.2), (21.0, 74.8), (0.0, 0.0), (-45.0, -120.0), (31.5, 77.5)]:
+        for k in (1, 5):
+            expected = _brute_force(points, latitude, longitude, k)
+            actual = index.nearest(latitude, longitude, k)
+            assert [item for _, item in actual] == [item for _, item in expected]
+
+
+def test_outlying_query_is_fast():
+    index = GridIndex([(30.37 + n * 0.001, 76.15, n) for n in range(1000)])
+    start = time.perf_counter()
+    for _ in range(100):
+        assert index.nearest(0.0, 0.0, k=5)
+    assert (time.perf_counter() - start) / 100 < 0.01
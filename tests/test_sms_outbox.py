@@ -0,0 +1,142 @@
+"""Outbox delivery through FakeTransport: retries, giving up, dedupe and stale-lease recovery."""
+import threading
+
+import pytest
+from flask import Flask
+
+import sms_outbox
+from db import get_db_connection
+from migrations import apply_migrations
+from sms_outbox import FakeTransport, SmsOutbox
+
+
+@pytest.fixture
+def conn():
+    conn = get_db_connection()
+    apply_migrations(conn)
+    conn.execute("DELETE FROM sms_outbox")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _outbox(transport):
+    # No worker threads: tests drive delivery with process_pending()
+    return SmsOutbox(transport, sends_per_second=1000)
+
+
+def _row(conn, outbox_id):
+    return conn.execute("SELECT * FROM sms_outbox WHERE id = ?", (outbox_id,)).fetchone()
+
+
+def _make_due(conn):
+    conn.execute("UPDATE sms_outbox SET next_attempt_at = datetime('now', '-1 second')")
+    conn.commit()
+
+
+def test_delivers_through_fake_transport(conn):
+    transport = FakeTransport()
+    outbox = _outbox(transport)
+    outbox_id = outbox.enqueue('+911111111111', 'hello')
+
+    assert outbox.process_pending() == 1
+    assert transport.sent == [{'to': '+911111111111', 'body': 'hello'}]
+    row = _row(conn, outbox_id)
+    assert (row['status'], row['attempts'], row['provider_id']) == ('sent', 1, 'FAKE1')
+
+
+def test_failed_send_is_retried_with_backoff(conn):
+    transport = FakeTransport(fail_times=1)
+    outbox = _outbox(transport)
+    outbox_id = outbox.enqueue('+911111111111', 'retry me')
+
+    assert outbox.process_pending() == 1
+    row = _row(conn, outbox_id)
+    assert (row['status'], row['attempts'], row['last_error']) == ('pending', 1, 'Fake transport failure')
+    # Not due again until the backoff has passed
+    assert outbox.process_pending() == 0
+
+    _make_due(conn)
+    assert outbox.process_pending() == 1
+    assert _row(conn, outbox_id)['status'] == 'sent'
+    assert len(transport.sent) == 1
+
+
+def test_gives_up_after_max_attempts(conn):
+    outbox = _outbox(FakeTransport(fail_times=sms_outbox.MAX_ATTEMPTS))
+    outbox_id = outbox.enqueue('+911111111111', 'never delivered')
+    for _ in range(sms_outbox.MAX_ATTEMPTS):
+        _make_due(conn)
+        assert outbox.process_pending() == 1
+    row = _row(conn, outbox_id)
+    assert (row['status'], row['attempts']) == ('failed', sms_outbox.MAX_ATTEMPTS)
+    _make_due(conn)
+    assert outbox.process_pending() == 0
+
+
+def test_dedupe_key_suppresses_repeats_within_the_window(conn):
+    outbox = _outbox(FakeTransport())
+    first = outbox.enqueue('+911111111111', 'High BP', dedupe_key='alert:1:threshold')
+    assert first is not None
+    assert outbox.enqueue('+911111111111', 'High BP again', dedupe_key='alert:1:threshold') is None
+    assert outbox.enqueue('+911111111111', 'other rule', dedupe_key='alert:1:rising_sugar') is not None
+
+    conn.execute("UPDATE sms_outbox SET created_at = datetime('now', ?) WHERE id = ?",
+                 (f"-{sms_outbox.DEDUPE_WINDOW_MINUTES + 1} minutes", first))
+    conn.commit()
+    assert outbox.enqueue('+911111111111', 'High BP later', dedupe_key='alert:1:threshold') is not None
+
+
+def test_concurrent_enqueues_with_one_dedupe_key_store_one_message(conn):
+    outbox = _outbox(FakeTransport())
+    results, barrier = [], threading.Barrier(8)
+
+    def enqueue():
+        barrier.wait()
+        results.append(outbox.enqueue('+911111111111', 'High BP', dedupe_key='alert:2:threshold'))
+
+    threads = [threading.Thread(target=enqueue) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(result is not None for result in results) == 1
+    assert conn.execute("SELECT COUNT(*) FROM sms_outbox WHERE dedupe_key = 'alert:2:threshold'").fetchone()[0] == 1
+
+
+def test_recovery_only_requeues_expired_leases(conn):
+    outbox = _outbox(FakeTransport())
+    in_flight = outbox.enqueue('+911111111111', 'being sent by another process')
+    abandoned = outbox.enqueue('+912222222222', 'claimed by a crashed process')
+    conn.execute("UPDATE sms_outbox SET status = 'sending', claimed_at = datetime('now') WHERE id = ?", (in_flight,))
+    conn.execute("UPDATE sms_outbox SET status = 'sending', claimed_at = datetime('now', ?) WHERE id = ?",
+                 (f"-{sms_outbox.SENDING_LEASE_SECONDS + 60} seconds", abandoned))
+    conn.commit()
+
+    assert outbox._recover_stale() == 1
+    assert _row(conn, in_flight)['status'] == 'sending'
+    assert _row(conn, abandoned)['status'] == 'pending'
+
+
+def test_enqueue_in_a_request_never_commits_the_route_transaction(conn):
+    outbox = _outbox(FakeTransport())
+    with Flask(__name__).app_context():
+        request_conn = get_db_connection()
+        request_conn.execute("BEGIN")
+        outbox_id = outbox.enqueue('+911111111111', 'own connection')
+        assert request_conn.in_transaction  # the route's transaction is still open
+        request_conn.rollback()
+    assert _row(conn, outbox_id)['body'] == 'own connection'
+
+
+def test_enqueue_with_caller_connection_joins_its_transaction(conn):
+    outbox = _outbox(FakeTransport())
+    with Flask(__name__).app_context():
+        request_conn = get_db_connection()
+        request_conn.execute("UPDATE patients SET active_call_link = 'x' WHERE id = -1")
+        assert outbox.enqueue('+911111111111', 'rolled back', conn=request_conn) is not None
+        request_conn.rollback()
+        committed = outbox.enqueue('+911111111111', 'committed', conn=request_conn)
+        request_conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM sms_outbox WHERE body = 'rolled back'").fetchone()[0] == 0
+    assert _row(conn, committed)['body'] == 'committed'
@@ -0,0 +1,11 @@
+"""Non-ML routes must cold-start without the heavy ML / SDK packages (see profile_startup.py)."""
+from profile_startup import profile_imports
+
+# twilio.twiml (TwiML replies for /sms) is light and stays a top-level import
+HEAVY_MODULES = ('numpy', 'scipy', 'sklearn', 'pandas', 'requests', 'twilio.rest')
+
+
+def test_importing_app_skips_heavy_packages():
+    _, imports = profile_imports('app')
+    loaded = {name.strip() for name, _, _ in imports}
+    assert sorted(name for name in loaded if any(name == heavy or name.startswith(heavy + '.') for heavy in HEAVY_MODULES)) == []
@@ -0,0 +1,113 @@
+"""Since-cursor sync feed: paging, re-stamping edited rows, field whitelisting and session scope."""
+import time
+
+import pytest
+
+from db import get_db_connection
+from migrations import apply_migrations
+from sync_api import SyncError, allowed_scope, get_changes, parse_fields
+
+
+@pytest.fixture
+def conn():
+    conn = get_db_connection()
+    apply_migrations(conn)
+    yield conn
+    conn.close()
+
+
+def _patient(conn, village='Songir'):
+    patient_id = conn.execute(
+        "INSERT INTO patients (name, phone_number, password_hash, village) VALUES ('Sync Test', ?, 'x', ?)",
+        (f"+91{time.time_ns() % 10**10:010d}", village)
+    ).lastrowid
+    conn.commit()
+    return patient_id
+
+
+def _cursor(conn, table):
+    return str(conn.execute("SELECT value FROM sync_state WHERE name = ?", (table,)).fetchone()[0])
+
+
+def _drain(conn, resource, since, limit, **kwargs):
+    pages = []
+    while True:
+        page = get_changes(conn, resource, since, limit, **kwargs)
+        pages.append(page)
+        since = page['next_cursor']
+        if not page['has_more']:
+            return pages
+
+
+def test_pages_follow_the_cursor_without_gaps_or_repeats(conn):
+    start = _cursor(conn, 'prescriptions')
+    patient_id = _patient(conn)
+    ids = [conn.execute("INSERT INTO prescriptions (patient_id, medication_name) VALUES (?, ?)", (patient_id, f"Med {i}")).lastrowid
+           for i in range(5)]
+    conn.commit()
+
+    pages = _drain(conn, 'prescriptions', start, 2)
+    assert [len(page['items']) for page in pages] == [2, 2, 1]
+    assert [page['has_more'] for page in pages] == [True, True, False]
+    assert [item['id'] for page in pages for item in page['items']] == ids
+    # Nothing new: the cursor stays put
+    assert get_changes(conn, 'prescriptions', pages[-1]['next_cursor']) == {'items': [], 'next_cursor': pages[-1]['next_cursor'], 'has_more': False}
+
+
+def test_updated_row_moves_to_the_end_of_the_feed(conn):
+    patient_id = _patient(conn)
+    first, second = (conn.execute("INSERT INTO prescriptions (patient_id, medication_name) VALUES (?, ?)", (patient_id, name)).lastrowid
+                     for name in ('Amlodipine', 'Metformin'))
+    conn.commit()
+    synced_to = _cursor(conn, 'prescriptions')
+
+    conn.execute("UPDATE prescriptions SET is_active = 0 WHERE id = ?", (first,))
+    conn.commit()
+    page = get_changes(conn, 'prescriptions', synced_to)
+    assert [(item['id'], item['is_active']) for item in page['items']] == [(first, 0)]
+    assert int(page['next_cursor']) > int(synced_to)
+
+    # The row appears once in a full sync, after the row that was not edited
+    feed = [item['id'] for page in _drain(conn, 'prescriptions', 0, 1000) for item in page['items']]
+    assert feed.count(first) == 1
+    assert feed.index(second) < feed.index(first)
+
+
+def test_fields_are_whitelisted_and_id_is_always_sent(conn):
+    assert parse_fields('readings', 'value1, patient_id') == ['id', 'value1', 'patient_id']
+    assert parse_fields('readings', None) == ['id', 'patient_id', 'reading_type', 'value1', 'value2', 'timestamp']
+    # Columns that exist but are not exposed, and anything that is not a plain name, are refused
+    for resource, fields_param in (('patients', 'password_hash'), ('readings', 'value1,sync_seq'), ('readings', 'id) FROM patients --')):
+        with pytest.raises(SyncError):
+            parse_fields(resource, fields_param)
+
+    patient_id = _patient(conn)
+    conn.execute("INSERT INTO readings (patient_id, reading_type, value1, value2) VALUES (?, 'BP', 120, 80)", (patient_id,))
+    conn.commit()
+    page = get_changes(conn, 'readings', 0, 1000, parse_fields('readings', 'value1'), patient_id)
+    assert page['items'] == [{'id': page['items'][0]['id'], 'value1': 120}]
+
+
+def test_allowed_scope_by_session_role():
+    assert allowed_scope({'admin_logged_in': True}, 'patients') == (True, None)
+    assert allowed_scope({'health_dept_logged_in': True}, 'readings') == (True, None)
+    assert allowed_scope({'pharmacy_logged_in': True}, 'inventory') == (True, None)
+    assert allowed_scope({'pharmacy_logged_in': True}, 'patients') == (False, None)
+    # A patient reads only their own rows, plus the non-patient inventory feed
+    assert allowed_scope({'user_id': 7}, 'readings') == (True, 7)
+    assert allowed_scope({'user_id': 7}, 'patients') == (True, 7)
+    assert allowed_scope({'user_id': 7}, 'inventory') == (True, None)
+    assert allowed_scope({}, 'readings') == (False, None)
+
+
+def test_patient_scope_filters_rows(conn):
+    mine, theirs = _patient(conn), _patient(conn)
+    for patient_id in (mine, theirs):
+        conn.execute("INSERT INTO readings (patient_id, reading_type, value1) VALUES (?, 'Sugar', 110)", (patient_id,))
+    conn.commit()
+
+    _, patient_id = allowed_scope({'user_id': mine}, 'readings')
+    items = [item for page in _drain(conn, 'readings', 0, 1000, patient_id=patient_id) for item in page['items']]
+    assert items and {item['patient_id'] for item in items} == {mine}
+    _, patient_id = allowed_scope({'user_id': mine}, 'patients')
+    assert [item['id'] for item in get_changes(conn, 'patients', 0, 1000, patient_id=patient_id)['items']] == [mine]
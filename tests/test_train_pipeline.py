@@ -0,0 +1,14 @@
+from remedy_index import build_remedy_index, canonical_disease, lookup_treatment
+from train_pipeline import normalize_labels
+
+
+def test_normalize_labels_folds_case_and_whitespace_onto_first_spelling():
+    labels = ['Allergic Rhinitis', 'Ascites', 'allergic  rhinitis', ' ALLERGIC RHINITIS ', 'new  disease', 'New Disease']
+    assert normalize_labels(labels) == ['Allergic Rhinitis', 'Ascites', 'Allergic Rhinitis', 'Allergic Rhinitis', 'new disease', 'new disease']
+
+
+def test_canonical_disease_uses_dataset_spelling():
+    index = build_remedy_index()
+    assert canonical_disease(index, '  allergic   RHINITIS ') == 'Allergic Rhinitis'
+    assert canonical_disease(index, 'Not  A Known Disease') == 'Not A Known Disease'
+    assert lookup_treatment(index, 'allergic  rhinitis') == lookup_treatment(index, 'Allergic Rhinitis')
@@ -0,0 +1,170 @@
+"""Background triage against stub_llm_server.py: pending -> done / failed, and one analysis per report."""
+import threading
+import time
+
+import pytest
+
+import triage_llm
+from remedy_index import build_remedy_index
+from stub_llm_server import start_stub_server
+from triage_jobs import TRIAGE_LEASE_SECONDS, TriagePipeline
+
+POLL_TIMEOUT_SECONDS = 10
+
+
+class _FixedModel:
+    def predict(self, vectors):
+        return ['Ascites'] * len(vectors)
+
+
+class _Vectorizer:
+    def transform(self, texts):
+        return texts
+
+
+class _Registry:
+    def get(self):
+        return _FixedModel(), _Vectorizer(), build_remedy_index()
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    server, url = start_stub_server(delay=0.3)
+    monkeypatch.setattr(triage_llm, 'OPENROUTER_URL', url)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def health_app(monkeypatch, stub_llm):
+    import app as health_app
+    monkeypatch.setattr(health_app, 'model_registry', _Registry())
+    conn = health_app.get_db_connection()
+    conn.execute("DELETE FROM llm_report_cache")  # every test reaches the stub
+    conn.commit()
+    conn.close()
+    return health_app
+
+
+@pytest.fixture
+def client(health_app):
+    client = health_app.app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
+
+
+def _patient(health_app):
+    conn = health_app.get_db_connection()
+    patient_id = conn.execute(
+        "INSERT INTO patients (name, phone_number, password_hash, village) VALUES ('Triage Test', ?, 'x', 'Songir')",
+        (f"+91{time.time_ns() % 10**10:010d}",)
+    ).lastrowid
+    conn.commit()
+    conn.close()
+    return patient_id
+
+
+def _submit_report(health_app, client):
+    patient_id = _patient(health_app)
+    response = client.post(f'/patient/{patient_id}/add_report', data={'chief_complaint': 'swollen belly', 'notes': 'fluid'})
+    assert response.status_code == 302
+    conn = health_app.get_db_connection()
+    report_id = conn.execute("SELECT MAX(id) FROM triage_reports WHERE patient_id = ?", (patient_id,)).fetchone()[0]
+    conn.close()
+    return report_id
+
+
+def _wait_for_result(client, report_id):
+    deadline = time.monotonic() + POLL_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        status = client.get(f'/triage_report/{report_id}/status').get_json()
+        if status['status'] not in ('pending', 'running'):
+            return status
+        time.sleep(0.05)
+    pytest.fail(f"report {report_id} still {status['status']} after {POLL_TIMEOUT_SECONDS}s")
+
+
+def test_report_goes_from_pending_to_done_through_stub_llm(health_app, client, stub_llm):
+    report_id = _submit_report(health_app, client)
+    # The stub answers after 0.3 s, so the first poll still sees the placeholder
+    first = client.get(f'/triage_report/{report_id}/status').get_json()
+    assert first['status'] in ('pending', 'running')
+    assert first['ai_prediction'] == health_app.PENDING_PREDICTION
+
+    result = _wait_for_result(client, report_id)
+    assert result['status'] == 'done'
+    assert 'Stub LLM response for local testing.' in result['ai_prediction']
+    assert stub_llm.requests_served == 1
+
+
+def test_analysis_error_marks_report_failed(health_app, client, monkeypatch):
+    def broken(symptoms_text):
+        raise RuntimeError("model exploded")
+    monkeypatch.setattr(health_app.triage_pipeline, 'analyze_fn', broken)
+
+    result = _wait_for_result(client, _submit_report(health_app, client))
+    assert (result['status'], result['ai_prediction']) == ('failed', "Could not analyze symptoms.")
+
+
+def _counting_pipeline():
+    calls = []
+    lock = threading.Lock()
+
+    def analyze(symptoms_text):
+        with lock:
+            calls.append(symptoms_text)
+        time.sleep(0.05)
+        return 'Ascites', 'report'
+    return TriagePipeline(analyze), calls
+
+
+def _insert_report(health_app, status='pending', age_seconds=0, claimed_age_seconds=None):
+    conn = health_app.get_db_connection()
+    report_id = conn.execute(
+        "INSERT INTO triage_reports (chief_complaint, notes, ai_prediction, ai_status, timestamp, ai_claimed_at) VALUES ('cough', '', ?, ?, datetime('now', ?), ?)",
+        (health_app.PENDING_PREDICTION, status, f"-{age_seconds} seconds",
+         None if claimed_age_seconds is None else time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - claimed_age_seconds)))
+    ).lastrowid
+    conn.commit()
+    conn.close()
+    return report_id
+
+
+def _status(health_app, report_id):
+    conn = health_app.get_db_connection()
+    status = conn.execute("SELECT ai_status FROM triage_reports WHERE id = ?", (report_id,)).fetchone()[0]
+    conn.close()
+    return status
+
+
+def test_report_queued_twice_is_analyzed_once(health_app):
+    pipeline, calls = _counting_pipeline()
+    report_id = _insert_report(health_app)
+    futures = [pipeline.submit(report_id, 'cough') for _ in range(3)]
+    results = [future.result() for future in futures]
+    pipeline.shutdown()
+
+    assert len(calls) == 1
+    assert sorted(results, key=str) == [None, None, 'report']
+    assert _status(health_app, report_id) == 'done'
+
+
+def test_resume_requeues_only_stale_reports(health_app):
+    conn = health_app.get_db_connection()
+    conn.execute("UPDATE triage_reports SET ai_status = 'done' WHERE ai_status IN ('pending', 'running')")
+    conn.commit()
+    conn.close()
+    fresh_pending = _insert_report(health_app)
+    fresh_running = _insert_report(health_app, 'running', claimed_age_seconds=5)
+    stale_pending = _insert_report(health_app, age_seconds=TRIAGE_LEASE_SECONDS + 60)
+    stale_running = _insert_report(health_app, 'running', age_seconds=TRIAGE_LEASE_SECONDS + 60, claimed_age_seconds=TRIAGE_LEASE_SECONDS + 30)
+
+    pipeline, calls = _counting_pipeline()
+    assert pipeline.resume_pending() == 2
+    pipeline.shutdown()
+
+    assert len(calls) == 2
+    assert (_status(health_app, stale_pending), _status(health_app, stale_running)) == ('done', 'done')
+    # Another live process owns these
+    assert (_status(health_app, fresh_pending), _status(health_app, fresh_running)) == ('pending', 'running')
@@ -145,6 +145,8 @@ from datasets import load_dataset
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
 import pickle
+from compact_model import export_compact_model
+from remedy_index import build_remedy_index, save_remedy_index
 
 def train_final_model():
     """
@@ -216,9 +218,15 @@ def train_final_model():
     with open('final_vectorizer.pkl', 'wb') as f:
         pickle.dump(vectorizer, f)
     print("... Symptom vectorizer saved to 'final_vectorizer.pkl'")
+
+    export_compact_model(model, vectorizer)
+    print("... Memory-mappable copy of the model saved to 'final_model_compact/'")
     
     df_clean.to_csv('final_remedy_dataset.csv', index=False)
     print("... Cleaned dataset saved to 'final_remedy_dataset.csv'")
+
+    save_remedy_index(build_remedy_index('final_remedy_dataset.csv'))
+    print("... Disease -> treatment lookup saved to 'final_remedy_index.json'")
     
 
 if __name__ == '__main__':
@@ -0,0 +1,240 @@
+"""
+Offline, reproducible training pipeline for the disease model.
+
+Unlike train_model_remedies.py, which downloads the Hugging Face dataset and
+refits everything on one core, this pipeline:
+
+- trains from the checked-in final_remedy_dataset.csv, plus triage reports
+  whose diagnosis a doctor confirmed (`triage_reports.confirmed_disease`), with
+  no network access;
+- caches the fitted TF-IDF vectorizer and feature matrix in TRAIN_CACHE_DIR,
+  keyed by a hash of the training data and vectorizer settings, so a retrain
+  on unchanged data skips vectorization;
+- fits the forest with n_jobs (all cores by default) and a fixed random seed;
+- writes a versioned artifact to models/<version>/ (pickles, compact export,
+  report.json with data hash, timings and hold-out accuracy). --promote copies
+  it to the paths the app loads from and rebuilds final_remedy_index.json.
+
+Labels are compared case- and whitespace-insensitively, so a confirmed
+"allergic  rhinitis" trains the dataset's "Allergic Rhinitis" class.
+
+    python train_pipeline.py [--no-triage] [--n-jobs -1] [--trees 100] [--promote]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from datetime import datetime, timezone
+
+from compact_model import export_compact_model
+from model_registry import COMPACT_MODEL_DIR, MODEL_PATH, VECTORIZER_PATH
+from remedy_index import REMEDY_INDEX_PATH, build_remedy_index, disease_key, save_remedy_index
+
+DATASET_PATH = 'final_remedy_dataset.csv'
+MODELS_DIR = 'models'
+TRAIN_CACHE_DIR = '.train_cache'
+RANDOM_SEED = 42
+TOP_DISEASES = 100
+VECTORIZER_PARAMS = {'max_features': 1500, 'stop_words': 'english'}
+FOREST_PARAMS = {'n_estimators': 100}
+HOLDOUT_FRACTION = 0.2
+
+
+# --- Data ---
+def load_csv_examples(path=DATASET_PATH):
+    """(texts, labels) from the remedy dataset; columns are read by position (the header has ' Symptoms')."""
+    texts, labels = [], []
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)  # Symptoms, Disease, Treatment
+        for row in reader:
+            if len(row) >= 2 and row[0].strip() and row[1].strip():
+                texts.append(row[0])
+                labels.append(row[1].strip())
+    return texts, labels
+
+
+def load_triage_examples(conn):
+    """(texts, labels) from triage reports with a doctor-confirmed diagnosis."""
+    rows = conn.execute("""
+        SELECT chief_complaint, notes, confirmed_disease FROM triage_reports
+        WHERE confirmed_disease IS NOT NULL AND confirmed_disease != '' ORDER BY id
+    """).fetchall()
+    return [f"{row['chief_complaint']} {row['notes'] or ''}" for row in rows], [row['confirmed_disease'] for row in rows]
+
+
+def normalize_labels(labels):
+    """Folds case and whitespace variants of a label onto its first spelling (CSV labels come first, so they win)."""
+    canonical = {}
+    return [canonical.setdefault(disease_key(label), ' '.join(label.split())) for label in labels]
+
+
+def keep_top_diseases(texts, labels, top=TOP_DISEASES):
+    counts = {}
+    for label in labels:
+        counts[label] = counts.get(label, 0) + 1
+    # Ties broken by name so the selection is reproducible
+    keep = set(sorted(counts, key=lambda label: (-counts[label], label))[:top])
+    pairs = [(text, label) for text, label in zip(texts, labels) if label in keep]
+    return [text for text, _ in pairs], [label for _, label in pairs]
+
+
+def data_hash(texts, labels, params):
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+    for text, label in zip(texts, labels):
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\x1f')
+        digest.update(label.encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+# --- Feature cache ---
+def vectorize(texts, fingerprint, cache_dir=TRAIN_CACHE_DIR):
+    """(vectorizer, X, cache_hit). Reuses the cached fit when the data fingerprint matches."""
+    import scipy.sparse
+    import sklearn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    key = f"{fingerprint[:16]}-sklearn{sklearn.__version__}"
+    vectorizer_path = os.path.join(cache_dir, f"{key}.vectorizer.pkl")
+    matrix_path = os.path.join(cache_dir, f"{key}.features.npz")
+    if os.path.exists(vectorizer_path) and os.path.exists(matrix_path):
+        with open(vectorizer_path, 'rb') as f:
+            vectorizer = pickle.load(f)
+        return vectorizer, scipy.sparse.load_npz(matrix_path), True
+
+    vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+    X = vectorizer.fit_transform(texts)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(vectorizer_path, 'wb') as f:
+        pickle.dump(vectorizer, f)
+    scipy.sparse.save_npz(matrix_path, X)
+    return vectorizer, X, False
+
+
+# --- Training ---
+def train(include_triage=True, n_jobs=-1, trees=FOREST_PARAMS['n_estimators'], seed=RANDOM_SEED, out_dir=MODELS_DIR, verbose=True):
+    """Trains, evaluates and saves a versioned model. Returns the report dict (report['path'] is the artifact dir)."""
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+
+    timings = {}
+    start = time.perf_counter()
+    texts, labels = load_csv_examples()
+    sources = {'csv': len(texts)}
+    if include_triage:
+        from db import get_db_connection
+        conn = get_db_connection()
+        try:
+            triage_texts, triage_labels = load_triage_examples(conn)
+        finally:
+            conn.close()
+        texts, labels = texts + triage_texts, labels + triage_labels
+        sources['triage_reports'] = len(triage_texts)
+    labels = normalize_labels(labels)
+    texts, labels = keep_top_diseases(texts, labels)
+    fingerprint = data_hash(texts, labels, {'vectorizer': VECTORIZER_PARAMS, 'top': TOP_DISEASES})
+    timings['load_seconds'] = time.perf_counter() - start
+    if verbose:
+        print(f"... {len(texts)} examples, {len(set(labels))} diseases (data {fingerprint[:12]})")
+
+    start = time.perf_counter()
+    vectorizer, X, cache_hit = vectorize(texts, fingerprint)
+    timings['vectorize_seconds'] = time.perf_counter() - start
+    if verbose:
+        print(f"... Features {'loaded from cache' if cache_hit else 'computed and cached'} in {timings['vectorize_seconds']:.2f}s")
+
+    # Hold-out accuracy, on a seeded split (classes with a single example stay in training)
+    y = np.array(labels, dtype=object)
+    rng = np.random.default_rng(seed)
+    holdout = np.zeros(len(y), dtype=bool)
+    for label in sorted(set(labels)):
+        members = np.flatnonzero(y == label)
+        if len(members) >= 2:
+            count = max(1, int(round(len(members) * HOLDOUT_FRACTION)))
+            holdout[rng.choice(members, size=count, replace=False)] = True
+
+    params = dict(FOREST_PARAMS, n_estimators=trees, random_state=seed, n_jobs=n_jobs)
+    start = time.perf_counter()
+    evaluation_model = RandomForestClassifier(**params).fit(X[~holdout], y[~holdout])
+    proba = evaluation_model.predict_proba(X[holdout])
+    top3 = evaluation_model.classes_[np.argsort(proba, axis=1)[:, -3:]]
+    accuracy = float(np.mean(top3[:, -1] == y[holdout]))
+    top3_accuracy = float(np.mean([label in row for label, row in zip(y[holdout], top3)]))
+    timings['evaluate_seconds'] = time.perf_counter() - start
+    if verbose:
+        print(f"... Hold-out accuracy {accuracy:.1%} (top-3 {top3_accuracy:.1%}) on {int(holdout.sum())} examples")
+
+    # The shipped model is fitted on all of the data
+    start = time.perf_counter()
+    model = RandomForestClassifier(**params).fit(X, y)
+    timings['fit_seconds'] = time.perf_counter() - start
+
+    version = f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}-{fingerprint[:8]}"
+    path = os.path.join(out_dir, version)
+    start = time.perf_counter()
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, os.path.basename(MODEL_PATH)), 'wb') as f:
+        pickle.dump(model, f)
+    with open(os.path.join(path, os.path.basename(VECTORIZER_PATH)), 'wb') as f:
+        pickle.dump(vectorizer, f)
+    export_compact_model(model, vectorizer, os.path.join(path, os.path.basename(COMPACT_MODEL_DIR)))
+    timings['save_seconds'] = time.perf_counter() - start
+
+    report = {
+        'version': version,
+        'path': path,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'data_hash': fingerprint,
+        'sources': sources,
+        'examples': len(texts),
+        'diseases': len(model.classes_),
+        'vectorizer_params': VECTORIZER_PARAMS,
+        'forest_params': {key: value for key, value in params.items() if key != 'n_jobs'},
+        'n_jobs': n_jobs,
+        'feature_cache_hit': cache_hit,
+        'holdout_examples': int(holdout.sum()),
+        'holdout_accuracy': accuracy,
+        'holdout_top3_accuracy': top3_accuracy,
+        'timings': {key: round(value, 3) for key, value in timings.items()},
+    }
+    with open(os.path.join(path, 'report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.join(out_dir, 'LATEST'), 'w', encoding='utf-8') as f:
+        f.write(version)
+    return report
+
+
+def promote(path):
+    """Copies a versioned artifact to the paths the app loads the model from and rebuilds the remedy index."""
+    shutil.copyfile(os.path.join(path, os.path.basename(MODEL_PATH)), MODEL_PATH)
+    shutil.copyfile(os.path.join(path, os.path.basename(VECTORIZER_PATH)), VECTORIZER_PATH)
+    compact_source = os.path.join(path, os.path.basename(COMPACT_MODEL_DIR))
+    if os.path.isdir(COMPACT_MODEL_DIR):
+        shutil.rmtree(COMPACT_MODEL_DIR)
+    shutil.copytree(compact_source, COMPACT_MODEL_DIR)
+    save_remedy_index(build_remedy_index(DATASET_PATH))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline disease model training")
+    parser.add_argument('--no-triage', action='store_true', help="train from the CSV only")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="cores used to fit the forest (-1 = all)")
+    parser.add_argument('--trees', type=int, default=FOREST_PARAMS['n_estimators'])
+    parser.add_argument('--seed', type=int, default=RANDOM_SEED)
+    parser.add_argument('--promote', action='store_true', help="install the new model for the app")
+    args = parser.parse_args()
+
+    print("--- Starting offline model training ---")
+    result = train(include_triage=not args.no_triage, n_jobs=args.n_jobs, trees=args.trees, seed=args.seed)
+    for step, seconds in result['timings'].items():
+        print(f"    {step:<20} {seconds:>8.2f}s")
+    print(f"--- Model {result['version']} saved to '{result['path']}/' (accuracy {result['holdout_accuracy']:.1%}) ---")
+    if args.promote:
+        promote(result['path'])
+        print(f"... Promoted: '{MODEL_PATH}', '{VECTORIZER_PATH}' and '{COMPACT_MODEL_DIR}/' updated, '{REMEDY_INDEX_PATH}' rebuilt")
@@ -0,0 +1,96 @@
+"""
+Background triage pipeline.
+
+`add_triage_report()` stores the report straight away with ai_status='pending'
+and hands the symptoms to this executor. The local model + OpenRouter stages
+run on a worker thread and the row is updated when they finish, so the HTTP
+worker is never held for the LLM call. The dashboard polls
+/triage_report/<id>/status to swap the placeholder for the finished report.
+
+A job first claims its report (pending -> running, stamped ai_claimed_at) and
+skips it if another worker or process got there first, so each report costs
+one OpenRouter call however many processes queued it. On startup only stale
+reports are re-queued: 'running' ones whose claim is older than
+TRIAGE_LEASE_SECONDS (their process died mid-analysis) and 'pending' ones
+that old that no process ever claimed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_db_connection
+
+TRIAGE_WORKERS = 4
+PENDING_PREDICTION = "AI analysis in progress..."
+TRIAGE_LEASE_SECONDS = 600      # well past the 60 s OpenRouter timeout; afterwards a 'running' report counts as abandoned
+
+
+class TriagePipeline:
+    def __init__(self, analyze_fn, workers=TRIAGE_WORKERS):
+        # analyze_fn(symptoms_text) -> (predicted_disease, report HTML)
+        self.analyze_fn = analyze_fn
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="triage")
+
+    def submit(self, report_id, symptoms_text):
+        return self.executor.submit(self._run, report_id, symptoms_text)
+
+    def resume_pending(self):
+        """Re-queues reports left behind by a process that stopped before finishing them. Returns how many."""
+        cutoff = (f"-{TRIAGE_LEASE_SECONDS} seconds",)
+        conn = get_db_connection()
+        try:
+            stale = conn.execute(
+                """SELECT id, chief_complaint, notes FROM triage_reports
+                   WHERE (ai_status = 'running' AND (ai_claimed_at IS NULL OR ai_claimed_at < datetime('now', ?)))
+                      OR (ai_status = 'pending' AND timestamp < datetime('now', ?))""",
+                cutoff * 2
+            ).fetchall()
+            conn.execute(
+                "UPDATE triage_reports SET ai_status = 'pending', ai_claimed_at = NULL WHERE ai_status = 'running' AND (ai_claimed_at IS NULL OR ai_claimed_at < datetime('now', ?))",
+                cutoff
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        for report in stale:
+            self.submit(report['id'], f"{report['chief_complaint']} {report['notes'] or ''}")
+        return len(stale)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def _run(self, report_id, symptoms_text):
+        if not self._claim(report_id):
+            return None  # already analyzed, or being analyzed elsewhere
+        try:
+            (predicted_disease, prediction), status = self.analyze_fn(symptoms_text), 'done'
+        except Exception as e:
+            print(f"Triage job for report {report_id} failed: {e}")
+            predicted_disease, prediction, status = None, "Could not analyze symptoms.", 'failed'
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                "UPDATE triage_reports SET ai_prediction = ?, ai_status = ?, predicted_disease = ?, ai_claimed_at = NULL WHERE id = ? AND ai_status = 'running'",
+                (prediction, status, predicted_disease, report_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return prediction
+
+    def _claim(self, report_id):
+        conn = get_db_connection()
+        try:
+            claimed = conn.execute(
+                "UPDATE triage_reports SET ai_status = 'running', ai_claimed_at = datetime('now') WHERE id = ? AND ai_status = 'pending'",
+                (report_id,)
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return claimed == 1
+
+
+def get_report_status(conn, report_id):
+    row = conn.execute("SELECT id, ai_status, ai_prediction FROM triage_reports WHERE id = ?", (report_id,)).fetchone()
+    if row is None:
+        return None
+    return {'id': row['id'], 'status': row['ai_status'], 'ai_prediction': row['ai_prediction']}
@@ -0,0 +1,195 @@
+"""
+Stage 3 of the triage pipeline: OpenRouter reformatting of the trusted treatment
+text, with a persistent cache.
+
+The treatment text comes from the fixed final_remedy_dataset.csv, so the LLM
+output only depends on (disease, prompt version, model). Parsed triage JSON is
+stored in the `llm_report_cache` table and reused until it expires
+(CACHE_TTL_DAYS) or is evicted as least-recently-used (CACHE_MAX_ENTRIES).
+
+Pre-warm the cache for every disease in the dataset (no network needed afterwards):
+    python triage_llm.py --prewarm [--force] [--workers 4]
+"""
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from db import get_db_connection
+from migrations import apply_migrations
+from remedy_index import build_remedy_index, REMEDY_CSV_PATH
+
+# --- OpenRouter API Configuration ---
+OPENROUTER_API_KEY = ""
+OPENROUTER_URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")  # see stub_llm_server.py for local runs
+OPENROUTER_MODEL = "openai/gpt-4o-mini"
+
+# Bump whenever SYSTEM_PROMPT / the user query changes so stale cache entries are ignored
+PROMPT_VERSION = 1
+SYSTEM_PROMPT = (
+    "You are a medical AI assistant for rural healthcare in India. "
+    "You will be given a trusted medical treatment description. "
+    "Your job is to reformat it into a triage JSON with keys: "
+    "'intensity' (Mild/Moderate/Severe), 'recommendation' (a list of 1-2 short actions), "
+    "'home_remedies' (a list of 2-3 simple remedies in English and Panjabi, e.g., 'Drink warm water (ਕੋਸਾ ਪਾਣੀ ਪੀਓ)'), "
+    "'emergency' (a standard warning), and 'doctor_note' (a 1-2 line clinical summary)."
+)
+
+CACHE_TTL_DAYS = 30
+CACHE_MAX_ENTRIES = 1000
+
+
+def safe_extract_json(text):
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group())
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+# --- Cache ---
+def get_cached_report(disease, prompt_version=PROMPT_VERSION, model=OPENROUTER_MODEL):
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT report_json FROM llm_report_cache WHERE disease_key = ? AND prompt_version = ? AND model = ? AND created_at >= datetime('now', ?)",
+            (disease.lower(), prompt_version, model, f"-{CACHE_TTL_DAYS} days")
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE llm_report_cache SET last_used_at = datetime('now') WHERE disease_key = ? AND prompt_version = ? AND model = ?",
+            (disease.lower(), prompt_version, model)
+        )
+        conn.commit()
+        return json.loads(row['report_json'])
+    finally:
+        conn.close()
+
+
+def store_cached_report(disease, report_data, prompt_version=PROMPT_VERSION, model=OPENROUTER_MODEL):
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_report_cache (disease_key, prompt_version, model, report_json, created_at, last_used_at) VALUES (?, ?, ?, ?, datetime('now'), datetime('now'))",
+            (disease.lower(), prompt_version, model, json.dumps(report_data, ensure_ascii=False))
+        )
+        # Size-based eviction: drop expired rows, then the least recently used beyond the limit
+        conn.execute("DELETE FROM llm_report_cache WHERE created_at < datetime('now', ?)", (f"-{CACHE_TTL_DAYS} days",))
+        conn.execute(
+            "DELETE FROM llm_report_cache WHERE rowid IN (SELECT rowid FROM llm_report_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+            (CACHE_MAX_ENTRIES,)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# --- OpenRouter ---
+def request_triage_report(predicted_disease, treatment_text):
+    """Calls OpenRouter. Returns the parsed triage dict, or None if the reply had no usable JSON. Raises on network errors."""
+    user_query = f"Reformat the following treatment description for {predicted_disease}:\n{treatment_text}"
+    payload = {
+        "model": OPENROUTER_MODEL,
+        "messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": user_query}]
+    }
+    headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"}
+
+    import requests  # deferred: only needed on a cache miss
+    with metrics.timed('triage_stage_duration_seconds', stage='openrouter'):
+        response = requests.post(OPENROUTER_URL, headers=headers, json=payload, timeout=60)
+    response.raise_for_status()
+    result = response.json()
+
+    report_json_text = result["choices"][0]["message"]["content"]
+    return safe_extract_json(report_json_text)
+
+
+def get_triage_report(predicted_disease, treatment_text):
+    """Cached version of request_triage_report(): the common path makes no network call."""
+    try:
+        cached = get_cached_report(predicted_disease)
+    except Exception as e:
+        print(f"LLM cache lookup failed: {e}")
+        cached = None
+    metrics.registry.inc('llm_cache_lookups_total', result='miss' if cached is None else 'hit')
+    if cached is not None:
+        return cached
+    report_data = request_triage_report(predicted_disease, treatment_text)
+    if report_data:
+        try:
+            store_cached_report(predicted_disease, report_data)
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+    return report_data
+
+
+def render_triage_report(predicted_disease, treatment_text):
+    """Report HTML for a predicted disease (stage 3 of the pipeline). `treatment_text` is None if the dataset has none."""
+    if treatment_text is None:
+        return f"<b>Predicted Issue:</b> {predicted_disease}<br><br>No specific treatment found in the local dataset."
+    try:
+        with metrics.timed('triage_stage_duration_seconds', stage='report'):
+            report_data = get_triage_report(predicted_disease, treatment_text)
+
+        if not report_data:
+            return f"<b>Predicted Issue:</b> {predicted_disease}<br><br>(API Formatting Failed) Raw Treatment: {treatment_text}"
+
+        recommendation_html = "<br> - ".join(report_data.get("recommendation", []))
+        remedies_html = "<br> - ".join(report_data.get("home_remedies", []))
+        return (
+            f"<b>Predicted Issue:</b> {report_data.get('doctor_note', predicted_disease)}<br><br>"
+            f"<b>Intensity:</b> {report_data.get('intensity', 'N/A')}<br><br>"
+            f"<b>Recommendation:</b><br> - {recommendation_html}<br><br>"
+            f"<b>Home Remedies:</b><br> - {remedies_html}<br><br>"
+            f"<b>Emergency Note:</b> {report_data.get('emergency', 'If symptoms do not improve or worsen, a physical hospital visit is required.')}"
+        )
+    except Exception as e:
+        print(f"OpenRouter API failed: {e}. Falling back to raw local treatment text.")
+        return f"<b>Predicted Issue:</b> {predicted_disease}<br><br>(API Unavailable)<br><b>Suggested Treatment:</b> {treatment_text}"
+
+
+# --- Offline pre-warm ---
+def prewarm_cache(force=False, workers=4, csv_path=REMEDY_CSV_PATH):
+    # Same first-row-per-disease treatment text that get_ai_prediction() sends
+    diseases = list(build_remedy_index(csv_path).values())
+    if not force:
+        diseases = [(d, t) for d, t in diseases if get_cached_report(d) is None]
+    print(f"--- Pre-warming LLM cache for {len(diseases)} disease(s)... ---")
+
+    def warm(item):
+        disease, treatment = item
+        try:
+            report_data = request_triage_report(disease, treatment)
+        except Exception as e:
+            print(f"... {disease}: API failed ({e})")
+            return False
+        if not report_data:
+            print(f"... {disease}: API formatting failed")
+            return False
+        store_cached_report(disease, report_data)
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        warmed = sum(executor.map(warm, diseases))
+    print(f"--- Cached {warmed}/{len(diseases)} triage reports. ---")
+    return warmed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage the cached LLM triage reports")
+    parser.add_argument('--prewarm', action='store_true', help="fill the cache for every disease in the dataset")
+    parser.add_argument('--force', action='store_true', help="refresh entries that are already cached")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    if args.prewarm:
+        conn = get_db_connection()
+        apply_migrations(conn)
+        conn.close()
+        prewarm_cache(force=args.force, workers=args.workers)
+    else:
+        parser.print_help()